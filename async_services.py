@@ -0,0 +1,482 @@
+"""
+Async service layer used by the request handlers.
+Mirrors services.py on an AsyncSession so database I/O is awaited instead of
+blocking the event loop. CPU-bound work (bcrypt, sentiment, LLM generation)
+is handed to the threadpool. services.py stays for background threads, the
+streaming generator and scripts, which run outside the event loop.
+"""
+
+import bcrypt
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from models import Player, NPCMemory, CarBuild, Consent, ConversationSummary, dialogue_fingerprint
+from schemas import PlayerCreate, ConsentCreate
+from pagination import decode_cursor, keyset_before, paginate
+from sentiment import analyze_sentiment
+from sentiment_jobs import sentiment_jobs
+from llamacpp import generate_npc_response
+from inference_scheduler import InferenceBusyError
+from conversation_summary import summarizer
+from services import SummaryService
+
+
+# =============================================================================
+# Player Service
+# =============================================================================
+
+class AsyncPlayerService:
+    """Async counterpart of PlayerService."""
+
+    @staticmethod
+    async def get_player_by_id(db: AsyncSession, player_id: int) -> Optional[Player]:
+        """Get player by ID."""
+        return await db.get(Player, player_id)
+
+    @staticmethod
+    async def get_player_by_uuid(db: AsyncSession, uuid: str) -> Optional[Player]:
+        """Get player by UUID."""
+        return await db.scalar(select(Player).where(Player.name == uuid).limit(1))
+
+    @staticmethod
+    async def get_player_by_email(db: AsyncSession, email: str) -> Optional[Player]:
+        """Get player by email address."""
+        return await db.scalar(select(Player).where(Player.email == email).limit(1))
+
+    @staticmethod
+    async def add_player(db: AsyncSession, player: Player) -> Player:
+        """Persist a new Player object."""
+        try:
+            db.add(player)
+            await db.commit()
+            await db.refresh(player)
+            return player
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"❌ Database error creating player: {e}")
+            raise
+
+    @staticmethod
+    async def create_player(db: AsyncSession, player_data: PlayerCreate) -> Player:
+        """Create a new player."""
+        return await AsyncPlayerService.add_player(db, Player(**player_data.model_dump()))
+
+    @staticmethod
+    async def verify_player_email_password(db: AsyncSession, email: str, password: str) -> Optional[Player]:
+        """Verify player credentials using email + password.
+
+        Args:
+            db: Async database session
+            email: Player's email address
+            password: Plain text password to verify
+
+        Returns:
+            Player object if credentials valid, None otherwise
+        """
+        player = await AsyncPlayerService.get_player_by_email(db, email)
+
+        if not player or not player.pin_hash:
+            return None
+
+        # bcrypt is deliberately slow, so keep it off the event loop
+        try:
+            if await run_in_threadpool(bcrypt.checkpw, password.encode('utf-8'), player.pin_hash.encode('utf-8')):
+                return player
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️ Invalid hash format for player {email}: {e}")
+
+        return None
+
+    @staticmethod
+    async def get_all_players(
+        db: AsyncSession,
+        cursor: Optional[str] = None,
+        limit: int = config.DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[Player], Optional[str]]:
+        """Get one page of players in id order.
+
+        Args:
+            db: Async database session
+            cursor: Token from the previous page, or None for the first page
+            limit: Maximum number of players to return
+
+        Returns:
+            (players, cursor for the next page or None)
+
+        Raises:
+            InvalidCursorError: If ``cursor`` is malformed
+        """
+        statement = select(Player).order_by(Player.id).limit(limit + 1)
+        if cursor:
+            (after_id,) = decode_cursor(cursor, int)
+            statement = statement.where(Player.id > after_id)
+        rows = (await db.scalars(statement)).all()
+        return paginate(rows, limit, lambda player: (player.id,))
+
+    @staticmethod
+    async def get_player_count(db: AsyncSession) -> int:
+        """Get total player count."""
+        return await db.scalar(select(func.count()).select_from(Player))
+
+
+# =============================================================================
+# Chat Service
+# =============================================================================
+
+class AsyncChatService:
+    """Async counterpart of ChatService."""
+
+    @staticmethod
+    async def get_conversation_history(
+        db: AsyncSession,
+        player_id: int,
+        limit: int = config.MAX_CONVERSATION_HISTORY
+    ) -> List[NPCMemory]:
+        """Get conversation history for a player in chronological order (oldest first)."""
+        result = await db.scalars(
+            select(NPCMemory)
+            .where(NPCMemory.player_id == player_id)
+            .order_by(NPCMemory.timestamp.desc())
+            .limit(limit)
+        )
+        return list(reversed(result.all()))
+
+    @staticmethod
+    async def get_interaction(db: AsyncSession, interaction_id: int) -> Optional[NPCMemory]:
+        """Get a single interaction by ID."""
+        return await db.get(NPCMemory, interaction_id)
+
+    @staticmethod
+    async def get_interactions(
+        db: AsyncSession,
+        player_id: int,
+        npc_id: int,
+        cursor: Optional[str] = None,
+        limit: int = config.DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[NPCMemory], Optional[str]]:
+        """Get one page of a player's interactions with an NPC, newest first.
+
+        Pages are keyed on (timestamp, id) and walk ix_player_npc_timestamp.
+
+        Args:
+            db: Async database session
+            player_id: Player's ID
+            npc_id: NPC's ID
+            cursor: Token from the previous page, or None for the first page
+            limit: Maximum number of interactions to return
+
+        Returns:
+            (interactions, cursor for the next page or None)
+
+        Raises:
+            InvalidCursorError: If ``cursor`` is malformed
+        """
+        statement = (
+            select(NPCMemory)
+            .where(NPCMemory.player_id == player_id, NPCMemory.npc_id == npc_id)
+            .order_by(NPCMemory.timestamp.desc(), NPCMemory.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            before_timestamp, before_id = decode_cursor(cursor, datetime, int)
+            statement = statement.where(
+                keyset_before(NPCMemory.timestamp, NPCMemory.id, before_timestamp, before_id)
+            )
+        rows = (await db.scalars(statement)).all()
+        return paginate(rows, limit, lambda memory: (memory.timestamp, memory.id))
+
+    @staticmethod
+    async def interaction_exists(db: AsyncSession, player_id: int, npc_id: int, dialogue: str) -> bool:
+        """Check whether the player already sent this dialogue to the NPC (one index probe on dialogue_hash)."""
+        existing_id = await db.scalar(
+            select(NPCMemory.id).where(
+                NPCMemory.player_id == player_id,
+                NPCMemory.npc_id == npc_id,
+                NPCMemory.dialogue_hash == dialogue_fingerprint(dialogue)
+            ).limit(1)
+        )
+        return existing_id is not None
+
+    @staticmethod
+    async def create_interaction(
+        db: AsyncSession,
+        player_id: int,
+        npc_id: int,
+        dialogue: str,
+        context: List[NPCMemory],
+        player_name: str,
+        build: Optional[CarBuild] = None
+    ) -> NPCMemory:
+        """Create a new chat interaction with NPC response.
+
+        Args:
+            db: Async database session
+            player_id: Player's ID
+            npc_id: NPC's ID
+            dialogue: Player's message
+            context: Conversation history
+            player_name: Player's display name
+            build: Optional car build for context
+
+        Returns:
+            Created NPCMemory object
+        """
+        player_sentiment = await run_in_threadpool(analyze_sentiment, dialogue)
+        summary_text, context = await AsyncSummaryService.apply_summary(db, player_id, npc_id, context)
+
+        # Generation is blocking (local model or sync provider clients), so it runs in the threadpool
+        npc_sentiment = None
+        try:
+            npc_reply_obj = await run_in_threadpool(
+                generate_npc_response,
+                dialogue,
+                player_sentiment,
+                player_id,
+                context,
+                player_name,
+                build=build,
+                summary=summary_text
+            )
+            npc_reply_text = (
+                npc_reply_obj["response"]
+                if isinstance(npc_reply_obj, dict)
+                else str(npc_reply_obj)
+            )
+            npc_sentiment = npc_reply_obj.get("npc_sentiment") if isinstance(npc_reply_obj, dict) else None
+        except InferenceBusyError:
+            raise
+        except Exception as e:
+            print(f"⚠️ LLM generation failed: {e}. Using fallback response.")
+            npc_reply_text = f"Hey {player_name}! I'm having trouble with my systems right now. Let's talk about your F1 car build!"
+
+        return await AsyncChatService._save_interaction(
+            db, player_id, npc_id, dialogue, player_sentiment, npc_reply_text, npc_sentiment
+        )
+
+    @staticmethod
+    async def _save_interaction(
+        db: AsyncSession,
+        player_id: int,
+        npc_id: int,
+        dialogue: str,
+        player_sentiment: str,
+        npc_reply_text: str,
+        npc_sentiment: Optional[str] = None
+    ) -> NPCMemory:
+        """Persist the interaction row (see ChatService._save_interaction)."""
+        if npc_sentiment is None and sentiment_jobs is None:
+            npc_sentiment = await run_in_threadpool(analyze_sentiment, npc_reply_text)
+
+        try:
+            memory = NPCMemory(
+                player_id=player_id,
+                npc_id=npc_id,
+                dialogue=dialogue,
+                sentiment=player_sentiment,
+                npc_reply=npc_reply_text,
+                npc_sentiment=npc_sentiment
+            )
+            db.add(memory)
+            await db.commit()
+            await db.refresh(memory)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"❌ Database error creating interaction: {e}")
+            raise
+
+        await AsyncChatService.schedule_npc_sentiment(db, memory)
+        await AsyncSummaryService.maybe_schedule_update(db, player_id, npc_id)
+        return memory
+
+    @staticmethod
+    async def schedule_npc_sentiment(db: AsyncSession, memory: NPCMemory) -> None:
+        """Queue a stored reply without a label, scoring it inline if the queue refuses."""
+        if memory.npc_sentiment is not None or not memory.npc_reply:
+            return
+        if sentiment_jobs is not None and sentiment_jobs.submit(memory.id, memory.npc_reply):
+            return
+        print(f"⚠️ Sentiment job queue unavailable, scoring interaction {memory.id} inline")
+        try:
+            memory.npc_sentiment = await run_in_threadpool(analyze_sentiment, memory.npc_reply)
+            await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"❌ Database error storing NPC sentiment: {e}")
+            raise
+
+    @staticmethod
+    async def delete_interaction(db: AsyncSession, memory: NPCMemory) -> None:
+        """Delete an interaction row."""
+        try:
+            await db.delete(memory)
+            await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"❌ Database error deleting interaction: {e}")
+            raise
+
+
+# =============================================================================
+# Summary Service
+# =============================================================================
+
+class AsyncSummaryService:
+    """Async reads for the rolling conversation summaries.
+
+    The summary update itself runs on the background summarizer thread
+    through the sync SummaryService.
+    """
+
+    @staticmethod
+    async def get_summary(db: AsyncSession, player_id: int, npc_id: int) -> Optional[ConversationSummary]:
+        """Get the stored summary for a player/NPC pair, if any."""
+        return await db.scalar(
+            select(ConversationSummary).where(
+                ConversationSummary.player_id == player_id,
+                ConversationSummary.npc_id == npc_id
+            ).limit(1)
+        )
+
+    @staticmethod
+    async def apply_summary(
+        db: AsyncSession,
+        player_id: int,
+        npc_id: int,
+        context: List[NPCMemory]
+    ) -> Tuple[str, List[NPCMemory]]:
+        """Return the summary text and the history not yet folded into it."""
+        if not config.SUMMARY_ENABLED:
+            return "", context
+        summary = await AsyncSummaryService.get_summary(db, player_id, npc_id)
+        if summary is None:
+            return "", context
+        through_id = summary.summarized_through_id
+        return summary.summary, [entry for entry in context if entry.id > through_id]
+
+    @staticmethod
+    async def maybe_schedule_update(db: AsyncSession, player_id: int, npc_id: int) -> bool:
+        """Queue a background update once enough turns are waiting to be folded in."""
+        if not config.SUMMARY_ENABLED:
+            return False
+        summary = await AsyncSummaryService.get_summary(db, player_id, npc_id)
+        through_id = summary.summarized_through_id if summary else 0
+        unsummarized = await db.scalar(
+            select(func.count()).select_from(NPCMemory).where(
+                NPCMemory.player_id == player_id,
+                NPCMemory.npc_id == npc_id,
+                NPCMemory.id > through_id
+            )
+        )
+        if unsummarized < config.SUMMARY_KEEP_RECENT_TURNS + config.SUMMARY_EVERY_N_TURNS:
+            return False
+        return summarizer.submit(
+            (player_id, npc_id),
+            lambda: SummaryService.run_update(player_id, npc_id)
+        )
+
+
+# =============================================================================
+# Build Service
+# =============================================================================
+
+class AsyncBuildService:
+    """Async counterpart of BuildService."""
+
+    @staticmethod
+    async def get_latest_build(db: AsyncSession, player_id: int) -> Optional[CarBuild]:
+        """Get the most recent car build for a player, or None."""
+        return await db.scalar(
+            select(CarBuild)
+            .where(CarBuild.player_id == player_id)
+            .order_by(CarBuild.id.desc())
+            .limit(1)
+        )
+
+    @staticmethod
+    async def get_player_builds(
+        db: AsyncSession,
+        player_id: int,
+        cursor: Optional[str] = None,
+        limit: int = config.DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[CarBuild], Optional[str]]:
+        """Get one page of a player's builds, newest first.
+
+        Args:
+            db: Async database session
+            player_id: Player's ID
+            cursor: Token from the previous page, or None for the first page
+            limit: Maximum number of builds to return
+
+        Returns:
+            (builds, cursor for the next page or None)
+
+        Raises:
+            InvalidCursorError: If ``cursor`` is malformed
+        """
+        statement = (
+            select(CarBuild)
+            .where(CarBuild.player_id == player_id)
+            .order_by(CarBuild.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            (before_id,) = decode_cursor(cursor, int)
+            statement = statement.where(CarBuild.id < before_id)
+        rows = (await db.scalars(statement)).all()
+        return paginate(rows, limit, lambda build: (build.id,))
+
+    @staticmethod
+    async def create_build(
+        db: AsyncSession,
+        player_id: int,
+        chassis: Optional[str],
+        engine: Optional[str],
+        tires: Optional[str],
+        front_wing: Optional[str],
+        rear_wing: Optional[str]
+    ) -> CarBuild:
+        """Create a new car build."""
+        try:
+            build = CarBuild(
+                player_id=player_id,
+                chassis=chassis,
+                engine=engine,
+                tires=tires,
+                front_wing=front_wing,
+                rear_wing=rear_wing
+            )
+            db.add(build)
+            await db.commit()
+            await db.refresh(build)
+            return build
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"❌ Database error creating build: {e}")
+            raise
+
+
+# =============================================================================
+# Consent Service
+# =============================================================================
+
+class AsyncConsentService:
+    """Handles consent and study participation data."""
+
+    @staticmethod
+    async def create_consent(db: AsyncSession, consent_data: ConsentCreate) -> Consent:
+        """Create a new consent record."""
+        try:
+            consent = Consent(**consent_data.model_dump())
+            db.add(consent)
+            await db.commit()
+            await db.refresh(consent)
+            return consent
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"❌ Database error creating consent: {e}")
+            raise
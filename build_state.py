@@ -0,0 +1,177 @@
+"""
+Build State - Resolved view of a CarBuild row for prompts and fallbacks
+Part names, selected/missing parts, completion status and the next-action
+hint are worked out once per build and memoized by build id (builds are
+insert-only, so a row never changes after it is saved).
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from reply_postprocess import PART_NAME_MAP
+
+# (CarBuild attribute, label used in prompts, label used in "selected" lists)
+PART_FIELDS: Tuple[Tuple[str, str, str], ...] = (
+    ("chassis", "chassis", "Chassis"),
+    ("engine", "engine", "Engine"),
+    ("tires", "tires", "Tires"),
+    ("front_wing", "front wing", "Front Wing"),
+    ("rear_wing", "rear wing", "Rear Wing"),
+)
+
+NEXT_PART_SUGGESTIONS = {
+    "chassis": "Standard Monocoque or Ground Effect Optimized",
+    "engine": "2004 V10 or 2006 V8",
+    "tires": "C5 Slick or Full Wet",
+    "front wing": "High Lift or Simple Outwash",
+    "rear wing": "High Downforce or Low Drag"
+}
+
+START_ACTION = "Start by selecting your chassis: Standard Monocoque or Ground Effect Optimized."
+COMPLETE_ACTION = "Your F1 car is ready! I can discuss the build, answer F1 questions, or you can click 'Submit Feedback' to finish."
+
+# Replies used when a hallucination is corrected, keyed by the next missing part
+CORRECTION_REPLIES = {
+    "chassis": "Now choose your F1 chassis: Standard Monocoque or Ground Effect Optimized.",
+    "engine": "Great! Now pick your F1 engine: 2004 V10 or 2006 V8.",
+    "tires": "Next, select F1 tires: C5 Slick or Full Wet.",
+    "front wing": "Choose your front wing: High Lift or Simple Outwash.",
+    "rear wing": "Finally, pick your rear wing: High Downforce or Low Drag.",
+}
+
+
+def get_short_part_name(part: Optional[str]) -> str:
+    """Return a concise, user-friendly part name.
+
+    Args:
+        part: The full part name or identifier
+
+    Returns:
+        Short, user-friendly name or the original if no match found
+    """
+    if not part:
+        return "-"
+
+    # Stored part ids use underscores ("2004_v10_Engine", "C5_Slick_Tire")
+    part_lower = str(part).lower().replace("_", " ").strip()
+
+    # Check for exact keywords (prioritize full matches)
+    for key, short_name in PART_NAME_MAP.items():
+        if key in part_lower:
+            return short_name
+
+    # Fallback for concatenated names (e.g., "GroundEffectOptimized_Monocoque")
+    for key, short_name in PART_NAME_MAP.items():
+        key_no_space = key.replace(" ", "")
+        if key_no_space in part_lower:
+            return short_name
+
+    return part  # Return original if no match
+
+
+class BuildState:
+    """Everything Dax needs to know about a build, resolved once."""
+    __slots__ = ("exists", "parts", "selected", "missing", "status", "description", "next_action")
+
+    def __init__(self, raw_parts: Tuple[Optional[str], ...], exists: bool = True):
+        self.exists = exists
+        self.parts: Tuple[str, ...] = tuple(get_short_part_name(part) for part in raw_parts)
+        self.selected: Tuple[str, ...] = tuple(
+            f"{title}: {short}"
+            for (_, _, title), raw, short in zip(PART_FIELDS, raw_parts, self.parts)
+            if raw
+        )
+        self.missing: Tuple[str, ...] = tuple(
+            label for (_, label, _), raw in zip(PART_FIELDS, raw_parts) if not raw
+        )
+
+        if not self.missing:
+            self.status = "COMPLETE"
+            self.description = "✅ COMPLETE F1 BUILD: " + ", ".join(self.selected)
+            self.next_action = COMPLETE_ACTION
+        elif self.selected:
+            self.status = "IN_PROGRESS"
+            self.description = f"🔧 PARTIAL BUILD ({len(self.selected)}/5): " + ", ".join(self.selected)
+            self.next_action = f"Next, select your {self.next_missing}: {NEXT_PART_SUGGESTIONS[self.next_missing]}."
+        else:
+            self.status = "INCOMPLETE"
+            self.description = "No F1 parts selected yet"
+            self.next_action = START_ACTION
+
+    @classmethod
+    def from_build(cls, build: Optional[Any]) -> "BuildState":
+        """Resolve a CarBuild (or None) without memoization."""
+        if not build:
+            return cls((None,) * len(PART_FIELDS), exists=False)
+        return cls(tuple(getattr(build, field) for field, _, _ in PART_FIELDS))
+
+    @property
+    def is_complete(self) -> bool:
+        return not self.missing
+
+    @property
+    def selected_mask(self) -> int:
+        """Bit i is set when the i-th part in PART_FIELDS is selected (0-31)."""
+        return sum(1 << i for i, (_, label, _) in enumerate(PART_FIELDS) if label not in self.missing)
+
+    @property
+    def next_missing(self) -> Optional[str]:
+        return self.missing[0] if self.missing else None
+
+    def fallback_reply(self, player_name: str) -> str:
+        """Build-aware reply used when the model returns nothing usable."""
+        if self.exists and self.is_complete:
+            return f"Perfect build, {player_name}! Your car is race-ready. Focus on your racing line and you'll do great!"
+        if self.exists:
+            return f"Let's focus on selecting your {self.next_missing} next, {player_name}."
+        return f"Hey {player_name}! Let's start building your F1 car. What would you like to work on first?"
+
+    def correction_reply(self, player_name: str) -> str:
+        """Reply that replaces a completion mentioning non-F1 cars or parts."""
+        if self.exists and self.is_complete:
+            return f"Perfect F1 setup, {player_name}! Your car is race-ready with all components selected."
+        # Nothing chosen among chassis, engine and tires yet
+        if not self.exists or set(self.missing) >= {"chassis", "engine", "tires"}:
+            return f"Let's build your F1 car, {player_name}. Start by choosing a chassis: Standard Monocoque or Ground Effect Optimized."
+        return CORRECTION_REPLIES[self.next_missing]
+
+    def __repr__(self) -> str:
+        return f"<BuildState(status={self.status}, parts={self.parts})>"
+
+
+EMPTY_BUILD_STATE = BuildState.from_build(None)
+
+_memo: "OrderedDict[int, BuildState]" = OrderedDict()
+_memo_lock = threading.Lock()
+_MEMO_SIZE = 4096
+
+
+def get_build_state(build: Optional[Any]) -> BuildState:
+    """BuildState for ``build``, memoized by build id.
+
+    Args:
+        build: CarBuild row, or None when the player has no build yet
+
+    Returns:
+        The shared BuildState for that row
+    """
+    if not build:
+        return EMPTY_BUILD_STATE
+
+    build_id = getattr(build, "id", None)
+    if build_id is None:
+        return BuildState.from_build(build)
+
+    with _memo_lock:
+        state = _memo.get(build_id)
+        if state is not None:
+            _memo.move_to_end(build_id)
+            return state
+
+    state = BuildState.from_build(build)
+    with _memo_lock:
+        _memo[build_id] = state
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return state
@@ -34,6 +34,36 @@ class Config:
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "groq")
     LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))  # Keep-alive pool size per provider client
+    LLM_TIMEOUT_SEC: float = float(os.getenv("LLM_TIMEOUT_SEC", "20"))  # Default per-call timeout for cloud providers
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "1"))  # SDK-level retries before failing over
+    
+    # Provider Failover Chain
+    # Ordered list of groq, openai, huggingface, local, rules; empty keeps the
+    # single-backend behaviour selected by USE_EXTERNAL_LLM / LLM_PROVIDER.
+    LLM_PROVIDER_CHAIN: List[str] = [
+        name.strip().lower()
+        for name in os.getenv("LLM_PROVIDER_CHAIN", "").split(",")
+        if name.strip()
+    ]
+    LLM_PROVIDER_TIMEOUTS: Dict[str, float] = {
+        name.strip().lower(): float(value)
+        for name, value in (
+            item.split("=", 1)
+            for item in os.getenv("LLM_PROVIDER_TIMEOUTS", "").split(",")  # e.g. "groq=8,openai=15"
+            if "=" in item
+        )
+    }
+    GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
+    GROQ_MODEL: str = os.getenv("GROQ_MODEL", "")
+    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "")
+    HUGGINGFACE_API_KEY: str = os.getenv("HUGGINGFACE_API_KEY", "")
+    HUGGINGFACE_MODEL: str = os.getenv("HUGGINGFACE_MODEL", "")
+    CIRCUIT_BREAKER_FAILURES: int = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "3"))  # Consecutive failures before opening
+    CIRCUIT_BREAKER_RESET_SEC: float = float(os.getenv("CIRCUIT_BREAKER_RESET_SEC", "30"))  # Cool-down before a trial call
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))  # Start the next provider once this latency percentile passes
     
     MODEL_PATH: str = os.getenv("MODEL_PATH", "./models/mistral-7b-instruct-v0.1.Q2_K.gguf")
     MODEL_N_THREADS: int = int(os.getenv("MODEL_N_THREADS", "2"))
@@ -41,6 +71,33 @@ class Config:
     MODEL_N_BATCH: int = int(os.getenv("MODEL_N_BATCH", "128"))
     MODEL_TEMPERATURE: float = float(os.getenv("MODEL_TEMPERATURE", "0.4"))
     MODEL_MAX_TOKENS: int = int(os.getenv("MODEL_MAX_TOKENS", "150"))
+    MODEL_DRAFT_MODE: str = os.getenv("MODEL_DRAFT_MODE", "none").lower()  # "prompt_lookup" drafts tokens from spans already in the prompt
+    MODEL_DRAFT_TOKENS: int = int(os.getenv("MODEL_DRAFT_TOKENS", "2"))  # Tokens drafted per step; ~2 suits CPU, ~10 suits GPU
+    CONSTRAINED_GENERATION: bool = os.getenv("CONSTRAINED_GENERATION", "false").lower() == "true"  # Ban non-F1 terms via logit_bias and cap sentences via grammar
+    REPLY_MAX_SENTENCES: int = int(os.getenv("REPLY_MAX_SENTENCES", "3"))
+    MODEL_LOAD_WAIT_SEC: float = float(os.getenv("MODEL_LOAD_WAIT_SEC", "0"))  # Hold chat turns this long while the model loads; 0 answers with the rule-based reply
+    
+    # Local Inference Scheduler Settings
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "1"))  # One model instance per worker
+    INFERENCE_QUEUE_SIZE: int = int(os.getenv("INFERENCE_QUEUE_SIZE", "8"))  # Requests waiting beyond this get a 503
+    INFERENCE_TIMEOUT_SEC: float = float(os.getenv("INFERENCE_TIMEOUT_SEC", "60"))  # Per-request deadline
+    INFERENCE_PROCESSES: int = int(os.getenv("INFERENCE_PROCESSES", "0"))  # >0 runs the model in this many worker processes instead of threads
+    INFERENCE_THREADS_PER_PROCESS: int = int(os.getenv("INFERENCE_THREADS_PER_PROCESS", os.getenv("MODEL_N_THREADS", "2")))  # llama.cpp threads per worker process
+    
+    # Prompt Prefix / KV-State Cache (local model only)
+    PROMPT_CACHE_ENABLED: bool = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+    PROMPT_CACHE_RAM_BYTES: int = int(os.getenv("PROMPT_CACHE_RAM_BYTES", str(2 << 30)))  # 2 GiB of saved player states
+    PROMPT_CACHE_DISK_DIR: str = os.getenv("PROMPT_CACHE_DISK_DIR", "")  # Empty disables the disk tier
+    PROMPT_CACHE_DISK_BYTES: int = int(os.getenv("PROMPT_CACHE_DISK_BYTES", str(8 << 30)))  # Cap on spilled states, least recently used deleted first
+    
+    # Generation Response Cache
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    RESPONSE_CACHE_TTL_SEC: float = float(os.getenv("RESPONSE_CACHE_TTL_SEC", "3600"))
+    RESPONSE_CACHE_DISK_PATH: str = os.getenv("RESPONSE_CACHE_DISK_PATH", "")  # SQLite file shared by workers; empty disables
+
+    # Intent fast path (deterministic build questions answered without the LLM)
+    INTENT_FAST_PATH_ENABLED: bool = os.getenv("INTENT_FAST_PATH_ENABLED", "true").lower() == "true"
     
     # Sentiment Analysis Settings
     SENTIMENT_MODEL: str = os.getenv(
@@ -48,6 +105,20 @@ class Config:
         "cardiffnlp/twitter-roberta-base-sentiment"
     )
     SENTIMENT_CACHE_SIZE: int = int(os.getenv("SENTIMENT_CACHE_SIZE", "1000"))
+    SENTIMENT_BACKEND: str = os.getenv("SENTIMENT_BACKEND", "torch").lower()  # torch | onnx | onnx_int8
+    SENTIMENT_ONNX_DIR: str = os.getenv("SENTIMENT_ONNX_DIR", "./models/sentiment-onnx")  # Exported models are cached here
+    SENTIMENT_ONNX_THREADS: int = int(os.getenv("SENTIMENT_ONNX_THREADS", "0"))  # onnxruntime intra-op threads; 0 lets it decide
+    SENTIMENT_WARMUP_ENABLED: bool = os.getenv("SENTIMENT_WARMUP_ENABLED", "true").lower() == "true"  # Load and warm the model in the background at startup
+    SENTIMENT_MAX_TOKENS: int = int(os.getenv("SENTIMENT_MAX_TOKENS", "160"))  # Covers a MAX_DIALOGUE_LENGTH message or a MODEL_MAX_TOKENS reply in English; the model allows 512
+    SENTIMENT_BUCKET_SIZE: int = int(os.getenv("SENTIMENT_BUCKET_SIZE", "16"))  # Batches are split into length-sorted buckets of this size
+    SENTIMENT_BATCH_ENABLED: bool = os.getenv("SENTIMENT_BATCH_ENABLED", "true").lower() == "true"  # Coalesce concurrent requests into one forward pass
+    SENTIMENT_BATCH_MAX_SIZE: int = int(os.getenv("SENTIMENT_BATCH_MAX_SIZE", "16"))
+    SENTIMENT_BATCH_MAX_WAIT_MS: float = float(os.getenv("SENTIMENT_BATCH_MAX_WAIT_MS", "5"))  # Longest a request waits for others to join its batch
+    NPC_SENTIMENT_DEFERRED: bool = os.getenv("NPC_SENTIMENT_DEFERRED", "true").lower() == "true"  # Fill npc_sentiment in the background instead of per turn
+    SENTIMENT_JOB_QUEUE_SIZE: int = int(os.getenv("SENTIMENT_JOB_QUEUE_SIZE", "1000"))  # Replies waiting beyond this are scored inline
+    SENTIMENT_JOB_BATCH_SIZE: int = int(os.getenv("SENTIMENT_JOB_BATCH_SIZE", "32"))
+    SENTIMENT_JOB_MAX_WAIT_MS: float = float(os.getenv("SENTIMENT_JOB_MAX_WAIT_MS", "200"))
+    SENTIMENT_JOB_DRAIN_SEC: float = float(os.getenv("SENTIMENT_JOB_DRAIN_SEC", "10"))  # Shutdown waits this long for queued jobs
     
     # Security Settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -69,8 +140,18 @@ class Config:
     ]
     
     # Chat Settings
-    MAX_CONVERSATION_HISTORY: int = int(os.getenv("MAX_CONVERSATION_HISTORY", "20"))  # Fetch more from DB
+    MAX_CONVERSATION_HISTORY: int = int(os.getenv("MAX_CONVERSATION_HISTORY", "50"))  # Upper bound fetched from DB; the packer trims to the token budget
     CONTEXT_WINDOW: int = int(os.getenv("CONTEXT_WINDOW", "15"))  # Send more to LLM for better memory
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # Max tokens of history per prompt
+    CONTEXT_SAFETY_TOKENS: int = int(os.getenv("CONTEXT_SAFETY_TOKENS", "32"))  # Headroom for tokenizer/template drift
+    CONTEXT_TOKEN_CACHE_SIZE: int = int(os.getenv("CONTEXT_TOKEN_CACHE_SIZE", "4096"))  # Cached per-message token counts
+    
+    # Rolling Conversation Summaries
+    SUMMARY_ENABLED: bool = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+    SUMMARY_EVERY_N_TURNS: int = int(os.getenv("SUMMARY_EVERY_N_TURNS", "10"))  # Turns folded in per background update
+    SUMMARY_KEEP_RECENT_TURNS: int = int(os.getenv("SUMMARY_KEEP_RECENT_TURNS", "10"))  # Turns always sent verbatim
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", "120"))
+    SUMMARY_MAX_CHARS: int = int(os.getenv("SUMMARY_MAX_CHARS", "800"))
     
     # NPC Settings
     DEFAULT_NPC_ID: int = int(os.getenv("DEFAULT_NPC_ID", "1"))
@@ -129,6 +210,12 @@ class Config:
                 raise ValueError(f"LLM_API_KEY must be set when USE_EXTERNAL_LLM=true. Get free key at: https://console.groq.com/keys")
             print("✅ LLM_API_KEY is set")
         
+        if cls.SENTIMENT_BACKEND not in ("torch", "onnx", "onnx_int8"):
+            raise ValueError(f"SENTIMENT_BACKEND must be 'torch', 'onnx' or 'onnx_int8', got '{cls.SENTIMENT_BACKEND}'")
+        
+        if cls.MODEL_DRAFT_MODE not in ("none", "prompt_lookup"):
+            raise ValueError(f"MODEL_DRAFT_MODE must be 'none' or 'prompt_lookup', got '{cls.MODEL_DRAFT_MODE}'")
+        
         if cls.REQUIRE_SERVICE_API_KEY and not cls.SERVICE_API_KEY:
             print("❌ Error: SERVICE_API_KEY is missing while REQUIRE_SERVICE_API_KEY=true")
             raise ValueError("SERVICE_API_KEY must be set when REQUIRE_SERVICE_API_KEY=true")
@@ -0,0 +1,91 @@
+"""
+Context Packer - Fits conversation history into a token budget
+History lines are added newest-first until the budget is spent, so the prompt
+never overflows the model context and never drops recent turns for old ones.
+Token counts come from the local model's tokenizer when it is loaded, or from
+a character-based estimate for cloud providers, and are cached per message.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence
+
+# Roughly four characters per token for English text on BPE vocabularies
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used when no tokenizer is available."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class TokenCounter:
+    """Counts tokens with an optional tokenizer and an LRU of past counts."""
+
+    def __init__(self, tokenize: Optional[Callable[[str], Sequence[int]]] = None, cache_size: int = 4096):
+        self.tokenize = tokenize
+        self.cache_size = cache_size
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_tokenizer(self, tokenize: Optional[Callable[[str], Sequence[int]]]) -> None:
+        """Switch tokenizers (e.g. once the local model has loaded) and drop stale counts."""
+        with self._lock:
+            self.tokenize = tokenize
+            self._counts.clear()
+
+    def count(self, text: str, cache: bool = True) -> int:
+        """Number of tokens in ``text``.
+
+        Args:
+            text: Text to measure
+            cache: Remember the count; pass False for one-off strings such as
+                whole prompts so they do not push out per-message counts
+        """
+        with self._lock:
+            cached = self._counts.get(text)
+            if cached is not None:
+                self._counts.move_to_end(text)
+                return cached
+
+        if self.tokenize is not None:
+            try:
+                tokens = len(self.tokenize(text))
+            except Exception as e:
+                print(f"⚠️ Tokenizer failed, estimating instead: {e}")
+                tokens = estimate_tokens(text)
+        else:
+            tokens = estimate_tokens(text)
+
+        if not cache:
+            return tokens
+        with self._lock:
+            self._counts[text] = tokens
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return tokens
+
+
+def pack_newest_first(lines: List[str], budget: int, counter: TokenCounter, separator: str = "\n") -> List[str]:
+    """Keep the newest lines whose combined size fits ``budget`` tokens.
+
+    Args:
+        lines: History lines in chronological order (oldest first)
+        budget: Maximum number of tokens the packed lines may use
+        counter: Token counter to measure each line with
+        separator: String the caller joins lines with
+
+    Returns:
+        The kept lines, still in chronological order
+    """
+    separator_tokens = counter.count(separator) if separator else 0
+    packed: List[str] = []
+    used = 0
+    for line in reversed(lines):
+        cost = counter.count(line) + (separator_tokens if packed else 0)
+        if used + cost > budget:
+            break
+        packed.append(line)
+        used += cost
+    packed.reverse()
+    return packed
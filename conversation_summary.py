@@ -0,0 +1,104 @@
+"""
+Conversation Summary - Folds old turns into a rolling per-player summary
+Turns that are about to leave the prompt window are summarized in the
+background, so Dax keeps early build decisions in mind while the prompt
+itself stays a constant size.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, List, Set
+
+from config import config
+
+SUMMARY_PROMPT = """Summarize this F1 car-building conversation between a player and Dax, their race engineer.
+Keep the player's build decisions, stated preferences and open questions. Write at most 3 short sentences.
+
+PREVIOUS SUMMARY:
+{previous}
+
+NEW TURNS:
+{turns}
+
+UPDATED SUMMARY:"""
+
+
+def _render_turns(turns: List[Any]) -> str:
+    return "\n".join(
+        f"Player: {turn.dialogue}\nDax: {(turn.npc_reply or '').strip()}"
+        for turn in turns
+    )
+
+
+def _extractive_summary(previous: str, turns: List[Any]) -> str:
+    """Fallback when no model answers: keep what the player said, newest last."""
+    notes = [f"Player said: {turn.dialogue.strip()[:120]}" for turn in turns]
+    text = " ".join(filter(None, [previous.strip()] + notes))
+    return text[-config.SUMMARY_MAX_CHARS:]
+
+
+def summarize_turns(previous: str, turns: List[Any]) -> str:
+    """Fold ``turns`` into ``previous`` and return the new summary text.
+
+    Args:
+        previous: Existing summary ("" if none yet)
+        turns: NPCMemory rows to fold in, oldest first
+
+    Returns:
+        Updated summary, at most SUMMARY_MAX_CHARS characters
+    """
+    # Imported lazily so importing this module does not load the model
+    from llamacpp import provider_chain
+
+    prompt = SUMMARY_PROMPT.format(previous=previous or "(none)", turns=_render_turns(turns))
+    try:
+        text, _ = provider_chain.generate(
+            prompt,
+            config.SUMMARY_MAX_TOKENS,
+            0.2,
+            # Not a Dax reply: skip the reply stop sequences, grammar and logit_bias
+            dax_reply=False
+        )
+        text = text.strip()
+    except Exception as e:
+        print(f"⚠️ Summary generation failed: {e}")
+        text = ""
+
+    if len(text) < 20:
+        return _extractive_summary(previous, turns)
+    return text[:config.SUMMARY_MAX_CHARS]
+
+
+class BackgroundSummarizer:
+    """Single background thread that runs at most one update per key at a time."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self._pending: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable[[], None]) -> bool:
+        """Queue ``fn`` unless an update for ``key`` is already pending.
+
+        Returns:
+            True if the job was queued
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+
+        def _run() -> None:
+            try:
+                fn()
+            except Exception as e:
+                print(f"❌ Background summary update failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        self._executor.submit(_run)
+        return True
+
+
+summarizer = BackgroundSummarizer()
@@ -1,8 +1,9 @@
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, pool
+from sqlalchemy import create_engine, make_url, pool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
@@ -33,6 +34,50 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Async driver for each sync URL scheme used in DATABASE_URL
+_ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Rewrite a sync DATABASE_URL for its async driver (asyncpg / aiosqlite).
+
+    asyncpg does not understand libpq's ``sslmode``, so it is passed on as
+    asyncpg's ``ssl`` argument instead.
+    """
+    url = make_url(url)
+    url = url.set(drivername=_ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url.render_as_string(hide_password=False)
+
+
+# Async engine used by request handlers, so database I/O never blocks the
+# event loop. The sync engine above stays for background threads and scripts.
+try:
+    async_engine = create_async_engine(
+        async_database_url(config.DATABASE_URL),
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        echo=False
+    )
+except Exception as e:
+    print(f"❌ FAILED to create async database engine: {e}")
+    raise
+
+# Objects stay readable after commit, as lazy refreshes cannot run under asyncio
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
@@ -42,4 +87,9 @@ def get_db() -> Generator:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async DB session
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
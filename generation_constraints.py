@@ -0,0 +1,102 @@
+"""
+Generation Constraints - Keeps Dax on-topic and short at sampling time
+Non-F1 brands and parts are banned through logit_bias and replies are held
+to a sentence budget by a GBNF grammar, so the model stops early instead of
+rambling to MODEL_MAX_TOKENS and producing text the hallucination scan would
+throw away. Local GGUF models get both; OpenAI gets logit_bias (through the
+optional ``tiktoken`` package); other cloud providers only get the sentence
+trim applied to their reply.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from reply_postprocess import INVALID_CAR_BRANDS, INVALID_PARTS
+
+BANNED_TERMS: List[str] = INVALID_CAR_BRANDS + INVALID_PARTS
+
+# Strongest bias both llama.cpp and the OpenAI API accept
+BAN_BIAS = -100.0
+
+_SENTENCE_END = re.compile(r"[.!?]+(?:\s+|$)")
+
+
+def _spellings(term: str) -> List[str]:
+    """Spellings of ``term`` a tokenizer may see, with and without a leading space."""
+    forms = {term, term.capitalize(), term.title(), term.upper()}
+    return sorted(prefix + form for form in forms for prefix in ("", " "))
+
+
+def banned_token_bias(tokenize: Callable[[str], Sequence[int]], terms: Iterable[str] = BANNED_TERMS) -> Dict[str, float]:
+    """logit_bias entries banning every spelling of ``terms`` that is one token.
+
+    Terms that split into several tokens are left alone: banning their first
+    piece would also ban ordinary words ("different" for "differential").
+    The post-generation scan still catches those.
+
+    Args:
+        tokenize: Function returning the token ids of a string (no BOS)
+        terms: Words to ban
+
+    Returns:
+        ``{token_id: -100.0}`` with ids as strings, as both APIs accept
+    """
+    bias: Dict[str, float] = {}
+    for term in terms:
+        for spelling in _spellings(term):
+            ids = tokenize(spelling)
+            if len(ids) == 1:
+                bias[str(ids[0])] = BAN_BIAS
+    return bias
+
+
+def sentence_grammar(max_sentences: int) -> str:
+    """GBNF grammar for one to ``max_sentences`` single-line sentences."""
+    extra = max(0, max_sentences - 1)
+    return (
+        f'root ::= sentence (" " sentence){{0,{extra}}}\n'
+        'sentence ::= [^.!?\\n]+ [.!?]+\n'
+    )
+
+
+def limit_sentences(text: str, max_sentences: int) -> str:
+    """Trim ``text`` to its first ``max_sentences`` sentences."""
+    if max_sentences <= 0:
+        return text
+    count = 0
+    for match in _SENTENCE_END.finditer(text):
+        count += 1
+        if count == max_sentences:
+            return text[:match.end()].strip()
+    return text
+
+
+def exceeds_sentence_budget(text: str, max_sentences: int) -> bool:
+    """Whether ``text`` has started a sentence beyond the budget (used to stop streams early)."""
+    return max_sentences > 0 and len(limit_sentences(text, max_sentences)) < len(text.strip())
+
+
+def local_constraint_params(model: Any, max_sentences: int) -> Dict[str, Any]:
+    """Extra ``Llama.__call__`` kwargs (logit_bias and grammar) for ``model``."""
+    from llama_cpp import LlamaGrammar
+
+    bias = banned_token_bias(lambda text: model.tokenize(text.encode("utf-8"), add_bos=False, special=False))
+    grammar = LlamaGrammar.from_string(sentence_grammar(max_sentences), verbose=False)
+    print(f"✅ Constrained generation: {len(bias)} banned tokens, at most {max_sentences} sentences")
+    return {"logit_bias": bias, "grammar": grammar}
+
+
+@lru_cache(maxsize=8)
+def openai_logit_bias(model: str) -> Optional[Dict[str, float]]:
+    """logit_bias for an OpenAI model, or None if ``tiktoken`` is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        print("⚠️ tiktoken not installed; OpenAI requests are sent without logit_bias")
+        return None
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return banned_token_bias(encoding.encode) or None
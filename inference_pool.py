@@ -0,0 +1,437 @@
+"""
+Inference Pool - Local GGUF inference spread over worker processes
+Each worker process owns one Llama instance (with its own thread allotment
+and prompt-state cache) and talks to the web tier over multiprocessing
+queues. Jobs are routed sticky by player id, so a player's follow-up turns
+land on the worker that already holds their KV state.
+"""
+
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from inference_scheduler import DeadlineExceededError, QueueFullError
+
+# Message kinds sent from workers back to the web tier
+_READY = "ready"
+_LOAD_FAILED = "load_failed"
+_TOKEN = "token"
+_DONE = "done"
+_ERROR = "error"
+
+# How often the dispatcher checks that worker processes are still alive
+_REAP_INTERVAL_SEC = 1.0
+
+
+class WorkerError(RuntimeError):
+    """Raised when a worker process fails a job or dies while running it."""
+
+
+# =============================================================================
+# Worker process side
+# =============================================================================
+
+def _listen_for_cancels(control: Any, cancelled: set, lock: threading.Lock) -> None:
+    while True:
+        job_id = control.get()
+        if job_id is None:
+            return
+        with lock:
+            cancelled.add(job_id)
+
+
+def _forget_cancels_before(cancelled: set, lock: threading.Lock, job_id: int) -> None:
+    """Drop cancels for jobs this worker has already skipped or finished.
+
+    Job ids only grow and a worker takes its jobs in order, so a cancel below
+    the current id can no longer match anything; one that arrived after its
+    job finished would otherwise stay in the set for good.
+    """
+    with lock:
+        stale = [cancelled_id for cancelled_id in cancelled if cancelled_id < job_id]
+        cancelled.difference_update(stale)
+
+
+def _worker_main(index: int, settings: Dict[str, Any], jobs: Any, control: Any, results: Any) -> None:
+    """Entry point of a worker process: load the model, then serve jobs."""
+    try:
+        from llama_cpp import Llama
+        from prompt_cache import PromptStateCache, model_identity
+
+        draft_model = None
+        if settings["draft_tokens"]:
+            from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+            draft_model = LlamaPromptLookupDecoding(num_pred_tokens=settings["draft_tokens"])
+
+        model = Llama(
+            model_path=settings["model_path"],
+            n_threads=settings["n_threads"],
+            n_ctx=settings["n_ctx"],
+            n_batch=settings["n_batch"],
+            draft_model=draft_model,
+            verbose=False
+        )
+        cache = None
+        if settings["prompt_cache_bytes"]:
+            cache = PromptStateCache(
+                capacity_bytes=settings["prompt_cache_bytes"],
+                disk_dir=settings["prompt_cache_dir"],
+                disk_capacity_bytes=settings["prompt_cache_disk_bytes"],
+                model_id=model_identity(settings["model_path"], settings["n_ctx"])
+            )
+            if settings["prefix"]:
+                cache.warm_prefix(model, settings["prefix"])
+        constraints: Dict[str, Any] = {}
+        if settings["max_sentences"]:
+            from generation_constraints import local_constraint_params
+            constraints = local_constraint_params(model, settings["max_sentences"])
+    except Exception as e:
+        results.put((None, _LOAD_FAILED, (index, f"{type(e).__name__}: {e}")))
+        return
+
+    cancelled: set = set()
+    cancelled_lock = threading.Lock()
+    threading.Thread(target=_listen_for_cancels, args=(control, cancelled, cancelled_lock), daemon=True).start()
+    results.put((None, _READY, index))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, prompt, player_id, params, constrained, stream, deadline = job
+        _forget_cancels_before(cancelled, cancelled_lock, job_id)
+        if job_id in cancelled or time.time() > deadline:
+            with cancelled_lock:
+                cancelled.discard(job_id)
+            results.put((job_id, _ERROR, "DeadlineExceededError: deadline passed while queued"))
+            continue
+        try:
+            if cache is not None:
+                cache.restore(model, player_id, prompt)
+            if stream:
+                for chunk in model(prompt, stream=True, echo=False, **params, **(constraints if constrained else {})):
+                    if job_id in cancelled or time.time() > deadline:
+                        break
+                    text = chunk["choices"][0].get("text", "") if isinstance(chunk, dict) else ""
+                    if text:
+                        results.put((job_id, _TOKEN, text))
+                text = None
+            else:
+                output = model(prompt, echo=False, **params, **(constraints if constrained else {}))
+                text = output["choices"][0]["text"].strip()
+            if cache is not None and player_id is not None:
+                cache.save(model, player_id)
+            results.put((job_id, _DONE, text))
+        except Exception as e:
+            results.put((job_id, _ERROR, f"{type(e).__name__}: {e}"))
+        finally:
+            with cancelled_lock:
+                cancelled.discard(job_id)
+
+
+# =============================================================================
+# Web tier side
+# =============================================================================
+
+class _Worker:
+    """Handle on one worker process and the jobs it is running."""
+    __slots__ = ("index", "process", "jobs", "control", "status", "error", "in_flight", "completed", "failed")
+
+    def __init__(self, index: int, process: Any, jobs: Any, control: Any):
+        self.index = index
+        self.process = process
+        self.jobs = jobs
+        self.control = control
+        self.status = "loading"
+        self.error: Optional[str] = None
+        self.in_flight: Dict[int, "queue.Queue"] = {}
+        self.completed = 0
+        self.failed = 0
+
+
+class InferenceWorkerPool:
+    """N worker processes, each with its own model, behind sticky routing.
+
+    Every worker accepts up to ``max_queue_size`` jobs (running plus
+    waiting). A player's turns go to ``player_id % processes``; if that
+    worker is full the job spills over to the least busy worker rather than
+    being rejected, and :class:`QueueFullError` is raised only when every
+    worker is full.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        threads_per_process: int,
+        model_path: str,
+        n_ctx: int,
+        n_batch: int,
+        max_queue_size: int = 8,
+        default_timeout: float = 60.0,
+        prompt_cache_bytes: int = 0,
+        prompt_cache_dir: str = "",
+        prompt_cache_disk_bytes: int = 0,
+        prefix: str = "",
+        draft_tokens: int = 0,
+        max_sentences: int = 0
+    ):
+        if processes < 1:
+            raise ValueError("InferenceWorkerPool needs at least one process")
+
+        self.max_queue_size = max_queue_size
+        self.default_timeout = default_timeout
+        self.threads_per_process = threads_per_process
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._sticky_hits = 0
+        self._spilled = 0
+        self._rejected = 0
+
+        # Spawn (not fork) so children never inherit the web tier's threads or sockets
+        context = multiprocessing.get_context("spawn")
+        self._results = context.Queue()
+        self._workers: List[_Worker] = []
+        for index in range(processes):
+            settings = {
+                "model_path": model_path,
+                "n_threads": threads_per_process,
+                "n_ctx": n_ctx,
+                "n_batch": n_batch,
+                "prompt_cache_bytes": prompt_cache_bytes,
+                # Each worker gets its own disk tier so pickled states never collide
+                "prompt_cache_dir": f"{prompt_cache_dir.rstrip('/')}/worker-{index}" if prompt_cache_dir else "",
+                "prompt_cache_disk_bytes": prompt_cache_disk_bytes,
+                "prefix": prefix,
+                # >0 enables prompt-lookup speculative decoding
+                "draft_tokens": draft_tokens,
+                # >0 bans non-F1 terms and caps replies at this many sentences
+                "max_sentences": max_sentences,
+            }
+            jobs, control = context.Queue(), context.Queue()
+            process = context.Process(
+                target=_worker_main,
+                args=(index, settings, jobs, control, self._results),
+                name=f"llm-process-{index}",
+                daemon=True
+            )
+            process.start()
+            self._workers.append(_Worker(index, process, jobs, control))
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="llm-pool-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> int:
+        """Block until every worker has loaded or failed; returns the ready count."""
+        with self._ready:
+            self._ready.wait_for(lambda: all(w.status != "loading" for w in self._workers), timeout)
+            return sum(1 for w in self._workers if w.status == "ready")
+
+    def load_errors(self) -> List[str]:
+        with self._lock:
+            return [f"worker {w.index}: {w.error}" for w in self._workers if w.error]
+
+    def generate(
+        self,
+        prompt: str,
+        player_id: Optional[int],
+        params: Dict[str, Any],
+        timeout: Optional[float] = None,
+        constrained: bool = True
+    ) -> str:
+        """Run a completion on a worker and return its text.
+
+        Args:
+            prompt: Full prompt text
+            player_id: Player the turn belongs to (used for sticky routing)
+            params: Keyword arguments for ``Llama.__call__`` (max_tokens, stop, ...)
+            timeout: Deadline in seconds (defaults to ``default_timeout``)
+            constrained: Apply the worker's reply grammar/logit_bias, if it has one
+
+        Raises:
+            QueueFullError: If every worker is at capacity
+            DeadlineExceededError: If no result arrives within ``timeout``
+            WorkerError: If the worker fails the job or dies
+        """
+        text = None
+        for kind, payload in self._submit(prompt, player_id, params, constrained, stream=False, timeout=timeout):
+            if kind == _DONE:
+                text = payload
+        return text or ""
+
+    def stream(
+        self,
+        prompt: str,
+        player_id: Optional[int],
+        params: Dict[str, Any],
+        timeout: Optional[float] = None,
+        constrained: bool = True
+    ) -> Iterator[str]:
+        """Like :meth:`generate` but yields tokens as the worker produces them.
+
+        Closing the generator early tells the worker to stop generating.
+        """
+        for kind, payload in self._submit(prompt, player_id, params, constrained, stream=True, timeout=timeout):
+            if kind == _TOKEN:
+                yield payload
+
+    def is_saturated(self) -> bool:
+        """Whether a new job would currently be rejected."""
+        with self._lock:
+            return not any(self._has_capacity(w) for w in self._workers)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-worker load and routing counters."""
+        with self._lock:
+            return {
+                "processes": len(self._workers),
+                "threads_per_process": self.threads_per_process,
+                "max_queue_size": self.max_queue_size,
+                "in_flight": sum(len(w.in_flight) for w in self._workers),
+                "sticky_hits": self._sticky_hits,
+                "spilled": self._spilled,
+                "rejected": self._rejected,
+                "workers": [
+                    {
+                        "index": w.index,
+                        "status": w.status,
+                        "alive": w.process.is_alive(),
+                        "in_flight": len(w.in_flight),
+                        "completed": w.completed,
+                        "failed": w.failed,
+                    }
+                    for w in self._workers
+                ],
+            }
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the worker processes once their current job is done."""
+        for worker in self._workers:
+            worker.jobs.put(None)
+            worker.control.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _has_capacity(self, worker: _Worker) -> bool:
+        return worker.status == "ready" and len(worker.in_flight) < self.max_queue_size
+
+    def _route(self, player_id: Optional[int]) -> _Worker:
+        """Pick a worker (caller holds the lock)."""
+        if player_id is not None:
+            sticky = self._workers[player_id % len(self._workers)]
+            if self._has_capacity(sticky):
+                self._sticky_hits += 1
+                return sticky
+
+        candidates = [w for w in self._workers if self._has_capacity(w)]
+        if not candidates:
+            self._rejected += 1
+            raise QueueFullError(f"All {len(self._workers)} inference processes are at capacity")
+        if player_id is not None:
+            self._spilled += 1
+        return min(candidates, key=lambda w: len(w.in_flight))
+
+    def _submit(self, prompt: str, player_id: Optional[int], params: Dict[str, Any], constrained: bool, stream: bool, timeout: Optional[float]) -> Iterator[tuple]:
+        timeout = timeout or self.default_timeout
+        deadline = time.monotonic() + timeout
+        replies: "queue.Queue" = queue.Queue()
+
+        with self._lock:
+            worker = self._route(player_id)
+            # Ids are taken and queued under the lock so each worker sees them in increasing order
+            job_id = next(self._ids)
+            worker.in_flight[job_id] = replies
+            worker.jobs.put((job_id, prompt, player_id, params, constrained, stream, time.time() + timeout))
+
+        finished = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError(f"Inference did not finish within {timeout:.1f}s")
+                try:
+                    kind, payload = replies.get(timeout=remaining)
+                except queue.Empty:
+                    raise DeadlineExceededError(f"Inference did not finish within {timeout:.1f}s")
+                if kind == _ERROR:
+                    finished = True
+                    if payload.startswith("DeadlineExceededError"):
+                        raise DeadlineExceededError(payload)
+                    raise WorkerError(payload)
+                yield kind, payload
+                if kind == _DONE:
+                    finished = True
+                    return
+        finally:
+            if not finished:
+                # Abandoned (timeout or caller stopped reading): stop the worker early
+                worker.control.put(job_id)
+                with self._lock:
+                    worker.in_flight.pop(job_id, None)
+
+    def _dispatch_loop(self) -> None:
+        """Route worker messages to the waiting callers.
+
+        Worker liveness is checked on a fixed timer rather than only when the
+        result queue goes quiet, so a crashed worker is noticed under load too.
+        """
+        next_reap = time.monotonic() + _REAP_INTERVAL_SEC
+        while True:
+            now = time.monotonic()
+            if now >= next_reap:
+                self._reap_dead_workers()
+                next_reap = now + _REAP_INTERVAL_SEC
+            try:
+                job_id, kind, payload = self._results.get(timeout=max(0.0, next_reap - now))
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+
+            with self._lock:
+                if job_id is None:
+                    index, error = (payload, None) if kind == _READY else payload
+                    worker = self._workers[index]
+                    worker.status = "ready" if kind == _READY else "failed"
+                    worker.error = error
+                    self._ready.notify_all()
+                    if error:
+                        print(f"⚠️ Inference process {index} failed to load: {error}")
+                    continue
+
+                worker = next((w for w in self._workers if job_id in w.in_flight), None)
+                if worker is None:
+                    continue  # caller already gave up on this job
+                replies = worker.in_flight[job_id]
+                if kind in (_DONE, _ERROR):
+                    del worker.in_flight[job_id]
+                    if kind == _DONE:
+                        worker.completed += 1
+                    else:
+                        worker.failed += 1
+            replies.put((kind, payload))
+
+    def _reap_dead_workers(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                if worker.status in ("loading", "ready") and not worker.process.is_alive():
+                    print(f"❌ Inference process {worker.index} exited (code {worker.process.exitcode})")
+                    worker.status = "failed"
+                    worker.error = f"process exited with code {worker.process.exitcode}"
+                    for replies in worker.in_flight.values():
+                        replies.put((_ERROR, f"WorkerError: {worker.error}"))
+                    worker.in_flight.clear()
+                    self._ready.notify_all()
@@ -0,0 +1,258 @@
+"""
+Inference Scheduler - Coordinates access to local Llama instances
+Worker threads own the model objects; callers submit jobs through a bounded
+queue with per-request deadlines and get a fast rejection when it is full.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+
+class InferenceBusyError(Exception):
+    """Raised when the scheduler cannot take or finish a job in time."""
+
+
+class QueueFullError(InferenceBusyError):
+    """Raised when the request queue is at capacity."""
+
+
+class DeadlineExceededError(InferenceBusyError):
+    """Raised when a job's deadline passes before it produces a result."""
+
+
+# Sentinel that marks the end of a streamed job
+_STREAM_END = object()
+
+
+class _Job:
+    """A unit of work waiting for (or running on) a model worker."""
+    __slots__ = ("fn", "future", "enqueued_at", "deadline", "stream_queue", "cancelled")
+
+    def __init__(self, fn: Callable[[Any], Any], deadline: float, stream_queue: Optional[queue.Queue] = None):
+        self.fn = fn
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+        self.stream_queue = stream_queue
+        self.cancelled = False
+
+
+class InferenceScheduler:
+    """Bounded job queue in front of one worker thread per model instance.
+
+    Jobs are callables that receive the worker's model, so a model object is
+    only ever touched by the thread that owns it.
+    """
+
+    def __init__(
+        self,
+        models: List[Any],
+        max_queue_size: int = 8,
+        default_timeout: float = 60.0,
+        name: str = "llm"
+    ):
+        if not models:
+            raise ValueError("InferenceScheduler needs at least one model instance")
+
+        self.max_queue_size = max_queue_size
+        self.default_timeout = default_timeout
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._wait_times: Deque[float] = deque(maxlen=512)
+        self._in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._expired = 0
+        self._closed = False
+
+        self._workers: List[threading.Thread] = []
+        for index, model in enumerate(models):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                args=(model,),
+                name=f"{name}-worker-{index}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def submit(self, fn: Callable[[Any], Any], timeout: Optional[float] = None) -> Future:
+        """Queue ``fn(model)`` and return a future for its result.
+
+        Raises:
+            QueueFullError: If the queue is already at ``max_queue_size``
+            InferenceBusyError: If the scheduler is shutting down
+        """
+        job = _Job(fn, time.monotonic() + (timeout or self.default_timeout))
+        self._enqueue(job)
+        return job.future
+
+    def run(self, fn: Callable[[Any], Any], timeout: Optional[float] = None) -> Any:
+        """Run ``fn(model)`` on a worker and block until it finishes.
+
+        Raises:
+            QueueFullError: If the queue is full
+            DeadlineExceededError: If no result is available within ``timeout``
+        """
+        timeout = timeout or self.default_timeout
+        future = self.submit(fn, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceededError(f"Inference did not finish within {timeout:.1f}s")
+
+    def stream(self, fn: Callable[[Any], Iterator[Any]], timeout: Optional[float] = None) -> Iterator[Any]:
+        """Run ``fn(model)`` on a worker and relay the items it yields.
+
+        Closing the returned generator early cancels the job, which stops the
+        worker from pulling further items out of the model.
+        """
+        timeout = timeout or self.default_timeout
+        job = _Job(fn, time.monotonic() + timeout, stream_queue=queue.Queue())
+        self._enqueue(job)
+        try:
+            while True:
+                remaining = job.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError(f"Inference did not finish within {timeout:.1f}s")
+                try:
+                    item = job.stream_queue.get(timeout=remaining)
+                except queue.Empty:
+                    raise DeadlineExceededError(f"Inference did not finish within {timeout:.1f}s")
+                if item is _STREAM_END:
+                    break
+                yield item
+            # Surface worker-side errors (including deadline expiry)
+            job.future.result()
+        finally:
+            job.cancelled = True
+
+    def is_saturated(self) -> bool:
+        """Whether a new job would currently be rejected."""
+        return self._queue.full()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, throughput counters and queue wait times."""
+        with self._lock:
+            waits = sorted(self._wait_times)
+            stats = {
+                "workers": len(self._workers),
+                "queue_depth": self._queue.qsize(),
+                "max_queue_size": self.max_queue_size,
+                "in_flight": self._in_flight,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "expired": self._expired,
+            }
+
+        if waits:
+            stats["avg_wait_ms"] = round(sum(waits) / len(waits) * 1000, 1)
+            stats["p95_wait_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1)
+            stats["max_wait_ms"] = round(waits[-1] * 1000, 1)
+        else:
+            stats["avg_wait_ms"] = stats["p95_wait_ms"] = stats["max_wait_ms"] = 0.0
+        return stats
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop taking jobs, then stop the workers once the queued ones are processed.
+
+        Waits at most ``timeout`` seconds in total; workers still busy after
+        that are left to die with the process (they are daemon threads).
+        """
+        with self._lock:
+            self._closed = True
+        deadline = time.monotonic() + timeout
+        try:
+            # One sentinel per worker, queued behind every job already accepted
+            for _ in self._workers:
+                self._queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            print(f"⚠️ Inference queue still full after {timeout}s; not waiting for the workers")
+            return
+        for worker in self._workers:
+            worker.join(timeout=max(0.0, deadline - time.monotonic()))
+        if any(worker.is_alive() for worker in self._workers):
+            print(f"⚠️ Inference workers still busy after {timeout}s")
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _enqueue(self, job: _Job) -> None:
+        # Checked under the lock so no job can land behind the shutdown sentinels
+        with self._lock:
+            if self._closed:
+                self._rejected += 1
+                raise InferenceBusyError("Inference scheduler is shutting down")
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._rejected += 1
+                raise QueueFullError(f"Inference queue is full ({self.max_queue_size} waiting)")
+            self._submitted += 1
+
+    def _worker_loop(self, model: Any) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run_job(job, model)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job: _Job, model: Any) -> None:
+        if not job.future.set_running_or_notify_cancel():
+            return
+
+        started = time.monotonic()
+        with self._lock:
+            self._wait_times.append(started - job.enqueued_at)
+
+        if job.cancelled or started > job.deadline:
+            with self._lock:
+                self._expired += 1
+            job.future.set_exception(DeadlineExceededError("Inference deadline passed while queued"))
+            if job.stream_queue is not None:
+                job.stream_queue.put(_STREAM_END)
+            return
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            result = job.fn(model)
+            if job.stream_queue is not None:
+                try:
+                    for item in result:
+                        if job.cancelled or time.monotonic() > job.deadline:
+                            break
+                        job.stream_queue.put(item)
+                finally:
+                    if hasattr(result, "close"):
+                        result.close()
+                result = None
+            job.future.set_result(result)
+            with self._lock:
+                self._completed += 1
+        except Exception as e:
+            job.future.set_exception(e)
+            with self._lock:
+                self._failed += 1
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if job.stream_queue is not None:
+                job.stream_queue.put(_STREAM_END)
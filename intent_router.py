@@ -0,0 +1,140 @@
+"""
+Intent Router - Answers deterministic build questions without the LLM
+"What should I pick next?", "Is my build done?" and "What parts do I have?"
+are classified with one compiled regex and answered from a reply table
+precomputed for all 32 selected/missing part combinations. Everything else
+goes to the model.
+"""
+
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from build_state import NEXT_PART_SUGGESTIONS, PART_FIELDS, BuildState
+
+NEXT_PART = "next_part"
+BUILD_STATUS = "build_status"
+LIST_PARTS = "list_parts"
+
+# Turns that ask for reasoning or comparison always go to the model
+_OPEN_ENDED = re.compile(
+    r"\b(why|how|explain|difference|compare|versus|vs|better|best|worse|faster|pros?|cons?|tell me about|what(?:'s| is) an?)\b"
+)
+
+# One pattern, one named group per intent; ``match.lastgroup`` is the intent
+_INTENTS = re.compile(
+    r"(?P<next_part>"
+    r"\bwhat(?:'s| is)? next\b|\bwhat now\b|\bnext (?:part|step|one)\b"
+    r"|\b(?:what|which)(?: part)? should i (?:pick|choose|select|get|do)\b"
+    r"|\bwhat do i (?:pick|choose|select|need)(?: next)?\b"
+    r")"
+    r"|(?P<build_status>"
+    r"\b(?:is|am)\b.{0,20}\b(?:done|finished|complete|ready)\b"
+    r"|\bbuild (?:done|finished|complete|ready)\b"
+    r"|\banything (?:left|missing)\b|\bwhat(?:'s| is) (?:left|missing)\b"
+    r")"
+    r"|(?P<list_parts>"
+    r"\bwhat (?:parts )?(?:do i have|have i (?:got|picked|selected|chosen))\b"
+    r"|\bwhat(?:'s| is) (?:in )?my (?:build|car|setup)\b"
+    r"|\b(?:show|list)(?: me)? my (?:parts|build|setup)\b"
+    r"|\bmy (?:current )?(?:parts|build|setup)\?"
+    r")"
+)
+
+# Longer messages usually carry more than one of these simple questions
+MAX_FAST_PATH_WORDS = 12
+
+
+def classify_intent(dialogue: str) -> Optional[str]:
+    """Return the deterministic intent of ``dialogue``, or None if open-ended."""
+    text = dialogue.lower().strip()
+    if not text or len(text.split()) > MAX_FAST_PATH_WORDS or _OPEN_ENDED.search(text):
+        return None
+    match = _INTENTS.search(text)
+    return match.lastgroup if match else None
+
+
+def _join(labels: Tuple[str, ...]) -> str:
+    if len(labels) <= 1:
+        return "".join(labels)
+    return ", ".join(labels[:-1]) + " and " + labels[-1]
+
+
+def _templates_for(mask: int) -> Dict[str, str]:
+    """Reply templates for one selected/missing combination.
+
+    Templates use ``{player_name}`` and, where needed, ``{parts}`` (the
+    selected parts with their names), which vary per player and build.
+    """
+    missing = tuple(label for i, (_, label, _) in enumerate(PART_FIELDS) if not mask & (1 << i))
+    selected_count = len(PART_FIELDS) - len(missing)
+
+    if not missing:
+        return {
+            NEXT_PART: "Nothing left to pick, {player_name} - every part is selected! Click 'Submit Feedback' whenever you're ready.",
+            BUILD_STATUS: "Yes, {player_name}, your F1 car is complete and race-ready! Click 'Submit Feedback' to finish.",
+            LIST_PARTS: "Here's your complete build, {player_name}: {parts}. She's race-ready!",
+        }
+
+    next_part = missing[0]
+    pick_next = f"pick your {next_part}: {NEXT_PART_SUGGESTIONS[next_part]}."
+    after = f" After that, {_join(missing[1:])} still need choosing." if len(missing) > 1 else " That's the last part!"
+
+    if not selected_count:
+        return {
+            NEXT_PART: "Let's start with your chassis, {player_name}: " + NEXT_PART_SUGGESTIONS["chassis"] + "." + after,
+            BUILD_STATUS: "Not yet, {player_name} - no parts are selected so far. Start by picking your chassis: " + NEXT_PART_SUGGESTIONS["chassis"] + ".",
+            LIST_PARTS: "You haven't selected any parts yet, {player_name}. Start with your chassis: " + NEXT_PART_SUGGESTIONS["chassis"] + ".",
+        }
+
+    return {
+        NEXT_PART: "Next up, {player_name}, " + pick_next + after,
+        BUILD_STATUS: (
+            f"Not yet, {{player_name}} - you have {selected_count}/5 parts. "
+            f"Still missing: {_join(missing)}. Next, {pick_next}"
+        ),
+        LIST_PARTS: f"So far you have {{parts}}, {{player_name}}. Still missing: {_join(missing)}.",
+    }
+
+
+# (intent, selected_mask) -> reply template, built once at import
+REPLY_TABLE: Dict[Tuple[str, int], str] = {
+    (intent, mask): template
+    for mask in range(1 << len(PART_FIELDS))
+    for intent, template in _templates_for(mask).items()
+}
+
+_stats_lock = threading.Lock()
+_hits: Dict[str, int] = {NEXT_PART: 0, BUILD_STATUS: 0, LIST_PARTS: 0}
+_passed_through = 0
+
+
+def answer_intent(dialogue: str, build_state: BuildState, player_name: str) -> Optional[str]:
+    """Answer ``dialogue`` from the reply table if it is a deterministic intent.
+
+    Args:
+        dialogue: The player's message
+        build_state: Resolved state of the player's current build
+        player_name: Display name of the player
+
+    Returns:
+        The reply text, or None if the turn should go to the model
+    """
+    global _passed_through
+    intent = classify_intent(dialogue)
+    with _stats_lock:
+        if intent is None:
+            _passed_through += 1
+        else:
+            _hits[intent] += 1
+    if intent is None:
+        return None
+
+    template = REPLY_TABLE[(intent, build_state.selected_mask)]
+    return template.format(player_name=player_name or "there", parts=_join(build_state.selected))
+
+
+def stats() -> Dict[str, int]:
+    """How many turns each intent answered and how many went to the model."""
+    with _stats_lock:
+        return {**_hits, "passed_to_model": _passed_through}
@@ -1,97 +1,224 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 import time
+import threading
 import os
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
-from textblob import TextBlob
-
 from config import config
-from textblob import TextBlob
+from sentiment import score_sentiment
+
+from inference_scheduler import InferenceScheduler, InferenceBusyError
+from inference_pool import InferenceWorkerPool
+from prompt_cache import PromptStateCache, model_identity
+from response_cache import ResponseCache, make_cache_key
+from context_packer import TokenCounter, pack_newest_first
+from generation_constraints import exceeds_sentence_budget, limit_sentences, local_constraint_params
+from reply_postprocess import PART_NAME_MAP, VALID_F1_PARTS, INVALID_CAR_BRANDS, INVALID_PARTS, postprocess_reply, scan_reply
+from build_state import BuildState, get_build_state, get_short_part_name
+import intent_router
+from provider_chain import AllProvidersFailedError, CircuitBreaker, Provider, ProviderChain, ProviderUnavailableError
+import llm_adapter
+from llm_adapter import FALLBACK_TEXT
+
+# Providers tried in order for each turn; "local" is the GGUF model and
+# "rules" is the build-aware canned reply in _finalize_npc_reply.
+if config.LLM_PROVIDER_CHAIN:
+    PROVIDER_CHAIN_NAMES = [llm_adapter.normalize_provider(name) for name in config.LLM_PROVIDER_CHAIN]
+elif config.USE_EXTERNAL_LLM:
+    PROVIDER_CHAIN_NAMES = [llm_adapter.primary_provider()]
+else:
+    PROVIDER_CHAIN_NAMES = ["local"]
+
+# Cache of finalized replies keyed by dialogue, build and recent context
+response_cache: Optional[ResponseCache] = None
+if config.RESPONSE_CACHE_ENABLED:
+    response_cache = ResponseCache(
+        max_entries=config.RESPONSE_CACHE_SIZE,
+        ttl_sec=config.RESPONSE_CACHE_TTL_SEC,
+        disk_path=config.RESPONSE_CACHE_DISK_PATH
+    )
 
-# Initialize local LLM only if not using external API
+# Player-independent part of the Dax prompt. It is identical for every turn,
+# so the local backend evaluates it once and reuses its KV state.
+DAX_SYSTEM_PREFIX = """You are Dax, an experienced F1 race engineer. You ONLY work with Formula 1 cars.
+
+CRITICAL INSTRUCTIONS:
+1. If BUILD STATUS is COMPLETE: Say the build is ready, offer to discuss it or answer questions, and suggest clicking "Submit Feedback"
+2. If player asks about selected parts: Reference CURRENT BUILD below accurately
+3. If player says they already selected everything but BUILD STATUS shows otherwise: Ask them to double-check their selections
+4. Be conversational and helpful like a real engineer - avoid repetitive apologies
+5. ONLY mention valid F1 parts: Standard Monocoque/Ground Effect chassis, 2004 V10/2006 V8 engines, C5 Slick/Full Wet tires, High Lift/Simple Outwash front wings, High Downforce/Low Drag rear wings
+6. Use the PLAYER NAME given below (NOT "Player12" or generic names)
+
+"""
+
+# Local LLM state. The GGUF model is loaded in a background thread started by
+# start_model_loading(), so the app can serve /health and the UI right away.
 llm = None
-if not config.USE_EXTERNAL_LLM:
+scheduler: Optional[InferenceScheduler] = None
+worker_pool: Optional[InferenceWorkerPool] = None  # Used instead of the scheduler when INFERENCE_PROCESSES > 0
+local_constraints: Dict[str, Any] = {}  # logit_bias/grammar kwargs when CONSTRAINED_GENERATION is on
+prompt_cache: Optional[PromptStateCache] = None
+model_status = "loading" if "local" in PROVIDER_CHAIN_NAMES else "not_configured"
+model_load_error: Optional[str] = None
+model_ready = threading.Event()
+_model_load_lock = threading.Lock()
+_model_load_thread: Optional[threading.Thread] = None
+
+# Count prompt tokens with the local tokenizer once loaded, otherwise estimate
+token_counter = TokenCounter(cache_size=config.CONTEXT_TOKEN_CACHE_SIZE)
+
+
+def _draft_model() -> Optional[Any]:
+    """Prompt-lookup draft model for speculative decoding, or None when disabled.
+
+    Dax replies repeat part names, the player's name and the next-action hint
+    from the prompt, so n-gram lookup in the prompt drafts tokens the model
+    often accepts, letting one forward pass emit several of them.
+    """
+    if config.MODEL_DRAFT_MODE != "prompt_lookup":
+        return None
+    from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+    return LlamaPromptLookupDecoding(num_pred_tokens=config.MODEL_DRAFT_TOKENS)
+
+
+def _load_local_model() -> None:
+    """Load the GGUF model(s), warm the prompt cache and start the scheduler or process pool."""
+    global llm, scheduler, worker_pool, prompt_cache, local_constraints, model_status, model_load_error
+    start_time = time.time()
     try:
         from llama_cpp import Llama
-        llm = Llama(
-            model_path=config.MODEL_PATH,
-            n_threads=config.MODEL_N_THREADS,
-            n_ctx=config.MODEL_N_CTX,
-            n_batch=config.MODEL_N_BATCH,
-            verbose=False
+        if config.INFERENCE_PROCESSES > 0:
+            pool = InferenceWorkerPool(
+                processes=config.INFERENCE_PROCESSES,
+                threads_per_process=config.INFERENCE_THREADS_PER_PROCESS,
+                model_path=config.MODEL_PATH,
+                n_ctx=config.MODEL_N_CTX,
+                n_batch=config.MODEL_N_BATCH,
+                max_queue_size=config.INFERENCE_QUEUE_SIZE,
+                default_timeout=config.INFERENCE_TIMEOUT_SEC,
+                prompt_cache_bytes=config.PROMPT_CACHE_RAM_BYTES // config.INFERENCE_PROCESSES if config.PROMPT_CACHE_ENABLED else 0,
+                prompt_cache_dir=config.PROMPT_CACHE_DISK_DIR,
+                prompt_cache_disk_bytes=config.PROMPT_CACHE_DISK_BYTES // config.INFERENCE_PROCESSES,
+                prefix=DAX_SYSTEM_PREFIX,
+                draft_tokens=config.MODEL_DRAFT_TOKENS if config.MODEL_DRAFT_MODE == "prompt_lookup" else 0,
+                max_sentences=config.REPLY_MAX_SENTENCES if config.CONSTRAINED_GENERATION else 0
+            )
+            ready = pool.wait_until_loaded()
+            if not ready:
+                pool.shutdown()
+                raise RuntimeError("; ".join(pool.load_errors()) or "no inference process started")
+            # The web tier only needs the vocabulary, for token counting
+            vocab = Llama(model_path=config.MODEL_PATH, vocab_only=True, verbose=False)
+            token_counter.set_tokenizer(
+                lambda text: vocab.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+            )
+            worker_pool = pool
+            model_status = "ready"
+            print(
+                f"✅ Loaded local GGUF model: {config.MODEL_PATH} ({ready}/{config.INFERENCE_PROCESSES} process(es), "
+                f"{config.INFERENCE_THREADS_PER_PROCESS} thread(s) each) in {time.time() - start_time:.1f}s"
+            )
+            return
+
+        # Each scheduler worker owns its own model instance; llama.cpp objects are not thread-safe
+        models = [
+            Llama(
+                model_path=config.MODEL_PATH,
+                n_threads=config.MODEL_N_THREADS,
+                n_ctx=config.MODEL_N_CTX,
+                n_batch=config.MODEL_N_BATCH,
+                draft_model=_draft_model(),
+                verbose=False
+            )
+            for _ in range(max(1, config.INFERENCE_WORKERS))
+        ]
+        cache = None
+        if config.PROMPT_CACHE_ENABLED:
+            cache = PromptStateCache(
+                capacity_bytes=config.PROMPT_CACHE_RAM_BYTES,
+                disk_dir=config.PROMPT_CACHE_DISK_DIR,
+                disk_capacity_bytes=config.PROMPT_CACHE_DISK_BYTES,
+                model_id=model_identity(config.MODEL_PATH, config.MODEL_N_CTX)
+            )
+            cache.warm_prefix(models[0], DAX_SYSTEM_PREFIX)
+        token_counter.set_tokenizer(
+            lambda text: models[0].tokenize(text.encode("utf-8"), add_bos=False, special=True)
+        )
+        if config.CONSTRAINED_GENERATION:
+            # Same GGUF file, so the banned token ids hold for every instance
+            local_constraints = local_constraint_params(models[0], config.REPLY_MAX_SENTENCES)
+        llm, prompt_cache = models[0], cache
+        scheduler = InferenceScheduler(
+            models,
+            max_queue_size=config.INFERENCE_QUEUE_SIZE,
+            default_timeout=config.INFERENCE_TIMEOUT_SEC
         )
-        print(f"✅ Loaded local GGUF model: {config.MODEL_PATH}")
+        model_status = "ready"
+        print(f"✅ Loaded local GGUF model: {config.MODEL_PATH} ({len(models)} worker(s)) in {time.time() - start_time:.1f}s")
     except Exception as e:
+        model_status = "failed"
+        model_load_error = str(e)[:200]
         print(f"⚠️ Local model not loaded: {e}")
+    finally:
+        model_ready.set()
 
-# Mapping for user-friendly car part names
-PART_NAME_MAP: Dict[str, str] = {
-    "standard monocoque": "Monocoque",
-    "ground effect": "Ground Effect",
-    "2004 v10": "V10 Engine",
-    "2006 v8": "V8 Engine",
-    "c5 slick": "Slick Tires",
-    "full wet": "Wet Tires",
-    "high lift": "High Lift Wing",
-    "simple outwash": "Outwash Wing",
-    "high downforce": "High Downforce",
-    "low drag": "Low Drag"
-}
 
-# Valid F1 parts for validation
-VALID_F1_PARTS = list(PART_NAME_MAP.keys())
+def start_model_loading() -> None:
+    """Start loading the local model in the background (no-op if not configured or already started)."""
+    global _model_load_thread
+    if model_status == "not_configured":
+        model_ready.set()
+        return
+    with _model_load_lock:
+        if _model_load_thread is not None:
+            return
+        print(f"⏳ Loading local GGUF model in the background: {config.MODEL_PATH}")
+        _model_load_thread = threading.Thread(target=_load_local_model, name="model-loader", daemon=True)
+        _model_load_thread.start()
 
-# Invalid car brands (for hallucination detection)
-INVALID_CAR_BRANDS = [
-    "corvette", "porsche", "audi", "ferrari", "lamborghini",
-    "bmw", "mercedes", "toyota", "honda", "nissan",
-    "chevrolet", "ford"
-]
 
-# Invalid parts (for hallucination detection)
-INVALID_PARTS = [
-    "winglet", "sweep angle", "ride height", "suspension",
-    "brake", "gear", "differential", "turbo", "supercharger"
-]
+def local_model_loading() -> bool:
+    """Whether the local model is part of the chain and still loading."""
+    return model_status == "loading"
 
-def get_short_part_name(part: Optional[str]) -> str:
-    """Return a concise, user-friendly part name.
-    
-    Args:
-        part: The full part name or identifier
-        
-    Returns:
-        Short, user-friendly name or the original if no match found
+
+def readiness() -> Dict[str, Any]:
+    """Readiness of the inference backends, reported by ``/ready``.
+
+    The app is ready once the local model has finished loading, or straight
+    away if the chain has no local model. A failed load still counts as
+    ready when another provider in the chain can answer.
     """
-    if not part:
-        return "-"
-    
-    part_lower = str(part).lower().strip()
-    
-    # Check for exact keywords (prioritize full matches)
-    for key, short_name in PART_NAME_MAP.items():
-        if key in part_lower:
-            return short_name
-    
-    # Fallback for concatenated names (e.g., "GroundEffectOptimized_Monocoque")
-    for key, short_name in PART_NAME_MAP.items():
-        key_no_space = key.replace(" ", "")
-        if key_no_space in part_lower:
-            return short_name
-    
-    return part  # Return original if no match
+    others = [name for name in PROVIDER_CHAIN_NAMES if name != "local"]
+    ready = model_status in ("ready", "not_configured") or (model_status == "failed" and bool(others))
+    return {
+        "ready": ready,
+        "local_model": model_status,
+        "local_model_error": model_load_error,
+        "provider_chain": PROVIDER_CHAIN_NAMES,
+    }
+
+
+def _wait_for_local_model() -> None:
+    """Hold a turn for up to MODEL_LOAD_WAIT_SEC when the local model is
+    first in the chain and still loading; afterwards the chain falls through
+    to the next provider or the rule-based reply."""
+    if config.MODEL_LOAD_WAIT_SEC > 0 and PROVIDER_CHAIN_NAMES[0] == "local" and local_model_loading():
+        model_ready.wait(config.MODEL_LOAD_WAIT_SEC)
 
 def build_dax_prompt(
     player_name: str,
     sentiment: str,
     mood_instruction: str,
-    build_context: str,
+    build_state: BuildState,
     context_prompt: str,
     player_dialogue: str,
-    is_first_message: bool
+    is_first_message: bool,
+    summary: str = ""
 ) -> str:
     """Build the prompt for Dax NPC responses.
     
@@ -99,149 +226,89 @@ def build_dax_prompt(
         player_name: Name of the player
         sentiment: Detected sentiment of player message
         mood_instruction: Instruction for NPC mood/tone
-        build_context: Current car build information
+        build_state: Resolved state of the player's current car build
         context_prompt: Recent conversation history
         player_dialogue: Current player message
         is_first_message: Whether this is the first message in conversation
+        summary: Rolling summary of turns older than the recent conversation
         
     Returns:
         Formatted prompt string for LLM
     """
-    # DEBUG: Print the actual build_context to see its format
-    print(f"🔍 DEBUG - Build context received:")
-    print(f"'{build_context}'")
-    print(f"🔍 DEBUG - End of build context")
-    
     # Only greet on first message
     greeting = f"Hey {player_name}! I'm Dax, your F1 race engineer. How can I help today?" if is_first_message else ""
     
-    # FIXED: Properly parse the actual build_context format
-    build_status = "INCOMPLETE"
-    build_summary = "No F1 parts selected yet"
-    next_action = "Start by selecting your chassis: Standard Monocoque or Ground Effect Optimized."
-    
-    if build_context and "🚗 The player's current car build:" in build_context:
-        # Parse the actual format: "- Chassis: Ground Effect\n- Engine: V10 Engine\n..."
-        selected_parts = []
-        missing_parts = []
-        
-        # Check each part from the actual build_context format
-        if "- Chassis: " in build_context:
-            chassis = build_context.split("- Chassis: ")[1].split("\n")[0].strip()
-            if chassis != "-":
-                selected_parts.append(f"Chassis: {chassis}")
-            else:
-                missing_parts.append("chassis")
-        else:
-            missing_parts.append("chassis")
-            
-        if "- Engine: " in build_context:
-            engine = build_context.split("- Engine: ")[1].split("\n")[0].strip()
-            if engine != "-":
-                selected_parts.append(f"Engine: {engine}")
-            else:
-                missing_parts.append("engine")
-        else:
-            missing_parts.append("engine")
-            
-        if "- Tires: " in build_context:
-            tires = build_context.split("- Tires: ")[1].split("\n")[0].strip()
-            if tires != "-":
-                selected_parts.append(f"Tires: {tires}")
-            else:
-                missing_parts.append("tires")
-        else:
-            missing_parts.append("tires")
-            
-        if "- Front Wing: " in build_context:
-            fw = build_context.split("- Front Wing: ")[1].split("\n")[0].strip()
-            if fw != "-":
-                selected_parts.append(f"Front Wing: {fw}")
-            else:
-                missing_parts.append("front wing")
-        else:
-            missing_parts.append("front wing")
-            
-        if "- Rear Wing: " in build_context:
-            rw = build_context.split("- Rear Wing: ")[1].split("\n")[0].strip()
-            if rw != "-":
-                selected_parts.append(f"Rear Wing: {rw}")
-            else:
-                missing_parts.append("rear wing")
-        else:
-            missing_parts.append("rear wing")
-        
-        # Determine build status and next action
-        if len(selected_parts) == 5:
-            build_status = "COMPLETE"
-            build_summary = "✅ COMPLETE F1 BUILD: " + ", ".join(selected_parts)
-            next_action = "Your F1 car is ready! I can discuss the build, answer F1 questions, or you can click 'Submit Feedback' to finish."
-        elif len(selected_parts) > 0:
-            build_status = "IN_PROGRESS" 
-            build_summary = f"🔧 PARTIAL BUILD ({len(selected_parts)}/5): " + ", ".join(selected_parts)
-            if missing_parts:
-                next_part_suggestions = {
-                    "chassis": "Standard Monocoque or Ground Effect Optimized",
-                    "engine": "2004 V10 or 2006 V8", 
-                    "tires": "C5 Slick or Full Wet",
-                    "front wing": "High Lift or Simple Outwash",
-                    "rear wing": "High Downforce or Low Drag"
-                }
-                next_missing = missing_parts[0]
-                next_action = f"Next, select your {next_missing}: {next_part_suggestions.get(next_missing, 'continue building')}."
-        else:
-            build_status = "INCOMPLETE"
-            next_action = "Start by selecting your chassis: Standard Monocoque or Ground Effect Optimized."
-    
-    # ENHANCED prompt with better state management and human-like responses
-    return f"""You are Dax, an experienced F1 race engineer. You ONLY work with Formula 1 cars. {greeting}
-
-BUILD STATUS: {build_status}
-CURRENT BUILD: {build_summary}
-NEXT ACTION: {next_action}
+    # Static instructions come first so their KV state can be reused across
+    # every player; per-player content follows, oldest-changing first.
+    greeting_line = f"GREETING: {greeting}\n\n" if greeting else ""
+    summary_block = f"EARLIER IN THIS CONVERSATION:\n{summary}\n\n" if summary else ""
+    return f"""{DAX_SYSTEM_PREFIX}PLAYER NAME: {player_name}
 
-RECENT CONVERSATION:
+{summary_block}RECENT CONVERSATION:
 {context_prompt}
 
-CRITICAL INSTRUCTIONS:
-1. If BUILD STATUS is COMPLETE: Say the build is ready, offer to discuss it or answer questions, and suggest clicking "Submit Feedback"
-2. If player asks about selected parts: Reference CURRENT BUILD above accurately
-3. If player says they already selected everything but BUILD STATUS shows otherwise: Ask them to double-check their selections
-4. Be conversational and helpful like a real engineer - avoid repetitive apologies
-5. ONLY mention valid F1 parts: Standard Monocoque/Ground Effect chassis, 2004 V10/2006 V8 engines, C5 Slick/Full Wet tires, High Lift/Simple Outwash front wings, High Downforce/Low Drag rear wings
-6. Use the player's name: {player_name} (NOT "Player12" or generic names)
+BUILD STATUS: {build_state.status}
+CURRENT BUILD: {build_state.description}
+NEXT ACTION: {build_state.next_action}
 
-Player: "{player_dialogue}"
+{greeting_line}Player: "{player_dialogue}"
 
 Dax:"""
 
-def generate_npc_response(
-    player_dialogue: str,
-    sentiment: str,
-    player_id: int,
-    context: List[Any] = None,
-    player_name: str = "",
-    build: Optional[Any] = None
-) -> Dict[str, Any]:
-    """Generate NPC response using local LLM.
+# Stop sequences for the local GGUF model
+LOCAL_STOP_SEQUENCES: List[str] = ["Player:", "Human:", "Dax:", "\n\n", "Corvette", "Porsche", "Audi", "Ferrari"]
+
+# Keyword arguments for every local completion (thread scheduler and worker processes)
+LOCAL_COMPLETION_PARAMS: Dict[str, Any] = {
+    "max_tokens": config.MODEL_MAX_TOKENS,
+    "temperature": config.MODEL_TEMPERATURE,
+    "stop": LOCAL_STOP_SEQUENCES,
+    "repeat_penalty": 1.3,
+}
+
+
+def _completion_params(max_tokens: int, temperature: float, dax_reply: bool = True) -> Dict[str, Any]:
+    """Keyword arguments for one local completion.
+
+    Dax replies get LOCAL_COMPLETION_PARAMS with the caller's length and
+    temperature. Other prompts (conversation summaries) only keep the sampling
+    settings: the reply stop sequences would cut them at their first
+    "Player:"/"Dax:" line.
+    """
+    if dax_reply:
+        return {**LOCAL_COMPLETION_PARAMS, "max_tokens": max_tokens, "temperature": temperature}
+    return {
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "repeat_penalty": LOCAL_COMPLETION_PARAMS["repeat_penalty"],
+    }
+
+
+def _history_budget(player_dialogue: str, sentiment: str, player_name: str, build: Optional[Any], summary: str = "") -> int:
+    """Tokens left for conversation history once the rest of the prompt and
+    the reply are accounted for, capped at CONTEXT_TOKEN_BUDGET."""
+    skeleton = _build_npc_prompt(player_dialogue, sentiment, "", player_name, build, summary)
+    available = (
+        config.MODEL_N_CTX
+        - config.MODEL_MAX_TOKENS
+        - token_counter.count(skeleton, cache=False)
+        - config.CONTEXT_SAFETY_TOKENS
+    )
+    return max(0, min(config.CONTEXT_TOKEN_BUDGET, available))
+
+
+def _format_context(context: List[Any], budget: int) -> str:
+    """Render conversation entries as the prompt's history block.
     
     Args:
-        player_dialogue: The player's message
-        sentiment: Detected sentiment of the message
-        player_id: ID of the player
-        context: List of previous conversation entries
-        player_name: Display name of the player
-        build: Current car build object (optional)
+        context: Conversation entries in chronological order
+        budget: Maximum number of tokens the history block may use
         
     Returns:
-        Dictionary containing response text, timing, sentiment score, and accuracy metrics
+        The newest exchanges that fit in ``budget``, oldest first
     """
-    if context is None:
-        context = []
-    
-    # ENHANCED context processing for better memory - retrieve last 20 exchanges
     context_entries = []
-    for entry in context[-20:]:  # Increased from 5 to 8 for better memory
+    for entry in context:
         player_msg = entry.dialogue
         npc_msg = entry.npc_reply
         
@@ -258,11 +325,21 @@ def generate_npc_response(
         npc_msg = npc_msg.strip('"').replace("Dax:", "").strip()
         context_entries.append(f"Player: {player_msg}\nDax: {npc_msg}")
     
-    # Keep more context for memory - last 15 exchanges for excellent continuity
-    context_prompt = "\n".join(context_entries[-15:]) 
+    context_prompt = "\n".join(pack_newest_first(context_entries, budget, token_counter))
     if not context_prompt:
         context_prompt = "This is the start of the conversation."
+    return context_prompt
 
+
+def _build_npc_prompt(
+    player_dialogue: str,
+    sentiment: str,
+    context_prompt: str,
+    player_name: str,
+    build: Optional[Any],
+    summary: str = ""
+) -> str:
+    """Assemble the full Dax prompt from history, mood and build state."""
     mood_instruction = {
         "positive": "Respond in an excited, supportive, and energetic tone.",
         "happy": "Respond in an excited, supportive, and energetic tone.",
@@ -272,157 +349,435 @@ def generate_npc_response(
         "neutral": "Respond normally and politely without heavy emotions."
     }.get(sentiment.lower(), "Respond cautiously and professionally, staying on topic.")
 
-    build_context = ""
-    if build:
-        build_context = (
-            f"🚗 The player's current car build:\n"
-            f"- Chassis: {get_short_part_name(build.chassis)}\n"
-            f"- Engine: {get_short_part_name(build.engine)}\n"
-            f"- Tires: {get_short_part_name(build.tires)}\n"
-            f"- Front Wing: {get_short_part_name(build.front_wing)}\n"
-            f"- Rear Wing: {get_short_part_name(build.rear_wing)}\n\n"
-        )
-        if all([build.chassis, build.engine, build.tires, build.front_wing, build.rear_wing]):
-            mood_instruction += " The car build is complete. Praise the player or give final strategy tips."
+    build_state = get_build_state(build)
+    if build_state.exists and build_state.is_complete:
+        mood_instruction += " The car build is complete. Praise the player or give final strategy tips."
             
     is_first_message = context_prompt == "This is the beginning of the conversation."
             
-    full_prompt = build_dax_prompt(player_name, sentiment, mood_instruction, build_context, context_prompt, player_dialogue, is_first_message)
+    return build_dax_prompt(player_name, sentiment, mood_instruction, build_state, context_prompt, player_dialogue, is_first_message, summary)
+
+
+def _complete(
+    model: Any,
+    full_prompt: str,
+    player_id: Optional[int] = None,
+    params: Optional[Dict[str, Any]] = None,
+    constrained: bool = True
+) -> str:
+    """Run a blocking completion on a model owned by the calling worker."""
+    if prompt_cache is not None:
+        prompt_cache.restore(model, player_id, full_prompt)
+
+    constraints = local_constraints if constrained else {}
+    output = model(full_prompt, echo=False, **(params or LOCAL_COMPLETION_PARAMS), **constraints)
+
+    if prompt_cache is not None and player_id is not None:
+        prompt_cache.save(model, player_id)
+
+    # Extract response text
+    if isinstance(output, dict) and "choices" in output:
+        return output["choices"][0]["text"].strip()
+    elif hasattr(output, 'choices') and output.choices:
+        return output.choices[0].text.strip()
+    return str(output).strip()
+
+
+def _complete_stream(
+    model: Any,
+    full_prompt: str,
+    player_id: Optional[int] = None,
+    params: Optional[Dict[str, Any]] = None,
+    constrained: bool = True
+) -> Iterator[str]:
+    """Run a streaming completion on a model owned by the calling worker."""
+    if prompt_cache is not None:
+        prompt_cache.restore(model, player_id, full_prompt)
+
+    constraints = local_constraints if constrained else {}
+    for chunk in model(full_prompt, echo=False, stream=True, **(params or LOCAL_COMPLETION_PARAMS), **constraints):
+        text = chunk["choices"][0].get("text", "") if isinstance(chunk, dict) else ""
+        if text:
+            yield text
+
+    if prompt_cache is not None and player_id is not None:
+        prompt_cache.save(model, player_id)
+
+
+def _generate_local(
+    full_prompt: str,
+    player_id: Optional[int] = None,
+    params: Optional[Dict[str, Any]] = None,
+    constrained: bool = True
+) -> str:
+    """Generate with the local GGUF model through the process pool or inference scheduler.
+
+    ``constrained=False`` skips the CONSTRAINED_GENERATION grammar and logit_bias.
+    """
+    params = params or LOCAL_COMPLETION_PARAMS
+    if worker_pool is not None:
+        return worker_pool.generate(full_prompt, player_id, params, constrained=constrained)
+    return scheduler.run(lambda model: _complete(model, full_prompt, player_id, params, constrained))
+
+
+def _stream_local(
+    full_prompt: str,
+    player_id: Optional[int] = None,
+    params: Optional[Dict[str, Any]] = None,
+    constrained: bool = True
+) -> Iterator[str]:
+    """Stream from the local GGUF model through the process pool or inference scheduler."""
+    params = params or LOCAL_COMPLETION_PARAMS
+    if worker_pool is not None:
+        yield from worker_pool.stream(full_prompt, player_id, params, constrained=constrained)
+        return
+    yield from scheduler.stream(lambda model: _complete_stream(model, full_prompt, player_id, params, constrained))
+
+
+def _local_provider_generate(
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    player_id: Optional[int] = None,
+    dax_reply: bool = True
+) -> str:
+    # dax_reply=False (summaries): no reply stop sequences, sentence grammar or F1 logit_bias
+    if scheduler is None and worker_pool is None:
+        raise ProviderUnavailableError("Local model is not loaded")
+    return _generate_local(prompt, player_id, _completion_params(max_tokens, temperature, dax_reply), dax_reply)
+
+
+def _local_provider_stream(
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    player_id: Optional[int] = None,
+    dax_reply: bool = True
+) -> Iterator[str]:
+    if scheduler is None and worker_pool is None:
+        raise ProviderUnavailableError("Local model is not loaded")
+    return _stream_local(prompt, player_id, _completion_params(max_tokens, temperature, dax_reply), dax_reply)
+
+
+def _rules_provider_generate(prompt: str, max_tokens: int, temperature: float, **_: Any) -> str:
+    # An empty completion makes _finalize_npc_reply use its build-aware reply
+    return ""
+
+
+def _build_provider_chain() -> ProviderChain:
+    """Assemble the failover chain from PROVIDER_CHAIN_NAMES."""
+    providers = []
+    for name in PROVIDER_CHAIN_NAMES:
+        if name == "local":
+            providers.append(Provider(
+                "local",
+                generate=_local_provider_generate,
+                stream=_local_provider_stream,
+                timeout=config.LLM_PROVIDER_TIMEOUTS.get("local", config.INFERENCE_TIMEOUT_SEC),
+                breaker=CircuitBreaker(config.CIRCUIT_BREAKER_FAILURES, config.CIRCUIT_BREAKER_RESET_SEC),
+                ready=lambda: not local_model_loading()
+            ))
+        elif name == "rules":
+            # Never fails, so it never needs to trip
+            providers.append(Provider("rules", generate=_rules_provider_generate, timeout=1.0))
+        else:
+            providers.append(llm_adapter.cloud_provider(name))
+    print(f"🔗 LLM provider chain: {' -> '.join(PROVIDER_CHAIN_NAMES)}")
+    return ProviderChain(
+        providers,
+        hedge_enabled=config.LLM_HEDGE_ENABLED,
+        hedge_percentile=config.LLM_HEDGE_PERCENTILE
+    )
+
+
+provider_chain = _build_provider_chain()
+
+
+def local_backend_saturated() -> bool:
+    """Whether a new turn would be rejected because the local queue is full
+    and the chain has nothing to fall back to after the local model."""
+    backend = worker_pool if worker_pool is not None else scheduler
+    return (
+        backend is not None
+        and PROVIDER_CHAIN_NAMES[-1] == "local"
+        and backend.is_saturated()
+    )
+
+
+def _build_parts(build: Optional[Any]) -> Tuple[str, ...]:
+    """Resolved short part names for a build, used in response cache keys."""
+    return get_build_state(build).parts
+
+
+def _is_cacheable(reply_text: str) -> bool:
+    """Only cache real model output, never outage or error fallbacks."""
+    return bool(reply_text) and reply_text != FALLBACK_TEXT and not reply_text.startswith("⚠️")
+
+
+def _error_response() -> Dict[str, Any]:
+    """Response payload used when generation fails outright."""
+    return {
+        "response": "⚠️ Error generating response from local model.",
+        "response_time_sec": None,
+        "sentiment_score": None,
+        "npc_sentiment": None,
+        "mentions_part": False
+    }
+
+
+def _finalize_npc_reply(
+    reply_text: str,
+    response_time: float,
+    player_name: str,
+    build: Optional[Any]
+) -> Dict[str, Any]:
+    """Clean a raw completion, apply hallucination correction and score the result.
+    
+    Args:
+        reply_text: Raw text produced by the model or provider
+        response_time: Generation wall time in seconds
+        player_name: Display name of the player
+        build: Current car build object (optional)
+        
+    Returns:
+        Dictionary containing response text, timing, sentiment score and label, and accuracy metrics
+    """
+    print(f"🔍 Raw LLM output: '{reply_text}'")
+    
+    # Strip "Dax:" labels, leaked instructions and quotes, and scan for parts in one pass
+    reply_text, scan = postprocess_reply(reply_text)
+    
+    build_state = get_build_state(build)
+    
+    # If still empty or too short, provide context-appropriate fallback
+    if not reply_text or len(reply_text.strip()) < 10:
+        reply_text = build_state.fallback_reply(player_name)
+        scan = scan_reply(reply_text)
+    
+    print(f"🔍 Cleaned response: '{reply_text}'")
+
+    # Detect valid F1 parts and hallucinations
+    accurate = scan.mentions_part
+    
+    # STRICT HALLUCINATION CORRECTION
+    if scan.hallucinated:
+        print(f"⚠️ MAJOR HALLUCINATION DETECTED: Non-F1 content mentioned: {sorted(scan.invalid_cars | scan.invalid_parts)}")
+        # Force correct F1 response based on build status
+        reply_text = build_state.correction_reply(player_name)
+        
+        accurate = True  # Force accuracy since we corrected it
+    
+    print(f"🎯 ACCURACY: Mentions car parts: {accurate} ('✅' if accurate else '❌')")
+
+    # Score the final text once; the label is stored as NPCMemory.npc_sentiment.
+    # With NPC_SENTIMENT_DEFERRED it is left to the background sentiment jobs.
+    npc_sentiment = score_sentiment(reply_text, classify=not config.NPC_SENTIMENT_DEFERRED)
+    print(f"📊 NPC SENTIMENT: '{reply_text[:50]}...' → {npc_sentiment.label} (score: {npc_sentiment.score})")
+
+    return {
+        "response": reply_text,
+        "response_time_sec": round(response_time, 2),
+        "sentiment_score": npc_sentiment.score,
+        "npc_sentiment": npc_sentiment.label,
+        "mentions_part": accurate
+    }
+
+
+def _intent_fast_path(player_dialogue: str, player_name: str, build: Optional[Any]) -> Optional[Dict[str, Any]]:
+    """Answer deterministic build questions from the intent table, skipping the model.
+
+    Returns:
+        The finalized response (with ``provider="intent"``), or None when the
+        turn is open-ended and has to go to the model
+    """
+    if not config.INTENT_FAST_PATH_ENABLED:
+        return None
+    start_time = time.time()
+    reply_text = intent_router.answer_intent(player_dialogue, get_build_state(build), player_name)
+    if reply_text is None:
+        return None
+    print(f"⚡ Intent fast path for '{player_dialogue[:30]}'")
+    result = _finalize_npc_reply(reply_text, time.time() - start_time, player_name, build)
+    result["provider"] = "intent"
+    return result
+
+
+def generate_npc_response(
+    player_dialogue: str,
+    sentiment: str,
+    player_id: int,
+    context: List[Any] = None,
+    player_name: str = "",
+    build: Optional[Any] = None,
+    summary: str = ""
+) -> Dict[str, Any]:
+    """Generate NPC response using local LLM.
+    
+    Args:
+        player_dialogue: The player's message
+        sentiment: Detected sentiment of the message
+        player_id: ID of the player
+        context: List of previous conversation entries
+        player_name: Display name of the player
+        build: Current car build object (optional)
+        summary: Rolling summary of turns no longer in ``context``
+        
+    Returns:
+        Dictionary containing response text, timing, sentiment score and label, and accuracy metrics
+    """
+    fast = _intent_fast_path(player_dialogue, player_name, build)
+    if fast is not None:
+        return fast
+
+    if context is None:
+        context = []
+
+    context_prompt = _format_context(context, _history_budget(player_dialogue, sentiment, player_name, build, summary))
+
+    cache_key = None
+    if response_cache is not None:
+        cache_key = make_cache_key(player_dialogue, _build_parts(build), summary + context_prompt)
+        cached = response_cache.get(cache_key, player_name)
+        if cached is not None:
+            print(f"⚡ Response cache hit for '{player_dialogue[:30]}'")
+            return cached
+
+    full_prompt = _build_npc_prompt(player_dialogue, sentiment, context_prompt, player_name, build, summary)
 
     # Generate response using local model or external API
     try:
         start_time = time.time()
         
-        # Check if we should use external API
-        if config.USE_EXTERNAL_LLM:
-            from llm_adapter import generate_llm_response
-            llm_result = generate_llm_response(full_prompt, max_tokens=config.MODEL_MAX_TOKENS, temperature=config.MODEL_TEMPERATURE)
-            reply_text = llm_result.get("response", "I'm having trouble generating a response.")
-        elif llm is None:
-            reply_text = "I'm Dax, your F1 mechanic. The local model isn't available right now."
-        else:
-            # Use local GGUF model
-            output = llm(
+        # Walk the provider chain (cloud APIs, local GGUF model, rule-based reply)
+        provider_name = None
+        _wait_for_local_model()
+        try:
+            reply_text, provider_name = provider_chain.generate(
                 full_prompt,
-                max_tokens=config.MODEL_MAX_TOKENS,
-                temperature=config.MODEL_TEMPERATURE,
-                stop=["Player:", "Human:", "Dax:", "\n\n", "Corvette", "Porsche", "Audi", "Ferrari"],
-                echo=False,
-                repeat_penalty=1.3
+                config.MODEL_MAX_TOKENS,
+                config.MODEL_TEMPERATURE,
+                player_id=player_id
             )
-
-            # Extract response text
-            if isinstance(output, dict) and "choices" in output:
-                reply_text = output["choices"][0]["text"].strip()
-            elif hasattr(output, 'choices') and output.choices:
-                reply_text = output.choices[0].text.strip()
-            else:
-                reply_text = str(output).strip()
+            # Cloud providers cannot take the sentence grammar, so hold them to the budget here
+            if config.CONSTRAINED_GENERATION:
+                reply_text = limit_sentences(reply_text, config.REPLY_MAX_SENTENCES)
+        except AllProvidersFailedError as e:
+            print(f"❌ All LLM providers failed: {e}")
+            # While the model is still loading, answer with the build-aware rule-based reply
+            reply_text = "" if local_model_loading() else FALLBACK_TEXT
         
         response_time = time.time() - start_time
-        
-        print(f"🔍 Raw LLM output: '{reply_text}'")
-        
-        # AGGRESSIVE CLEANING to fix "Dax: Dax:" and prompt leaking
-        # Remove all instances of "Dax:" at the start
-        while reply_text.startswith("Dax:"):
-            reply_text = reply_text[4:].strip()
-        
-        # Remove prompt instructions that leaked through
-        if "Player Message:" in reply_text:
-            reply_text = reply_text.split("Player Message:")[0].strip()
-        if "Respond as Dax" in reply_text:
-            reply_text = reply_text.split("Respond as Dax")[0].strip()
-        
-        # Remove quotes if they wrap the response
-        if reply_text.startswith('"') and reply_text.endswith('"'):
-            reply_text = reply_text[1:-1]
-        elif reply_text.startswith('"'):
-            reply_text = reply_text[1:]
-        
-        # Remove any remaining "Dax:" patterns
-        reply_text = reply_text.replace("Dax:", "").strip()
-        
-        # If still empty or too short, provide context-appropriate fallback
-        if not reply_text or len(reply_text.strip()) < 10:
-            # Generate context-appropriate fallback based on build status
-            if build and all([build.chassis, build.engine, build.tires, build.front_wing, build.rear_wing]):
-                reply_text = f"Perfect build, {player_name}! Your car is race-ready. Focus on your racing line and you'll do great!"
-            elif build:
-                missing_parts = []
-                if not build.chassis or build.chassis == "": missing_parts.append("chassis")
-                if not build.engine or build.engine == "": missing_parts.append("engine") 
-                if not build.tires or build.tires == "": missing_parts.append("tires")
-                if not build.front_wing or build.front_wing == "": missing_parts.append("front wing")
-                if not build.rear_wing or build.rear_wing == "": missing_parts.append("rear wing")
-                
-                if missing_parts:
-                    next_part = missing_parts[0]
-                    reply_text = f"Let's focus on selecting your {next_part} next, {player_name}."
-                else:
-                    reply_text = f"Great progress on your build, {player_name}! How are you feeling about the setup?"
-            else:
-                reply_text = f"Hey {player_name}! Let's start building your F1 car. What would you like to work on first?"
-        
-        print(f"🔍 Cleaned response: '{reply_text}'")
-            
-        sentiment_score = TextBlob(reply_text).sentiment.polarity
-        npc_sentiment_label = 'positive' if sentiment_score > 0.1 else 'negative' if sentiment_score < -0.1 else 'neutral'
-        print(f"📊 NPC SENTIMENT: '{reply_text[:50]}...' → {npc_sentiment_label} (score: {sentiment_score})")
-
-        # Detect valid F1 parts and hallucinations
-        accurate = any(part in reply_text.lower() for part in VALID_F1_PARTS)
-        has_invalid_cars = any(car in reply_text.lower() for car in INVALID_CAR_BRANDS)
-        has_invalid_parts = any(invalid in reply_text.lower() for invalid in INVALID_PARTS)
-        
-        # STRICT HALLUCINATION CORRECTION
-        if has_invalid_cars or has_invalid_parts:
-            print(f"⚠️ MAJOR HALLUCINATION DETECTED: Non-F1 content mentioned!")
-            # Force correct F1 response based on build status
-            if build and all([build.chassis, build.engine, build.tires, build.front_wing, build.rear_wing]):
-                reply_text = f"Perfect F1 setup, {player_name}! Your car is race-ready with all components selected."
-            elif not build or not any([build.chassis if build else None, build.engine if build else None, build.tires if build else None]):
-                reply_text = f"Let's build your F1 car, {player_name}. Start by choosing a chassis: Standard Monocoque or Ground Effect Optimized."
-            else:
-                # Determine what's missing
-                missing = []
-                if not build.chassis or build.chassis == "": missing.append("chassis")
-                elif not build.engine or build.engine == "": missing.append("engine")
-                elif not build.tires or build.tires == "": missing.append("tires") 
-                elif not build.front_wing or build.front_wing == "": missing.append("front wing")
-                elif not build.rear_wing or build.rear_wing == "": missing.append("rear wing")
-                
-                if missing:
-                    next_part = missing[0]
-                    if next_part == "chassis":
-                        reply_text = f"Now choose your F1 chassis: Standard Monocoque or Ground Effect Optimized."
-                    elif next_part == "engine":
-                        reply_text = f"Great! Now pick your F1 engine: 2004 V10 or 2006 V8."
-                    elif next_part == "tires":
-                        reply_text = f"Next, select F1 tires: C5 Slick or Full Wet."
-                    elif next_part == "front wing":
-                        reply_text = f"Choose your front wing: High Lift or Simple Outwash."
-                    else:
-                        reply_text = f"Finally, pick your rear wing: High Downforce or Low Drag."
-                else:
-                    reply_text = f"Let's focus on your F1 car setup, {player_name}."
-            
-            accurate = True  # Force accuracy since we corrected it
-        
-        print(f"🎯 ACCURACY: Mentions car parts: {accurate} ('✅' if accurate else '❌')")
 
-        return {
-            "response": reply_text,
-            "response_time_sec": round(response_time, 2),
-            "sentiment_score": round(sentiment_score, 3),
-            "mentions_part": accurate
-        }
+        result = _finalize_npc_reply(reply_text, response_time, player_name, build)
+        result["provider"] = provider_name
+        if cache_key is not None and _is_cacheable(reply_text):
+            response_cache.put(cache_key, result, player_name)
+        return result
 
+    except InferenceBusyError:
+        # Let callers turn saturation into a 503 instead of a canned reply
+        raise
     except Exception as e:
         print(f"Error running LLaMA model: {e}")
-        return {
-            "response": "⚠️ Error generating response from local model.",
-            "response_time_sec": None,
-            "sentiment_score": None,
-            "mentions_part": False
-        }
+        return _error_response()
+
+
+def stream_npc_response(
+    player_dialogue: str,
+    sentiment: str,
+    player_id: int,
+    context: List[Any] = None,
+    player_name: str = "",
+    build: Optional[Any] = None,
+    summary: str = ""
+) -> Iterator[Dict[str, Any]]:
+    """Stream an NPC response token by token.
+    
+    Yields ``{"type": "token", "text": ...}`` events while the model is
+    generating, followed by exactly one ``{"type": "final", ...}`` event that
+    carries the same keys as :func:`generate_npc_response` (plus
+    ``first_token_sec``). Cleaning and hallucination correction only run on
+    the final event, so the final ``response`` may differ from the streamed text.
+    
+    Args:
+        player_dialogue: The player's message
+        sentiment: Detected sentiment of the message
+        player_id: ID of the player
+        context: List of previous conversation entries
+        player_name: Display name of the player
+        build: Current car build object (optional)
+        summary: Rolling summary of turns no longer in ``context``
+    """
+    fast = _intent_fast_path(player_dialogue, player_name, build)
+    if fast is not None:
+        yield {"type": "token", "text": fast["response"]}
+        yield {"type": "final", **fast, "first_token_sec": 0.0}
+        return
+
+    if context is None:
+        context = []
+
+    context_prompt = _format_context(context, _history_budget(player_dialogue, sentiment, player_name, build, summary))
+
+    cache_key = None
+    if response_cache is not None:
+        cache_key = make_cache_key(player_dialogue, _build_parts(build), summary + context_prompt)
+        cached = response_cache.get(cache_key, player_name)
+        if cached is not None:
+            print(f"⚡ Response cache hit for '{player_dialogue[:30]}'")
+            yield {"type": "token", "text": cached["response"]}
+            yield {"type": "final", **cached, "first_token_sec": 0.0}
+            return
+
+    full_prompt = _build_npc_prompt(player_dialogue, sentiment, context_prompt, player_name, build, summary)
+
+    try:
+        start_time = time.time()
+        first_token_time = None
+        chunks: List[str] = []
+
+        _wait_for_local_model()
+        token_stream = provider_chain.stream(
+            full_prompt,
+            config.MODEL_MAX_TOKENS,
+            config.MODEL_TEMPERATURE,
+            player_id=player_id
+        )
+
+        try:
+            for token in token_stream:
+                if not token:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                if config.CONSTRAINED_GENERATION and exceeds_sentence_budget("".join(chunks) + token, config.REPLY_MAX_SENTENCES):
+                    # Closing the stream stops the provider generating past the budget
+                    token_stream.close()
+                    break
+                chunks.append(token)
+                yield {"type": "token", "text": token}
+        except AllProvidersFailedError as e:
+            print(f"❌ All LLM providers failed: {e}")
+            if not chunks and local_model_loading():
+                # Rule-based reply while the model is still loading
+                chunks.append(get_build_state(build).fallback_reply(player_name))
+                yield {"type": "token", "text": chunks[0]}
+            elif not chunks:
+                chunks.append(FALLBACK_TEXT)
+                yield {"type": "token", "text": FALLBACK_TEXT}
+
+        response_time = time.time() - start_time
+        reply_text = "".join(chunks).strip()
+        result = _finalize_npc_reply(reply_text, response_time, player_name, build)
+        if cache_key is not None and _is_cacheable(reply_text):
+            response_cache.put(cache_key, result, player_name)
+        result["first_token_sec"] = round(first_token_time, 2) if first_token_time is not None else None
+
+    except InferenceBusyError:
+        raise
+    except Exception as e:
+        print(f"Error streaming LLaMA model: {e}")
+        result = _error_response()
+        result["first_token_sec"] = None
+
+    yield {"type": "final", **result}
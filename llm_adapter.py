@@ -1,114 +1,280 @@
 """
 LLM Adapter - Switches between local GGUF model and free cloud APIs
 Enables free tier deployment by using Groq/OpenAI/Hugging Face APIs
+
+Provider clients are created once per process and reused, so chat turns share
+pooled keep-alive connections instead of paying for a new TLS handshake each
+time.
+
+The ``complete_*`` / ``stream_completion`` functions raise on failure instead
+of returning canned text, so the provider chain can fail over to the next one.
 """
 
 import os
-from typing import Dict, Union
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
 from config import config
+from generation_constraints import openai_logit_bias
+from provider_chain import CircuitBreaker, Provider, ProviderUnavailableError
 
+FALLBACK_TEXT = "I'm having trouble connecting to my systems right now. Please try again."
+FALLBACK_STREAM_TEXT = FALLBACK_TEXT
 
-def generate_with_groq(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
-    """Generate response using Groq API (FREE tier: 30 req/min)."""
+HF_API_URL = "https://api-inference.huggingface.co/models/{model}"
+
+CLOUD_PROVIDERS = ("groq", "openai", "huggingface")
+
+PROVIDER_DEFAULT_MODELS = {
+    "groq": "llama-3.1-8b-instant",
+    "openai": "gpt-3.5-turbo",
+    "huggingface": "mistralai/Mistral-7B-Instruct-v0.1",
+}
+
+MISSING_KEY_TEXT = {
+    "groq": "I'm Dax, your F1 mechanic. Get a free Groq API key at console.groq.com",
+    "openai": "I'm Dax, your F1 mechanic. Get OpenAI API key at platform.openai.com",
+    "huggingface": "I'm Dax, your F1 mechanic. Get HF token at huggingface.co/settings/tokens",
+}
+
+
+# =============================================================================
+# Per-provider settings
+# =============================================================================
+
+def normalize_provider(name: str) -> str:
+    """Map provider aliases to their canonical name ("hf" -> "huggingface")."""
+    name = (name or "").strip().lower()
+    return "huggingface" if name == "hf" else name
+
+
+def primary_provider() -> str:
+    """The provider selected by ``LLM_PROVIDER`` (Groq if unrecognised)."""
+    provider = normalize_provider(config.LLM_PROVIDER)
+    return provider if provider in CLOUD_PROVIDERS else "groq"
+
+
+def provider_api_key(provider: str) -> str:
+    """``<PROVIDER>_API_KEY``, falling back to ``LLM_API_KEY`` for the primary provider."""
+    provider = normalize_provider(provider)
+    key = getattr(config, f"{provider.upper()}_API_KEY", "")
+    if not key and provider == primary_provider():
+        key = config.LLM_API_KEY
+    return key or ""
+
+
+def provider_model(provider: str) -> str:
+    """``<PROVIDER>_MODEL``, falling back to ``LLM_MODEL`` for the primary provider."""
+    provider = normalize_provider(provider)
+    model = getattr(config, f"{provider.upper()}_MODEL", "")
+    if not model and provider == primary_provider():
+        model = config.LLM_MODEL
+    return model or PROVIDER_DEFAULT_MODELS.get(provider, "")
+
+
+def provider_timeout(provider: str) -> float:
+    """Per-provider timeout from ``LLM_PROVIDER_TIMEOUTS``, else ``LLM_TIMEOUT_SEC``."""
+    return config.LLM_PROVIDER_TIMEOUTS.get(normalize_provider(provider), config.LLM_TIMEOUT_SEC)
+
+
+# =============================================================================
+# Shared clients
+# =============================================================================
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _shared_client(name: str, factory: Callable[[], Any]) -> Any:
+    """Return the process-wide client called ``name``, creating it on first use."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def _sdk_kwargs(provider: str) -> Dict[str, Any]:
+    return {
+        "api_key": provider_api_key(provider),
+        "timeout": provider_timeout(provider),
+        "max_retries": config.LLM_MAX_RETRIES,
+    }
+
+
+def get_groq_client():
+    """Shared Groq client (the SDK pools keep-alive connections internally)."""
     try:
         from groq import Groq
-        
-        if not config.LLM_API_KEY:
-            return "I'm Dax, your F1 mechanic. Get a free Groq API key at console.groq.com"
-        
-        client = Groq(api_key=config.LLM_API_KEY)
-        
-        response = client.chat.completions.create(
-            model=config.LLM_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=temperature,
-        )
-        
-        return response.choices[0].message.content.strip()
-    
     except ImportError:
         raise ImportError("groq not installed. Run: pip install groq")
-    except Exception as e:
-        print(f"❌ Groq API error: {e}")
-        return "I'm having trouble connecting to my systems right now. Please try again."
+    return _shared_client("groq", lambda: Groq(**_sdk_kwargs("groq")))
 
 
-def generate_with_openai(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
-    """Generate response using OpenAI API ($5 free credits for new users)."""
+def get_openai_client():
+    """Shared OpenAI client (the SDK pools keep-alive connections internally)."""
     try:
         from openai import OpenAI
-        
-        if not config.LLM_API_KEY:
-            return "I'm Dax, your F1 mechanic. Get OpenAI API key at platform.openai.com"
-        
-        client = OpenAI(api_key=config.LLM_API_KEY)
-        
-        response = client.chat.completions.create(
-            model=config.LLM_MODEL or "gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=temperature,
-        )
-        
-        return response.choices[0].message.content.strip()
-    
     except ImportError:
         raise ImportError("openai not installed. Run: pip install openai")
+    return _shared_client("openai", lambda: OpenAI(**_sdk_kwargs("openai")))
+
+
+def _create_hf_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.LLM_MAX_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.headers.update({"Authorization": f"Bearer {provider_api_key('huggingface')}"})
+    return session
+
+
+def get_hf_session():
+    """Shared requests session with a keep-alive pool for Hugging Face."""
+    return _shared_client("huggingface", _create_hf_session)
+
+
+def close_clients() -> None:
+    """Close the shared clients (call on shutdown)."""
+    for name in ("groq", "openai", "huggingface"):
+        client = _clients.pop(name, None)
+        if client is not None:
+            try:
+                client.close()
+            except Exception as e:
+                print(f"⚠️ Error closing {name} client: {e}")
+
+
+def _chat_kwargs(model: str, prompt: str, max_tokens: int, temperature: float, logit_bias: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    kwargs = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+    if logit_bias:
+        kwargs["logit_bias"] = logit_bias
+    return kwargs
+
+
+def _openai_logit_bias() -> Optional[Dict[str, float]]:
+    """Banned-term logit_bias for OpenAI (Groq and Hugging Face do not accept one)."""
+    if not config.CONSTRAINED_GENERATION:
+        return None
+    return openai_logit_bias(provider_model("openai"))
+
+
+def _hf_payload(prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+    return {
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": max_tokens,
+            "temperature": temperature,
+            "return_full_text": False
+        }
+    }
+
+
+def _hf_text(result: Any) -> str:
+    if isinstance(result, list) and len(result) > 0:
+        return result[0].get("generated_text", "").strip()
+    raise ValueError(f"Unexpected Hugging Face response: {str(result)[:100]}")
+
+
+def _hf_url() -> str:
+    return HF_API_URL.format(model=provider_model("huggingface"))
+
+
+def _require_key(provider: str) -> None:
+    if not provider_api_key(provider):
+        raise ProviderUnavailableError(f"No API key configured for {provider}")
+
+
+# =============================================================================
+# Synchronous generation
+# =============================================================================
+
+def complete_with_groq(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
+    """Generate with Groq, raising on any failure."""
+    _require_key("groq")
+    response = get_groq_client().chat.completions.create(
+        **_chat_kwargs(provider_model("groq"), prompt, max_tokens, temperature)
+    )
+    return response.choices[0].message.content.strip()
+
+
+def complete_with_openai(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
+    """Generate with OpenAI, raising on any failure."""
+    _require_key("openai")
+    response = get_openai_client().chat.completions.create(
+        **_chat_kwargs(provider_model("openai"), prompt, max_tokens, temperature, _openai_logit_bias())
+    )
+    return response.choices[0].message.content.strip()
+
+
+def complete_with_huggingface(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
+    """Generate with the Hugging Face Inference API, raising on any failure."""
+    _require_key("huggingface")
+    response = get_hf_session().post(
+        _hf_url(),
+        json=_hf_payload(prompt, max_tokens, temperature),
+        timeout=provider_timeout("huggingface")
+    )
+    response.raise_for_status()
+    return _hf_text(response.json())
+
+
+COMPLETERS: Dict[str, Callable[[str, int, float], str]] = {
+    "groq": complete_with_groq,
+    "openai": complete_with_openai,
+    "huggingface": complete_with_huggingface,
+}
+
+
+def _generate_or_fallback(provider: str, prompt: str, max_tokens: int, temperature: float) -> str:
+    if not provider_api_key(provider):
+        return MISSING_KEY_TEXT[provider]
+    try:
+        return COMPLETERS[provider](prompt, max_tokens, temperature)
     except Exception as e:
-        print(f"❌ OpenAI API error: {e}")
-        return "I'm having trouble connecting to my systems right now. Please try again."
+        print(f"❌ {provider} API error: {e}")
+        return FALLBACK_TEXT
+
+
+def generate_with_groq(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
+    """Generate response using Groq API (FREE tier: 30 req/min)."""
+    return _generate_or_fallback("groq", prompt, max_tokens, temperature)
+
+
+def generate_with_openai(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
+    """Generate response using OpenAI API ($5 free credits for new users)."""
+    return _generate_or_fallback("openai", prompt, max_tokens, temperature)
 
 
 def generate_with_huggingface(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> str:
     """Generate response using Hugging Face Inference API (free tier available)."""
-    try:
-        import requests
-        
-        if not config.LLM_API_KEY:
-            return "I'm Dax, your F1 mechanic. Get HF token at huggingface.co/settings/tokens"
-        
-        api_url = f"https://api-inference.huggingface.co/models/{config.LLM_MODEL or 'mistralai/Mistral-7B-Instruct-v0.1'}"
-        headers = {"Authorization": f"Bearer {config.LLM_API_KEY}"}
-        
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": max_tokens,
-                "temperature": temperature,
-                "return_full_text": False
-            }
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        if isinstance(result, list) and len(result) > 0:
-            return result[0].get("generated_text", "").strip()
-        
-        return "I'm having trouble generating a response right now."
-    
-    except Exception as e:
-        print(f"❌ Hugging Face API error: {e}")
-        return "I'm having trouble connecting to my systems right now. Please try again."
+    return _generate_or_fallback("huggingface", prompt, max_tokens, temperature)
 
 
 def generate_llm_response(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> Dict:
     """
     Universal LLM response generator for cloud providers.
-    
+
     Returns:
         Dict with 'response' key containing generated text
     """
     if config.USE_EXTERNAL_LLM:
         print(f"🌐 Using {config.LLM_PROVIDER.upper()} API")
-        
+
         # Route to provider
         provider = config.LLM_PROVIDER.lower()
         if provider == "groq":
@@ -120,12 +286,122 @@ def generate_llm_response(prompt: str, max_tokens: int = 150, temperature: float
         else:
             print(f"⚠️ Unknown provider: {config.LLM_PROVIDER}, using Groq")
             text = generate_with_groq(prompt, max_tokens, temperature)
-        
+
         return {"response": text}
-    
+
     return {"response": "External LLM is disabled in config."}
 
 
+# =============================================================================
+# Streaming
+# =============================================================================
+
+def _stream_chat_completion(client, model: str, prompt: str, max_tokens: int, temperature: float, logit_bias: Optional[Dict[str, float]] = None) -> Iterator[str]:
+    """Yield content deltas from an OpenAI-compatible chat completion stream."""
+    stream = client.chat.completions.create(
+        **_chat_kwargs(model, prompt, max_tokens, temperature, logit_bias),
+        stream=True,
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+def stream_completion(provider: str, prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> Iterator[str]:
+    """Stream tokens from ``provider``, raising on any failure.
+
+    Hugging Face's inference API does not stream, so its full reply is
+    yielded as a single chunk.
+    """
+    provider = normalize_provider(provider)
+    _require_key(provider)
+    if provider == "huggingface":
+        yield complete_with_huggingface(prompt, max_tokens, temperature)
+        return
+    client = get_openai_client() if provider == "openai" else get_groq_client()
+    logit_bias = _openai_logit_bias() if provider == "openai" else None
+    yield from _stream_chat_completion(client, provider_model(provider), prompt, max_tokens, temperature, logit_bias)
+
+
+def _stream_or_fallback(provider: str, prompt: str, max_tokens: int, temperature: float) -> Iterator[str]:
+    if not provider_api_key(provider):
+        yield MISSING_KEY_TEXT[provider]
+        return
+
+    emitted = False
+    try:
+        for token in stream_completion(provider, prompt, max_tokens, temperature):
+            emitted = True
+            yield token
+    except Exception as e:
+        print(f"❌ {provider} streaming error: {e}")
+        if not emitted:
+            yield FALLBACK_STREAM_TEXT
+
+
+def stream_with_groq(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> Iterator[str]:
+    """Stream response tokens from Groq API as they are generated."""
+    yield from _stream_or_fallback("groq", prompt, max_tokens, temperature)
+
+
+def stream_with_openai(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> Iterator[str]:
+    """Stream response tokens from OpenAI API as they are generated."""
+    yield from _stream_or_fallback("openai", prompt, max_tokens, temperature)
+
+
+def stream_llm_response(prompt: str, max_tokens: int = 150, temperature: float = 0.4) -> Iterator[str]:
+    """
+    Universal streaming generator for cloud providers.
+
+    Groq and OpenAI stream natively; Hugging Face's inference API does not,
+    so its full reply is yielded as a single chunk.
+    """
+    if not config.USE_EXTERNAL_LLM:
+        yield "External LLM is disabled in config."
+        return
+
+    print(f"🌐 Streaming from {config.LLM_PROVIDER.upper()} API")
+
+    provider = config.LLM_PROVIDER.lower()
+    if provider == "groq":
+        yield from stream_with_groq(prompt, max_tokens, temperature)
+    elif provider == "openai":
+        yield from stream_with_openai(prompt, max_tokens, temperature)
+    elif provider in ["huggingface", "hf"]:
+        yield generate_with_huggingface(prompt, max_tokens, temperature)
+    else:
+        print(f"⚠️ Unknown provider: {config.LLM_PROVIDER}, using Groq")
+        yield from stream_with_groq(prompt, max_tokens, temperature)
+
+
+# =============================================================================
+# Failover chain
+# =============================================================================
+
+def cloud_provider(name: str) -> Provider:
+    """Wrap a cloud API as a :class:`provider_chain.Provider`."""
+    name = normalize_provider(name)
+    if name not in CLOUD_PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+
+    def _generate(prompt: str, max_tokens: int, temperature: float, **_: Any) -> str:
+        return COMPLETERS[name](prompt, max_tokens, temperature)
+
+    def _stream(prompt: str, max_tokens: int, temperature: float, **_: Any) -> Iterator[str]:
+        return stream_completion(name, prompt, max_tokens, temperature)
+
+    return Provider(
+        name,
+        generate=_generate,
+        stream=_stream,
+        timeout=provider_timeout(name),
+        breaker=CircuitBreaker(config.CIRCUIT_BREAKER_FAILURES, config.CIRCUIT_BREAKER_RESET_SEC)
+    )
+
+
 if __name__ == "__main__":
     print("=" * 60)
     print("LLM ADAPTER CONFIGURATION")
@@ -4,19 +4,26 @@ from config import config
 # Third-party imports
 from fastapi import FastAPI, Depends, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 import random
 from typing import Optional
 
 # Component imports
-from database import engine, Base, get_db
-from dependencies import limiter
+from database import async_engine, engine, Base, get_async_db
+from dependencies import limiter, require_service_key
+from pagination import NEXT_CURSOR_HEADER
+import llamacpp
+import llm_adapter
+import intent_router
+import sentiment
+import sentiment_jobs
 from llamacpp import get_short_part_name
 from auth import get_current_user
-from services import PlayerService, ChatService, BuildService
+from async_services import AsyncPlayerService, AsyncChatService, AsyncBuildService
 import oauth_routes
 from routes import npc_routes, build_routes, player_routes, consent_routes
 
@@ -47,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Security headers middleware
@@ -74,6 +82,25 @@ try:
 except Exception as e:
     print(f"❌ Database init error: {e}")
 
+@app.on_event("startup")
+def start_model_loading() -> None:
+    """Load the local and sentiment models in the background so the app accepts requests immediately."""
+    llamacpp.start_model_loading()
+    sentiment.start_sentiment_warmup()
+
+@app.on_event("shutdown")
+async def close_llm_clients() -> None:
+    """Release pooled provider connections, stop local inference and drain queued sentiment jobs."""
+    llm_adapter.close_clients()
+    if llamacpp.worker_pool is not None:
+        llamacpp.worker_pool.shutdown()
+    if llamacpp.scheduler is not None:
+        # Queued and running jobs finish within their own deadline
+        llamacpp.scheduler.shutdown(config.INFERENCE_TIMEOUT_SEC)
+    if sentiment_jobs.sentiment_jobs is not None:
+        sentiment_jobs.sentiment_jobs.shutdown(config.SENTIMENT_JOB_DRAIN_SEC)
+    await async_engine.dispose()
+
 # --- Root & Base UI Routes ---
 
 @app.get("/", response_class=HTMLResponse, tags=["UI"])
@@ -95,10 +122,10 @@ def cover_page(
     })
 
 @app.get("/chat", response_class=HTMLResponse, tags=["UI"])
-def get_chat(
+async def get_chat(
     request: Request,
     player_id: Optional[int] = Query(default=None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user)
 ) -> HTMLResponse:
     user_id = int(user.get("sub"))
@@ -107,9 +134,9 @@ def get_chat(
     elif player_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized for this player")
         
-    player = PlayerService.get_player_by_id(db, player_id)
-    chat_history = ChatService.get_conversation_history(db, player_id, limit=50)
-    latest_build = BuildService.get_latest_build(db, player_id)
+    player = await AsyncPlayerService.get_player_by_id(db, player_id)
+    chat_history = await AsyncChatService.get_conversation_history(db, player_id, limit=50)
+    latest_build = await AsyncBuildService.get_latest_build(db, player_id)
 
     intro_message = ""
     if latest_build:
@@ -128,12 +155,12 @@ def get_chat(
     })
 
 @app.get("/chat_static", response_class=HTMLResponse, tags=["UI"])
-def get_static_chat(
+async def get_static_chat(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user)
 ) -> HTMLResponse:
-    player = PlayerService.get_player_by_id(db, int(user.get("sub")))
+    player = await AsyncPlayerService.get_player_by_id(db, int(user.get("sub")))
     return templates.TemplateResponse("chat_static.html", {
         "request": request,
         "players": [player] if player else []
@@ -159,13 +186,46 @@ def evaluation_page(request: Request, user: dict = Depends(get_current_user)) ->
     return templates.TemplateResponse("evaluation.html", {"request": request})
 
 @app.get("/health", tags=["System"])
-def health_check(db: Session = Depends(get_db)) -> dict:
+async def health_check(db: AsyncSession = Depends(get_async_db)) -> dict:
     try:
-        db.execute("SELECT 1")
+        await db.execute(text("SELECT 1"))
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Service unhealthy: {str(e)}")
 
+@app.get("/ready", tags=["System"])
+def readiness_check() -> JSONResponse:
+    """Readiness probe: 503 until the local model has finished loading."""
+    status = llamacpp.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/inference/stats", tags=["System"])
+def inference_stats(_: None = Depends(require_service_key)) -> dict:
+    """Inference queue depth, wait times and cache counters for capacity sizing."""
+    if llamacpp.worker_pool is not None:
+        stats = {"backend": "local_processes", **llamacpp.worker_pool.stats()}
+    elif llamacpp.scheduler is not None:
+        stats = {"backend": "local", **llamacpp.scheduler.stats()}
+    else:
+        stats = {"backend": "external" if config.USE_EXTERNAL_LLM else "unavailable"}
+    stats["local_model"] = llamacpp.model_status
+    if llamacpp.prompt_cache is not None:
+        stats["prompt_cache"] = llamacpp.prompt_cache.stats()
+    if llamacpp.response_cache is not None:
+        stats["response_cache"] = llamacpp.response_cache.stats()
+    stats["intent_fast_path"] = intent_router.stats()
+    stats["sentiment_model"] = sentiment.sentiment_model_status()
+    if sentiment.sentiment_batcher is not None:
+        stats["sentiment_batcher"] = sentiment.sentiment_batcher.stats()
+    if sentiment_jobs.sentiment_jobs is not None:
+        stats["sentiment_jobs"] = sentiment_jobs.sentiment_jobs.stats()
+    return stats
+
+@app.get("/health/providers", tags=["System"])
+def provider_health(_: None = Depends(require_service_key)) -> dict:
+    """Circuit breaker state, latency percentiles and last error per LLM provider."""
+    return llamacpp.provider_chain.health()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,11 +1,26 @@
+import hashlib
+import unicodedata
 from datetime import datetime, timezone
+from typing import Optional
 
 from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index, Boolean, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 
 from database import Base
 
 
+def dialogue_fingerprint(dialogue: Optional[str]) -> Optional[str]:
+    """SHA-256 of a dialogue after NFC normalization and whitespace collapsing.
+
+    Messages that differ only in Unicode composition or spacing share a
+    fingerprint, so the duplicate check treats them as the same message.
+    """
+    if dialogue is None:
+        return None
+    normalized = " ".join(unicodedata.normalize("NFC", dialogue).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
 class NPCMemory(Base):
     """Store NPC conversation memories with sentiment analysis."""
     __tablename__ = "npc_memory"
@@ -18,19 +33,51 @@ class NPCMemory(Base):
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
     npc_reply = Column(Text, nullable=True)
     npc_sentiment = Column(String(20), nullable=True)
+    dialogue_hash = Column(String(64), nullable=True)  # dialogue_fingerprint(dialogue), set by the validator below
     
     # Relationship
     player = relationship("Player", back_populates="memories")
     
-    # Composite index for common query pattern
+    # Composite indexes for common query patterns
     __table_args__ = (
         Index('ix_player_npc_timestamp', 'player_id', 'npc_id', 'timestamp'),
+        Index('ix_player_npc_dialogue_hash', 'player_id', 'npc_id', 'dialogue_hash'),
     )
+
+    @validates('dialogue')
+    def _fingerprint_dialogue(self, key: str, dialogue: str) -> str:
+        """Keep dialogue_hash in step whenever dialogue is set or edited."""
+        self.dialogue_hash = dialogue_fingerprint(dialogue)
+        return dialogue
     
     def __repr__(self) -> str:
         return f"<NPCMemory(id={self.id}, player_id={self.player_id}, npc_id={self.npc_id}, timestamp={self.timestamp})>"
 
 
+class ConversationSummary(Base):
+    """Rolling summary of the turns that have left a player's prompt window."""
+    __tablename__ = "conversation_summaries"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    player_id = Column(Integer, ForeignKey("players.id", ondelete="CASCADE"), nullable=False, index=True)
+    npc_id = Column(Integer, nullable=False)
+    summary = Column(Text, nullable=False, default="")
+    summarized_through_id = Column(Integer, nullable=False, default=0)  # Last npc_memory.id folded in
+    turns_summarized = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Relationship
+    player = relationship("Player", back_populates="summaries")
+
+    # One summary per player/NPC pair
+    __table_args__ = (
+        UniqueConstraint('player_id', 'npc_id', name='uix_player_npc_summary'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ConversationSummary(player_id={self.player_id}, npc_id={self.npc_id}, through={self.summarized_through_id})>"
+
+
 class Player(Base):
     """Store player information and credentials."""
     __tablename__ = "players"
@@ -46,6 +93,7 @@ class Player(Base):
     memories = relationship("NPCMemory", back_populates="player", lazy="dynamic", cascade="all, delete-orphan")
     builds = relationship("CarBuild", back_populates="player", lazy="dynamic", cascade="all, delete-orphan")
     consent_records = relationship("Consent", back_populates="player", lazy="dynamic", cascade="all, delete-orphan")
+    summaries = relationship("ConversationSummary", back_populates="player", lazy="dynamic", cascade="all, delete-orphan")
     
     def __repr__(self) -> str:
         return f"<Player(id={self.id}, name='{self.name}', display_name='{self.display_name}')>"
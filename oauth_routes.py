@@ -6,17 +6,18 @@ import os
 import httpx
 from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth import (
     create_access_token, create_refresh_token, verify_token,
     OAUTH_CONFIG, hash_password, verify_password
 )
 from config import config
-from database import SessionLocal, get_db
+from database import SessionLocal, get_async_db
 from models import Player
 from schemas import PlayerCreate
 from dependencies import is_email_allowed
+from async_services import AsyncPlayerService
 
 # Check if running in production
 IS_PRODUCTION = config.ENVIRONMENT == "production"
@@ -49,7 +50,7 @@ async def oauth_login(provider: str, request: Request):
 
 
 @router.get("/callback/{provider}")
-async def oauth_callback(provider: str, code: str, request: Request, db: Session = Depends(get_db)):
+async def oauth_callback(provider: str, code: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Handle OAuth 2.0 callback and create session."""
     if provider not in OAUTH_CONFIG:
         raise HTTPException(status_code=400, detail="Invalid OAuth provider")
@@ -109,20 +110,17 @@ async def oauth_callback(provider: str, code: str, request: Request, db: Session
         raise HTTPException(status_code=403, detail="Email not allowed")
     
     # Find or create user
-    player = db.query(Player).filter(Player.email == email).first()
+    player = await AsyncPlayerService.get_player_by_email(db, email)
     
     if not player:
         # Create new user
         from uuid import uuid4
-        player = Player(
+        player = await AsyncPlayerService.add_player(db, Player(
             name=str(uuid4()),  # Generate UUID as account ID
             email=email,
             display_name=name,
             pin_hash=None  # OAuth users don't use password authentication
-        )
-        db.add(player)
-        db.commit()
-        db.refresh(player)
+        ))
     
     # Create JWT tokens
     token_data = {"sub": str(player.id), "email": email, "name": name}
@@ -0,0 +1,93 @@
+"""
+Pagination - Opaque cursor tokens for keyset pagination
+A list endpoint returns one page plus, when more rows follow, a cursor token
+holding the sort key of the last row. The next request filters on that key
+instead of skipping rows with OFFSET, so every page is an index range scan
+of the same cost however deep the client has paged.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+T = TypeVar("T")
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor token cannot be decoded."""
+    pass
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack a sort key (ints and datetimes) into a URL-safe token."""
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, *types: type) -> Tuple[Any, ...]:
+    """Unpack a token made by ``encode_cursor``.
+
+    Args:
+        token: Cursor token from the client
+        types: Expected type of each key column, ``int`` or ``datetime``
+
+    Returns:
+        Tuple of key values in the order they were encoded
+
+    Raises:
+        InvalidCursorError: If the token is malformed or does not match ``types``
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = json.loads(raw)
+        if not isinstance(key, list) or len(key) != len(types):
+            raise ValueError("wrong key length")
+        values = []
+        for value, kind in zip(key, types):
+            if kind is datetime:
+                values.append(datetime.fromisoformat(value))
+            elif kind is int and isinstance(value, int) and not isinstance(value, bool):
+                values.append(value)
+            else:
+                raise ValueError(f"expected {kind.__name__}")
+        return tuple(values)
+    except (ValueError, TypeError) as e:
+        # Fixed message: routes return it to the client, the parse error stays in __cause__
+        raise InvalidCursorError("Invalid cursor") from e
+
+
+def keyset_before(timestamp_column: Any, id_column: Any, timestamp: datetime, row_id: int) -> ColumnElement:
+    """Rows after ``(timestamp, row_id)`` in ``timestamp DESC, id DESC`` order.
+
+    The redundant ``timestamp <= :timestamp`` gives the planner a range bound
+    on the timestamp column of a composite index; the OR only breaks ties.
+    """
+    return and_(
+        timestamp_column <= timestamp,
+        or_(timestamp_column < timestamp, id_column < row_id)
+    )
+
+
+def paginate(rows: Sequence[T], limit: int, key: Callable[[T], Tuple[Any, ...]]) -> Tuple[List[T], Optional[str]]:
+    """Split ``limit + 1`` fetched rows into a page and the next cursor.
+
+    Args:
+        rows: Rows fetched with ``LIMIT limit + 1``
+        limit: Page size
+        key: Returns the sort key of a row
+
+    Returns:
+        (page, next cursor or None when this is the last page)
+    """
+    page = list(rows[:limit])
+    if len(rows) <= limit:
+        return page, None
+    return page, encode_cursor(*key(page[-1]))
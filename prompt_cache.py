@@ -0,0 +1,289 @@
+"""
+Prompt Cache - Reuses llama.cpp KV state across Dax turns
+The static Dax instruction prefix is evaluated once and shared, and each
+player's post-turn model state is kept in an LRU RAM tier (optionally spilling
+to a byte-capped disk tier) so a new turn only evaluates the tokens that changed.
+"""
+
+import glob
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+
+def _longest_prefix(a: Sequence[int], b: Sequence[int]) -> int:
+    """Number of leading tokens two sequences share."""
+    matched = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        matched += 1
+    return matched
+
+
+def _state_size(state: Any) -> int:
+    """Approximate RAM held by a saved ``LlamaState``."""
+    size = int(getattr(state, "llama_state_size", 0) or 0)
+    for attr in ("input_ids", "scores"):
+        size += int(getattr(getattr(state, attr, None), "nbytes", 0) or 0)
+    return size
+
+
+def model_identity(model_path: str, n_ctx: int) -> str:
+    """What a saved state is only valid for: this GGUF file at this context size.
+
+    Size and mtime are included so a model replaced in place at the same path
+    does not count as the same model.
+    """
+    try:
+        stat = os.stat(model_path)
+        file_id = f"{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        file_id = "?"
+    return f"{os.path.abspath(model_path)}|{file_id}|n_ctx={n_ctx}"
+
+
+def _tokenize(model: Any, text: str) -> List[int]:
+    """Tokenize exactly as ``Llama.create_completion`` does for a string prompt."""
+    return model.tokenize(text.encode("utf-8"), special=True)
+
+
+class PromptStateCache:
+    """Per-player ``LlamaState`` cache with a shared system-prefix state.
+
+    States saved from one model instance can be loaded into any other instance
+    of the same GGUF file with the same context settings, so a single cache is
+    shared by every scheduler worker.
+
+    Args:
+        capacity_bytes: RAM held by saved player states before LRU eviction
+        disk_dir: Directory evicted states spill to (None disables the disk tier)
+        disk_capacity_bytes: Bytes of spilled states kept on disk, least recently
+            used deleted first (0 means no cap)
+        model_id: ``model_identity()`` of the model the states come from;
+            spilled states saved for any other model are deleted on startup
+    """
+
+    IDENTITY_FILE = "model.id"
+
+    def __init__(
+        self,
+        capacity_bytes: int,
+        disk_dir: Optional[str] = None,
+        disk_capacity_bytes: int = 0,
+        model_id: str = ""
+    ):
+        self.capacity_bytes = capacity_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_capacity_bytes = disk_capacity_bytes
+
+        self._states: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._used_bytes = 0
+        self._prefix_state: Any = None
+        self._lock = threading.Lock()
+
+        # Spilled states, least recently used first: key -> file size
+        self._disk_files: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_evictions = 0
+        self._disk_lock = threading.Lock()
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._open_disk_tier(model_id)
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._prefix_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._reused_tokens = 0
+        self._prompt_tokens = 0
+
+    # -------------------------------------------------------------------------
+    # Model hooks (called on the worker thread that owns ``model``)
+    # -------------------------------------------------------------------------
+
+    def warm_prefix(self, model: Any, prefix: str) -> None:
+        """Evaluate the static prompt prefix once and keep its state."""
+        tokens = _tokenize(model, prefix)
+        model.reset()
+        model.eval(tokens)
+        with self._lock:
+            self._prefix_state = model.save_state()
+        print(f"✅ Cached static Dax prompt prefix ({len(tokens)} tokens)")
+
+    def restore(self, model: Any, key: Hashable, prompt: str) -> int:
+        """Load the saved state sharing the longest prefix with ``prompt``.
+
+        Returns:
+            Number of prompt tokens llama.cpp can skip evaluating
+        """
+        tokens = _tokenize(model, prompt)
+        current = _longest_prefix(model.input_ids[:model.n_tokens].tolist(), tokens)
+
+        best_state, best_len, source = None, current, None
+        for candidate, label in ((self._get(key), "player"), (self._prefix_state, "prefix")):
+            if candidate is None:
+                continue
+            matched = _longest_prefix(candidate.input_ids.tolist(), tokens)
+            if matched > best_len:
+                best_state, best_len, source = candidate, matched, label
+
+        if best_state is not None:
+            model.load_state(best_state)
+
+        with self._lock:
+            self._prompt_tokens += len(tokens)
+            self._reused_tokens += best_len
+            if source == "prefix":
+                self._prefix_hits += 1
+            elif source is None and current == 0:
+                self._misses += 1
+        return best_len
+
+    def save(self, model: Any, key: Hashable) -> None:
+        """Remember the model's state after a turn for the player's next turn."""
+        state = model.save_state()
+        size = _state_size(state)
+        with self._lock:
+            if key in self._states:
+                self._used_bytes -= self._sizes.pop(key)
+                del self._states[key]
+            self._states[key] = state
+            self._sizes[key] = size
+            self._used_bytes += size
+            evicted = self._evict_locked()
+
+        for evicted_key, evicted_state in evicted:
+            self._write_disk(evicted_key, evicted_state)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and the share of prompt tokens served from cache."""
+        with self._lock:
+            return {
+                "entries": len(self._states),
+                "used_bytes": self._used_bytes,
+                "capacity_bytes": self.capacity_bytes,
+                "disk_tier": bool(self.disk_dir),
+                "disk_entries": len(self._disk_files),
+                "disk_bytes": self._disk_bytes,
+                "disk_capacity_bytes": self.disk_capacity_bytes,
+                "disk_evictions": self._disk_evictions,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "prefix_hits": self._prefix_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "reused_token_ratio": round(self._reused_tokens / self._prompt_tokens, 3) if self._prompt_tokens else 0.0,
+            }
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _get(self, key: Hashable) -> Any:
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+                self._hits += 1
+                return state
+
+        state = self._read_disk(key)
+        if state is not None:
+            with self._lock:
+                self._disk_hits += 1
+        return state
+
+    def _evict_locked(self) -> List[tuple]:
+        evicted = []
+        # Always keep the most recent entry, even if it alone exceeds capacity
+        while self._used_bytes > self.capacity_bytes and len(self._states) > 1:
+            old_key, old_state = self._states.popitem(last=False)
+            self._used_bytes -= self._sizes.pop(old_key)
+            self._evictions += 1
+            evicted.append((old_key, old_state))
+        return evicted
+
+    def _disk_path(self, key: Hashable) -> str:
+        return os.path.join(self.disk_dir, f"{key}.state")
+
+    def _open_disk_tier(self, model_id: str) -> None:
+        """Drop states saved for a different model, then index the ones that remain."""
+        identity_path = os.path.join(self.disk_dir, self.IDENTITY_FILE)
+        saved_id = None
+        if os.path.exists(identity_path):
+            with open(identity_path) as f:
+                saved_id = f.read()
+
+        paths = glob.glob(os.path.join(self.disk_dir, "*.state"))
+        if saved_id != model_id:
+            for path in paths:
+                os.remove(path)
+            if paths:
+                print(f"🧹 Cleared {len(paths)} prompt states saved for another model from {self.disk_dir}")
+            paths = []
+            with open(identity_path, "w") as f:
+                f.write(model_id)
+
+        for path in sorted(paths, key=os.path.getmtime):
+            key = os.path.basename(path)[:-len(".state")]
+            size = os.path.getsize(path)
+            self._disk_files[key] = size
+            self._disk_bytes += size
+        with self._disk_lock:
+            self._prune_disk_locked()
+
+    def _prune_disk_locked(self, keep: Optional[str] = None) -> None:
+        """Delete the least recently used spilled states until under the disk cap."""
+        if not self.disk_capacity_bytes:
+            return
+        while self._disk_bytes > self.disk_capacity_bytes and self._disk_files:
+            key, size = next(iter(self._disk_files.items()))
+            if key == keep:
+                break
+            del self._disk_files[key]
+            self._disk_bytes -= size
+            self._disk_evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _write_disk(self, key: Hashable, state: Any) -> None:
+        if not self.disk_dir:
+            return
+        try:
+            with self._disk_lock:
+                tmp_path = self._disk_path(key) + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self._disk_path(key))
+
+                name = str(key)
+                self._disk_bytes -= self._disk_files.pop(name, 0)
+                self._disk_files[name] = os.path.getsize(self._disk_path(key))
+                self._disk_bytes += self._disk_files[name]
+                self._prune_disk_locked(keep=name)
+        except Exception as e:
+            print(f"⚠️ Failed to spill prompt state for {key}: {e}")
+
+    def _read_disk(self, key: Hashable) -> Any:
+        if not self.disk_dir:
+            return None
+        with self._disk_lock:
+            if str(key) not in self._disk_files:
+                return None
+            self._disk_files.move_to_end(str(key))
+        try:
+            path = self._disk_path(key)
+            # Keep the file's mtime in use order so the LRU survives a restart
+            os.utime(path)
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ Failed to read prompt state for {key}: {e}")
+            return None
@@ -0,0 +1,366 @@
+"""
+Provider Chain - Ordered LLM failover with circuit breakers and hedging
+Tries each configured provider in turn (e.g. groq -> openai -> local -> rules),
+skips providers that are still starting up or whose circuit breaker is open,
+and can optionally fire the next provider early when the current one is
+slower than its usual latency.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from inference_scheduler import InferenceBusyError
+
+
+class ProviderError(Exception):
+    """Base class for provider chain failures."""
+
+
+class ProviderUnavailableError(ProviderError):
+    """Raised by a provider that is not configured (missing key, model not loaded)."""
+
+
+class ProviderTimeoutError(ProviderError):
+    """Raised when a provider does not answer within its timeout."""
+
+
+class AllProvidersFailedError(ProviderError):
+    """Raised when every provider in the chain failed or was skipped."""
+
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker keyed on consecutive failures."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now (one trial call when half-open)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open: let exactly one trial through
+            if self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Give back a half-open trial slot without recording an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    @property
+    def consecutive_failures(self) -> int:
+        return self._consecutive_failures
+
+
+class Provider:
+    """A named generation backend plus its breaker and latency history."""
+
+    def __init__(
+        self,
+        name: str,
+        generate: Callable[..., str],
+        stream: Optional[Callable[..., Iterator[str]]] = None,
+        timeout: float = 20.0,
+        breaker: Optional[CircuitBreaker] = None,
+        ready: Optional[Callable[[], bool]] = None
+    ):
+        self.name = name
+        self.generate = generate
+        self.stream = stream
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.ready = ready
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def record_success(self, latency: float) -> None:
+        self.breaker.record_success()
+        with self._lock:
+            self._latencies.append(latency)
+            self.successes += 1
+
+    def record_failure(self, error: BaseException) -> None:
+        self.breaker.record_failure()
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+
+    @property
+    def is_ready(self) -> bool:
+        """False while the provider is still starting up (e.g. a model loading)."""
+        return self.ready is None or self.ready()
+
+    @property
+    def sample_count(self) -> int:
+        return len(self._latencies)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+    def health(self) -> Dict[str, Any]:
+        p50 = self.latency_percentile(0.5)
+        p90 = self.latency_percentile(0.9)
+        return {
+            "ready": self.is_ready,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeout_sec": self.timeout,
+            "p50_latency_sec": round(p50, 3) if p50 is not None else None,
+            "p90_latency_sec": round(p90, 3) if p90 is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class _Attempt:
+    """One in-flight call to a provider."""
+    __slots__ = ("provider", "future", "started")
+
+    def __init__(self, provider: Provider, future: Future):
+        self.provider = provider
+        self.future = future
+        self.started = time.monotonic()
+
+
+class ProviderChain:
+    """Runs a prompt through providers in order until one succeeds."""
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 0.9,
+        hedge_min_samples: int = 10,
+        max_workers: int = 16
+    ):
+        self.providers = providers
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-provider")
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def generate(self, prompt: str, max_tokens: int, temperature: float, **kwargs: Any) -> Tuple[str, str]:
+        """Return ``(text, provider_name)`` from the first provider that answers.
+
+        Raises:
+            InferenceBusyError: If the only failures were local queue saturation
+            AllProvidersFailedError: If every provider failed or was skipped
+        """
+        remaining = list(self.providers)
+        pending: List[_Attempt] = []
+        busy_error: Optional[InferenceBusyError] = None
+        errors: List[str] = []
+
+        while True:
+            if not pending:
+                attempt = self._launch_next(remaining, prompt, max_tokens, temperature, kwargs)
+                if attempt is None:
+                    break
+                pending.append(attempt)
+
+            now = time.monotonic()
+            deadlines = [a.started + a.provider.timeout - now for a in pending]
+            wait_for = max(0.0, min(deadlines))
+            hedge_at = self._hedge_delay(pending[-1]) if remaining else None
+            if hedge_at is not None:
+                wait_for = min(wait_for, max(0.0, pending[-1].started + hedge_at - now))
+
+            done, _ = wait([a.future for a in pending], timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for attempt in [a for a in pending if a.future in done]:
+                pending.remove(attempt)
+                try:
+                    text = attempt.future.result()
+                except InferenceBusyError as e:
+                    attempt.provider.breaker.release()
+                    busy_error = e
+                    errors.append(f"{attempt.provider.name}: busy")
+                    continue
+                except Exception as e:
+                    attempt.provider.record_failure(e)
+                    errors.append(f"{attempt.provider.name}: {e}")
+                    print(f"⚠️ Provider {attempt.provider.name} failed: {e}")
+                    continue
+                attempt.provider.record_success(time.monotonic() - attempt.started)
+                self._abandon(pending)
+                return text, attempt.provider.name
+
+            if done:
+                continue
+
+            # Nothing finished: give up on providers past their timeout ...
+            now = time.monotonic()
+            for attempt in [a for a in pending if now - a.started >= a.provider.timeout]:
+                pending.remove(attempt)
+                self._abandon([attempt], ProviderTimeoutError(f"no answer within {attempt.provider.timeout:.1f}s"))
+                errors.append(f"{attempt.provider.name}: timeout")
+                print(f"⏱️ Provider {attempt.provider.name} timed out after {attempt.provider.timeout:.1f}s")
+
+            # ... or hedge by starting the next provider alongside the slow one
+            if pending and remaining and hedge_at is not None and now - pending[-1].started >= hedge_at:
+                attempt = self._launch_next(remaining, prompt, max_tokens, temperature, kwargs)
+                if attempt is not None:
+                    print(f"🔀 Hedging {pending[-1].provider.name} with {attempt.provider.name}")
+                    pending.append(attempt)
+
+        if busy_error is not None:
+            raise busy_error
+        raise AllProvidersFailedError("; ".join(errors) or "no provider available")
+
+    def stream(self, prompt: str, max_tokens: int, temperature: float, **kwargs: Any) -> Iterator[str]:
+        """Stream tokens from the first provider that produces any.
+
+        Failover only happens before the first token; hedging does not apply
+        to streams because a reply cannot be taken back once it is shown.
+        """
+        busy_error: Optional[InferenceBusyError] = None
+        errors: List[str] = []
+
+        for provider in self.providers:
+            if not provider.is_ready or not provider.breaker.allow():
+                continue
+            started = time.monotonic()
+            emitted = False
+            try:
+                if provider.stream is not None:
+                    tokens = provider.stream(prompt, max_tokens, temperature, **kwargs)
+                else:
+                    tokens = iter([provider.generate(prompt, max_tokens, temperature, **kwargs)])
+                for token in tokens:
+                    emitted = True
+                    yield token
+            except GeneratorExit:
+                # The consumer stopped early (sentence budget used up, client
+                # disconnected). Settle the breaker so a half-open trial slot
+                # is not held forever, and let the provider stream clean up.
+                if emitted:
+                    provider.record_success(time.monotonic() - started)
+                else:
+                    provider.breaker.release()
+                close = getattr(tokens, "close", None)
+                if close is not None:
+                    close()
+                raise
+            except InferenceBusyError as e:
+                provider.breaker.release()
+                if emitted:
+                    raise
+                busy_error = e
+                continue
+            except Exception as e:
+                provider.record_failure(e)
+                if emitted:
+                    raise
+                errors.append(f"{provider.name}: {e}")
+                print(f"⚠️ Provider {provider.name} failed: {e}")
+                continue
+            provider.record_success(time.monotonic() - started)
+            return
+
+        if busy_error is not None:
+            raise busy_error
+        raise AllProvidersFailedError("; ".join(errors) or "no provider available")
+
+    def health(self) -> Dict[str, Any]:
+        """Breaker state and latency/error counters for every provider."""
+        return {
+            "chain": [p.name for p in self.providers],
+            "hedging": self.hedge_enabled,
+            "providers": {p.name: p.health() for p in self.providers},
+        }
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _launch_next(self, remaining: List[Provider], prompt: str, max_tokens: int, temperature: float, kwargs: Dict[str, Any]) -> Optional[_Attempt]:
+        while remaining:
+            provider = remaining.pop(0)
+            # Not-ready providers are skipped without touching the breaker
+            if not provider.is_ready or not provider.breaker.allow():
+                continue
+            future = self._executor.submit(provider.generate, prompt, max_tokens, temperature, **kwargs)
+            return _Attempt(provider, future)
+        return None
+
+    def _hedge_delay(self, attempt: _Attempt) -> Optional[float]:
+        if not self.hedge_enabled:
+            return None
+        if attempt.provider.sample_count < self.hedge_min_samples:
+            return None
+        return attempt.provider.latency_percentile(self.hedge_percentile)
+
+    @staticmethod
+    def _abandon(attempts: List[_Attempt], error: Optional[BaseException] = None) -> None:
+        """Stop waiting on attempts; their outcome still feeds the breaker."""
+        for attempt in attempts:
+            if error is not None:
+                attempt.provider.record_failure(error)
+                continue
+
+            def _record(future: Future, attempt: _Attempt = attempt) -> None:
+                # A losing hedge still tells us whether the provider is healthy
+                try:
+                    future.result()
+                except InferenceBusyError:
+                    attempt.provider.breaker.release()
+                except Exception as e:
+                    attempt.provider.record_failure(e)
+                else:
+                    attempt.provider.record_success(time.monotonic() - attempt.started)
+
+            attempt.future.add_done_callback(_record)
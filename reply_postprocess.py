@@ -0,0 +1,130 @@
+"""
+Reply Post-processing - Cleans raw completions and scans them for F1 terms
+All part/brand vocabularies are compiled into one term table, so a reply is
+lowercased once and scanned once instead of once per vocabulary.
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Tuple
+
+# Mapping for user-friendly car part names
+PART_NAME_MAP: Dict[str, str] = {
+    "standard monocoque": "Monocoque",
+    "ground effect": "Ground Effect",
+    "2004 v10": "V10 Engine",
+    "2006 v8": "V8 Engine",
+    "c5 slick": "Slick Tires",
+    "full wet": "Wet Tires",
+    "high lift": "High Lift Wing",
+    "simple outwash": "Outwash Wing",
+    "high downforce": "High Downforce",
+    "low drag": "Low Drag"
+}
+
+# Valid F1 parts for validation
+VALID_F1_PARTS = list(PART_NAME_MAP.keys())
+
+# Invalid car brands (for hallucination detection)
+INVALID_CAR_BRANDS = [
+    "corvette", "porsche", "audi", "ferrari", "lamborghini",
+    "bmw", "mercedes", "toyota", "honda", "nissan",
+    "chevrolet", "ford"
+]
+
+# Invalid parts (for hallucination detection)
+INVALID_PARTS = [
+    "winglet", "sweep angle", "ride height", "suspension",
+    "brake", "gear", "differential", "turbo", "supercharger"
+]
+
+_LEADING_DAX = re.compile(r"(?:Dax:\s*)+")
+_PROMPT_LEAK = re.compile(r"Player Message:|Respond as Dax")
+
+
+class ScanResult(NamedTuple):
+    """Vocabulary terms found in a reply."""
+    valid_parts: FrozenSet[str]
+    invalid_cars: FrozenSet[str]
+    invalid_parts: FrozenSet[str]
+
+    @property
+    def mentions_part(self) -> bool:
+        return bool(self.valid_parts)
+
+    @property
+    def hallucinated(self) -> bool:
+        return bool(self.invalid_cars or self.invalid_parts)
+
+
+class ProcessedReply(NamedTuple):
+    """Cleaned reply text plus the terms found in it."""
+    text: str
+    scan: ScanResult
+
+
+class TermScanner:
+    """Finds terms from several vocabularies in one pass over the text.
+
+    Matching is by substring, like ``term in text.lower()``, so "gearbox"
+    still counts as "gear". For a few dozen short terms, C-level substring
+    checks against a single lowercased copy are as fast as a combined regex
+    alternation in CPython (see ``python -m scripts.bench_postprocess``).
+    """
+
+    def __init__(self, vocabularies: Dict[str, Iterable[str]]):
+        self.categories = tuple(vocabularies)
+        self._terms: Tuple[Tuple[str, int], ...] = tuple(
+            (term.lower(), index)
+            for index, terms in enumerate(vocabularies.values())
+            for term in terms
+        )
+
+    def scan(self, text: str) -> Tuple[FrozenSet[str], ...]:
+        """Return the terms found, one frozenset per vocabulary (in order)."""
+        lowered = text.lower()
+        found: List[List[str]] = [[] for _ in self.categories]
+        for term, index in self._terms:
+            if term in lowered:
+                found[index].append(term)
+        return tuple(frozenset(terms) for terms in found)
+
+
+REPLY_SCANNER = TermScanner({
+    "valid_parts": VALID_F1_PARTS,
+    "invalid_cars": INVALID_CAR_BRANDS,
+    "invalid_parts": INVALID_PARTS,
+})
+
+
+def clean_reply(text: str) -> str:
+    """Strip "Dax:" labels, leaked prompt instructions and wrapping quotes."""
+    match = _LEADING_DAX.match(text)
+    if match:
+        text = text[match.end():].strip()
+
+    leak = _PROMPT_LEAK.search(text)
+    if leak:
+        text = text[:leak.start()].strip()
+
+    if text.startswith('"'):
+        text = text[1:-1] if text.endswith('"') else text[1:]
+
+    return text.replace("Dax:", "").strip()
+
+
+def scan_reply(text: str) -> ScanResult:
+    """Find valid F1 parts and hallucinated brands/parts in one pass."""
+    return ScanResult(*REPLY_SCANNER.scan(text))
+
+
+def postprocess_reply(text: str) -> ProcessedReply:
+    """Clean a raw completion and scan the result.
+
+    Args:
+        text: Raw text produced by the model or provider
+
+    Returns:
+        ProcessedReply with the cleaned text and the terms it mentions
+    """
+    cleaned = clean_reply(text)
+    return ProcessedReply(cleaned, scan_reply(cleaned))
@@ -0,0 +1,203 @@
+"""
+Response Cache - Skips generation for repeated Dax turns
+Keys combine the normalized dialogue, the resolved build and a hash of the
+recent conversation window. Entries live in an LRU + TTL RAM tier, optionally
+backed by a SQLite file that every uvicorn worker on the host can share.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+# Replies are stored with the player's name swapped for this placeholder so
+# one cached answer can serve every player who sends the same turn.
+PLAYER_PLACEHOLDER = "{{player_name}}"
+
+# Names too short or too common to swap safely: "Al" and "Max" also show up
+# as words in replies ("max downforce"), "Dax" is the NPC itself. Replies for
+# these players are not cached, since the key does not include the name.
+_MIN_NAME_LENGTH = 3
+_GENERIC_NAMES = frozenset({
+    "dax", "there", "max", "min", "mate", "boss", "chief", "champ", "driver",
+    "player", "racer", "friend", "buddy", "team", "car", "race", "pit", "box",
+    "push", "speed", "grip", "wing", "power", "pace", "lap", "sir", "you",
+})
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_dialogue(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace ("Hi!!" == "hi")."""
+    text = _NON_WORD.sub(" ", (text or "").lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def make_cache_key(dialogue: str, build_parts: Sequence[str], context_text: str) -> str:
+    """Stable key for a turn: normalized dialogue + build tuple + context hash."""
+    context_hash = hashlib.sha1(context_text.encode("utf-8")).hexdigest()
+    raw = json.dumps([normalize_dialogue(dialogue), list(build_parts), context_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _template_player_name(text: str, player_name: str) -> Optional[str]:
+    """Swap whole-word ``player_name`` for the placeholder, or None if the name is unsafe."""
+    name = player_name.strip()
+    if len(name) < _MIN_NAME_LENGTH or name.lower() in _GENERIC_NAMES:
+        return None
+    return re.sub(rf"(?<!\w){re.escape(name)}(?!\w)", PLAYER_PLACEHOLDER, text)
+
+
+class ResponseCache:
+    """LRU + TTL cache of finalized NPC reply dicts."""
+
+    def __init__(self, max_entries: int = 1000, ttl_sec: float = 3600, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.disk_path = disk_path or None
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._skipped = 0
+
+        if self.disk_path:
+            self._open_disk()
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def get(self, key: str, player_name: str = "") -> Optional[Dict[str, Any]]:
+        """Return a cached reply personalised for ``player_name``, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return self._personalise(value, player_name)
+                del self._entries[key]
+
+        value, expires_at = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._set_locked(key, value, expires_at)
+        return self._personalise(value, player_name)
+
+    def put(self, key: str, result: Dict[str, Any], player_name: str = "") -> None:
+        """Store a finalized reply dict under ``key``.
+
+        Whole-word occurrences of ``player_name`` are swapped for the
+        placeholder. Replies for a name that cannot be swapped safely are
+        not stored.
+        """
+        value = dict(result)
+        if player_name and isinstance(value.get("response"), str):
+            response = _template_player_name(value["response"], player_name)
+            if response is None:
+                with self._lock:
+                    self._skipped += 1
+                return
+            value["response"] = response
+
+        expires_at = time.time() + self.ttl_sec
+        with self._lock:
+            self._set_locked(key, value, expires_at)
+            self._stores += 1
+        self._disk_put(key, value, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the RAM and disk tiers."""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_sec": self.ttl_sec,
+                "disk_tier": bool(self.disk_path),
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "stores": self._stores,
+                "skipped": self._skipped,
+                "hit_ratio": round((self._hits + self._disk_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _personalise(value: Dict[str, Any], player_name: str) -> Dict[str, Any]:
+        result = dict(value)
+        if isinstance(result.get("response"), str):
+            result["response"] = result["response"].replace(PLAYER_PLACEHOLDER, player_name or "there")
+        result["response_time_sec"] = 0.0
+        result["cached"] = True
+        return result
+
+    def _set_locked(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _open_disk(self) -> None:
+        try:
+            self._db = sqlite3.connect(self.disk_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache disk tier disabled: {e}")
+            self._db = None
+
+    def _disk_get(self, key: str, now: float) -> Tuple[Optional[Dict[str, Any]], float]:
+        if self._db is None:
+            return None, 0.0
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache read error: {e}")
+            return None, 0.0
+        if row is None:
+            return None, 0.0
+        return json.loads(row[0]), row[1]
+
+    def _disk_put(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self._writes += 1
+                # Purge expired rows now and then so the file stays bounded
+                if self._writes % 100 == 0:
+                    self._db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache write error: {e}")
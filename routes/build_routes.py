@@ -1,24 +1,25 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query, Response
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.templating import Jinja2Templates
 
 from config import config
-from database import get_db
+from database import get_async_db
 from auth import get_current_user
 from schemas import CarBuildResponse
-from services import PlayerService, BuildService
+from async_services import AsyncPlayerService, AsyncBuildService
 from dependencies import limiter
+from pagination import InvalidCursorError, NEXT_CURSOR_HEADER
 
 router = APIRouter(tags=["Car Builds"])
 templates = Jinja2Templates(directory="templates")
 
 @router.get("/build", response_class=HTMLResponse)
-def get_build(
+async def get_build(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     player_id: Optional[int] = Query(default=None),
     user: dict = Depends(get_current_user)
 ) -> HTMLResponse:
@@ -27,7 +28,7 @@ def get_build(
         player_id = user_id
     elif player_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized for this player")
-    player = PlayerService.get_player_by_id(db, player_id)
+    player = await AsyncPlayerService.get_player_by_id(db, player_id)
     players_json = jsonable_encoder([player] if player else [])
     return templates.TemplateResponse("build.html", {
         "request": request,
@@ -45,13 +46,13 @@ async def save_car_build(
     tires: str = Form(""),
     front_wing: str = Form("", alias="frontWing"),
     rear_wing: str = Form("", alias="rearWing"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user)
 ) -> dict:
     if str(user.get("sub")) != str(player_id):
         raise HTTPException(status_code=403, detail="Not authorized for this player")
     # Validate player exists
-    player = PlayerService.get_player_by_id(db, player_id)
+    player = await AsyncPlayerService.get_player_by_id(db, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
     
@@ -63,27 +64,33 @@ async def save_car_build(
         front_wing = front_wing if front_wing else None
         rear_wing = rear_wing if rear_wing else None
         
-        build = BuildService.create_build(
+        build = await AsyncBuildService.create_build(
             db, player_id, chassis, engine, tires,
             front_wing, rear_wing
         )
         return {"status": "success", "message": "Build saved successfully!", "build_id": build.id}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error saving build: {e}")
         raise HTTPException(status_code=500, detail="Database error while saving build.")
 
 @router.get("/get_builds/{player_id}", response_model=List[CarBuildResponse])
 @limiter.limit(config.RATE_LIMITS["general"])
-def get_player_builds(
+async def get_player_builds(
     request: Request, # Fix for slowapi crash
+    response: Response,
     player_id: int,
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
     limit: int = Query(config.DEFAULT_PAGE_SIZE, ge=1, le=config.MAX_PAGE_SIZE),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user)
 ) -> List[CarBuildResponse]:
     if str(user.get("sub")) != str(player_id):
         raise HTTPException(status_code=403, detail="Not authorized for this player")
-    builds = BuildService.get_player_builds(db, player_id, skip=skip, limit=limit)
-    return builds if builds else []
+    try:
+        builds, next_cursor = await AsyncBuildService.get_player_builds(db, player_id, cursor=cursor, limit=limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return builds
@@ -1,22 +1,22 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
-from database import get_db
+from database import get_async_db
 from auth import get_current_user
 from schemas import ConsentCreate, ConsentResponse
-from services import PlayerService, ConsentService
+from async_services import AsyncPlayerService, AsyncConsentService
 from dependencies import limiter
 
 router = APIRouter(tags=["Evaluation"])
 
 @router.post("/store_consent", response_model=ConsentResponse)
 @limiter.limit(config.RATE_LIMITS["general"])
-def store_consent(
+async def store_consent(
     request: Request, # Fix for slowapi crash
     consent_data: ConsentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user)
 ) -> ConsentResponse:
     """Store user consent data to database."""
@@ -25,12 +25,12 @@ def store_consent(
             raise HTTPException(status_code=403, detail="Not authorized for this player")
 
         # Verify player exists
-        player = PlayerService.get_player_by_id(db, consent_data.player_id)
+        player = await AsyncPlayerService.get_player_by_id(db, consent_data.player_id)
         if not player:
             raise HTTPException(status_code=404, detail="Player not found")
         
         # Use service to create consent record
-        consent = ConsentService.create_consent(db, consent_data)
+        consent = await AsyncConsentService.create_consent(db, consent_data)
         
         print(f"📋 Consent stored to database for {consent.name} (Player {consent.player_id})")
         return consent
@@ -38,6 +38,6 @@ def store_consent(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Error storing consent: {e}")
         raise HTTPException(status_code=500, detail=f"Error storing consent: {str(e)}")
@@ -1,18 +1,33 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+import json
+from typing import Iterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
-from database import get_db
+from database import SessionLocal, get_async_db
 from auth import get_current_user
 from models import NPCMemory
 from schemas import NPCMemoryCreate, NPCMemoryResponse, NPCMemoryUpdate
-from services import ChatService, PlayerService, BuildService
+from services import ChatService
+from async_services import AsyncChatService, AsyncPlayerService, AsyncBuildService
 from sentiment import analyze_sentiment
 from dependencies import limiter, require_service_key
+from pagination import InvalidCursorError, NEXT_CURSOR_HEADER
+from inference_scheduler import InferenceBusyError
+import llamacpp
 
 router = APIRouter(tags=["NPC Interactions"])
 
+def _busy_exception() -> HTTPException:
+    """503 returned when the local inference queue cannot take the request."""
+    return HTTPException(
+        status_code=503,
+        detail="Dax is helping other drivers right now. Please retry shortly.",
+        headers={"Retry-After": "5"}
+    )
+
 @router.post(
     "/store_interaction/",
     response_model=NPCMemoryResponse,
@@ -20,70 +35,144 @@ router = APIRouter(tags=["NPC Interactions"])
     status_code=201
 )
 @limiter.limit(config.RATE_LIMITS["general"])
-def store_interaction(
+async def store_interaction(
     request: Request, # Fix for slowapi crash
     data: NPCMemoryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user),
     _: None = Depends(require_service_key)
 ) -> NPCMemoryResponse:
     # Check for duplicate entry
-    existing_entry = db.query(NPCMemory).filter(
-        NPCMemory.player_id == data.player_id,
-        NPCMemory.npc_id == data.npc_id,
-        NPCMemory.dialogue == data.dialogue
-    ).first()
-
-    if existing_entry:
+    if await AsyncChatService.interaction_exists(db, data.player_id, data.npc_id, data.dialogue):
         raise HTTPException(status_code=400, detail="This interaction already exists.")
 
     if str(user.get("sub")) != str(data.player_id):
         raise HTTPException(status_code=403, detail="Not authorized for this player")
 
     # Get player and context
-    player = PlayerService.get_player_by_id(db, data.player_id)
+    player = await AsyncPlayerService.get_player_by_id(db, data.player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
     
     player_name = player.display_name or player.name or "Player"
-    build = BuildService.get_latest_build(db, data.player_id)
+    build = await AsyncBuildService.get_latest_build(db, data.player_id)
     context: List[NPCMemory] = []
     
     # Use service layer to create interaction
     try:
-        npc_interaction = ChatService.create_interaction(
+        npc_interaction = await AsyncChatService.create_interaction(
             db, data.player_id, data.npc_id, data.dialogue,
             context, player_name, build
         )
         return npc_interaction
+    except InferenceBusyError:
+        raise _busy_exception()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"DB commit error (store_interaction): {e}")
         raise HTTPException(status_code=500, detail="Database connection issue, consider a retry.")
 
+def _sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post(
+    "/stream_interaction/",
+    description="Player sends dialogue; the NPC reply is streamed as Server-Sent Events and stored when complete.",
+    response_class=StreamingResponse
+)
+@limiter.limit(config.RATE_LIMITS["chat_api"])
+async def stream_interaction(
+    request: Request, # Fix for slowapi crash
+    data: NPCMemoryCreate,
+    db: AsyncSession = Depends(get_async_db),
+    user: dict = Depends(get_current_user),
+    _: None = Depends(require_service_key)
+) -> StreamingResponse:
+    if str(user.get("sub")) != str(data.player_id):
+        raise HTTPException(status_code=403, detail="Not authorized for this player")
+
+    if await AsyncChatService.interaction_exists(db, data.player_id, data.npc_id, data.dialogue):
+        raise HTTPException(status_code=400, detail="This interaction already exists.")
+
+    # Reject before the 200 stream starts if the local model queue is already full
+    # and no provider after it in the chain could take the turn instead
+    if llamacpp.local_backend_saturated():
+        raise _busy_exception()
+
+    player = await AsyncPlayerService.get_player_by_id(db, data.player_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="Player not found")
+
+    player_name = player.display_name or player.name or "Player"
+    build = await AsyncBuildService.get_latest_build(db, data.player_id)
+    context = await AsyncChatService.get_conversation_history(db, data.player_id)
+
+    def event_stream() -> Iterator[str]:
+        # The request-scoped session is closed before the body is streamed, so
+        # the interaction is persisted through a sync session owned by the
+        # stream. Starlette iterates this generator in its threadpool.
+        stream_db = SessionLocal()
+        try:
+            for event in ChatService.stream_interaction(
+                stream_db, data.player_id, data.npc_id, data.dialogue,
+                context, player_name, build
+            ):
+                if event["type"] == "token":
+                    yield _sse_event("token", {"text": event["text"]})
+                else:
+                    payload = NPCMemoryResponse.model_validate(event["interaction"]).model_dump(mode="json")
+                    payload["response_time_sec"] = event["reply"].get("response_time_sec")
+                    payload["first_token_sec"] = event["reply"].get("first_token_sec")
+                    payload["sentiment_score"] = event["reply"].get("sentiment_score")
+                    payload["mentions_part"] = event["reply"].get("mentions_part")
+                    yield _sse_event("done", payload)
+        except InferenceBusyError:
+            yield _sse_event("error", {"detail": "Dax is helping other drivers right now. Please retry shortly."})
+        except Exception as e:
+            stream_db.rollback()
+            print(f"DB commit error (stream_interaction): {e}")
+            yield _sse_event("error", {"detail": "Database connection issue, consider a retry."})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get(
     "/get_interactions/{player_id}/{npc_id}",
     response_model=List[NPCMemoryResponse]
 )
 @limiter.limit(config.RATE_LIMITS["general"])
-def get_interactions(
+async def get_interactions(
     request: Request, # Fix for slowapi crash
+    response: Response,
     player_id: int,
     npc_id: int,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    limit: int = Query(config.DEFAULT_PAGE_SIZE, ge=1, le=config.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user),
     _: None = Depends(require_service_key)
 ) -> List[NPCMemoryResponse]:
     if str(user.get("sub")) != str(player_id):
         raise HTTPException(status_code=403, detail="Not authorized for this player")
-    interactions = db.query(NPCMemory).filter(
-        NPCMemory.player_id == player_id,
-        NPCMemory.npc_id == npc_id
-    ).order_by(NPCMemory.timestamp.desc()).all()
+    try:
+        interactions, next_cursor = await AsyncChatService.get_interactions(
+            db, player_id, npc_id, cursor=cursor, limit=limit
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if not interactions:
+    # Only the first page can mean "nothing stored"; a later one can come back empty
+    if not interactions and not cursor:
         raise HTTPException(status_code=404, detail="No interactions found for this player and NPC.")
 
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return interactions
 
 @router.put(
@@ -92,15 +181,15 @@ def get_interactions(
     description="Update player dialogue only. Sentiment and NPC reply are updated automatically."
 )
 @limiter.limit(config.RATE_LIMITS["general"])
-def update_interaction(
+async def update_interaction(
     request: Request, # Fix for slowapi crash
     id: int,
     data: NPCMemoryUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user),
     _: None = Depends(require_service_key)
 ) -> NPCMemoryResponse:
-    npc_interaction = db.query(NPCMemory).filter(NPCMemory.id == id).first()
+    npc_interaction = await AsyncChatService.get_interaction(db, id)
 
     if not npc_interaction:
         raise HTTPException(status_code=404, detail="Interaction not found.")
@@ -109,36 +198,42 @@ def update_interaction(
         raise HTTPException(status_code=400, detail=f"Dialogue must be <= {config.MAX_DIALOGUE_LENGTH} characters")
 
     # Get player info
-    player = PlayerService.get_player_by_id(db, npc_interaction.player_id)
+    player = await AsyncPlayerService.get_player_by_id(db, npc_interaction.player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
     if str(user.get("sub")) != str(player.id):
         raise HTTPException(status_code=403, detail="Not authorized for this player")
     
     player_name = player.display_name or player.name or "Player"
-    build = BuildService.get_latest_build(db, npc_interaction.player_id)
+    build = await AsyncBuildService.get_latest_build(db, npc_interaction.player_id)
     
     # Update dialogue
     npc_interaction.dialogue = data.dialogue
 
     # Analyze player sentiment
-    player_sentiment = analyze_sentiment(data.dialogue)
+    player_sentiment = await run_in_threadpool(analyze_sentiment, data.dialogue)
     npc_interaction.sentiment = player_sentiment
 
     # Generate new NPC response
     from llamacpp import generate_npc_response
-    npc_reply_obj = generate_npc_response(
-        data.dialogue, player_sentiment,
-        npc_interaction.player_id, [], player_name, build=build
-    )
+    try:
+        npc_reply_obj = await run_in_threadpool(
+            generate_npc_response,
+            data.dialogue, player_sentiment,
+            npc_interaction.player_id, [], player_name, build=build
+        )
+    except InferenceBusyError:
+        await db.rollback()
+        raise _busy_exception()
     npc_reply_text = npc_reply_obj["response"] if isinstance(npc_reply_obj, dict) else str(npc_reply_obj)
     npc_interaction.npc_reply = npc_reply_text
 
-    # Analyze NPC sentiment
-    npc_interaction.npc_sentiment = analyze_sentiment(npc_reply_text)
+    # Reuse the label the reply was scored with during generation, or queue it
+    npc_interaction.npc_sentiment = npc_reply_obj.get("npc_sentiment") if isinstance(npc_reply_obj, dict) else None
 
-    db.commit()
-    db.refresh(npc_interaction)
+    await db.commit()
+    await db.refresh(npc_interaction)
+    await AsyncChatService.schedule_npc_sentiment(db, npc_interaction)
     return npc_interaction
 
 @router.delete(
@@ -147,14 +242,14 @@ def update_interaction(
     status_code=200
 )
 @limiter.limit(config.RATE_LIMITS["general"])
-def delete_interaction(
+async def delete_interaction(
     request: Request, # Fix for slowapi crash
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: dict = Depends(get_current_user),
     _: None = Depends(require_service_key)
 ) -> NPCMemoryResponse:
-    npc_interaction = db.query(NPCMemory).filter(NPCMemory.id == id).first()
+    npc_interaction = await AsyncChatService.get_interaction(db, id)
 
     if not npc_interaction:
         raise HTTPException(status_code=404, detail="Interaction not found.")
@@ -165,6 +260,5 @@ def delete_interaction(
     # Capture the interaction before deletion for return 
     deleted_data = NPCMemoryResponse.model_validate(npc_interaction)
 
-    db.delete(npc_interaction)
-    db.commit()
+    await AsyncChatService.delete_interaction(db, npc_interaction)
     return deleted_data
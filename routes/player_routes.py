@@ -1,17 +1,19 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query, Response
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
 from uuid import uuid4
 import bcrypt
 
 from config import config
-from database import get_db
+from database import get_async_db
 from auth import create_access_token, create_refresh_token
 from models import Player
 from schemas import PlayerCreate, PlayerResponse
-from services import PlayerService
+from async_services import AsyncPlayerService
 from dependencies import limiter, require_service_key, is_email_allowed
+from pagination import InvalidCursorError, NEXT_CURSOR_HEADER
 
 router = APIRouter(tags=["Players"])
 from fastapi.templating import Jinja2Templates
@@ -19,29 +21,36 @@ templates = Jinja2Templates(directory="templates")
 
 @router.post("/create_player", response_model=PlayerResponse)
 @limiter.limit(config.RATE_LIMITS["general"])
-def create_player(
+async def create_player(
     request: Request, # Fix for slowapi crash
     player: PlayerCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: None = Depends(require_service_key)
 ) -> PlayerResponse:
-    existing = db.query(Player).filter(Player.name == player.name).first()
+    existing = await AsyncPlayerService.get_player_by_uuid(db, player.name)
     if existing: 
         raise HTTPException(status_code=400, detail="Player with this name already exists")
     
-    new_player = PlayerService.create_player(db, player)
+    new_player = await AsyncPlayerService.create_player(db, player)
     return new_player
 
 @router.get("/players", response_model=List[PlayerResponse])
 @limiter.limit(config.RATE_LIMITS["general"])
-def get_players(
+async def get_players(
     request: Request, # Fix for slowapi crash
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
     limit: int = Query(config.DEFAULT_PAGE_SIZE, ge=1, le=config.MAX_PAGE_SIZE),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: None = Depends(require_service_key)
 ) -> List[PlayerResponse]:
-    return PlayerService.get_all_players(db, skip=skip, limit=limit)
+    try:
+        players, next_cursor = await AsyncPlayerService.get_all_players(db, cursor=cursor, limit=limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return players
 
 @router.get("/create_player_form", response_class=HTMLResponse)
 def player_form(request: Request):
@@ -49,32 +58,29 @@ def player_form(request: Request):
 
 @router.post("/create_player_form")
 @limiter.limit("3/minute")
-def create_player_from_form(
+async def create_player_from_form(
     request: Request,
     name: str = Form(...),
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> HTMLResponse:
     if not is_email_allowed(email):
         raise HTTPException(status_code=403, detail="Email not allowed")
     # Check if email already exists
-    existing_player = db.query(Player).filter(Player.email == email).first()
+    existing_player = await AsyncPlayerService.get_player_by_email(db, email)
     if existing_player:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Hash password
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    # Hash password (bcrypt is slow on purpose, so off the event loop)
+    hashed_password = (await run_in_threadpool(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())).decode('utf-8')
     
-    new_player = Player(
+    new_player = await AsyncPlayerService.add_player(db, Player(
         name=str(uuid4()),
         email=email,
         display_name=name,
         pin_hash=hashed_password
-    )
-    db.add(new_player)
-    db.commit()
-    db.refresh(new_player)
+    ))
 
     return templates.TemplateResponse("player_created.html", {
         "request": request,
@@ -85,11 +91,11 @@ def create_player_from_form(
 
 @router.post("/verify_player")
 @limiter.limit("5/minute")
-def verify_player(
+async def verify_player(
     request: Request,
     response: Response,
     credentials: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> dict:
     email = credentials.get("email")
     password = credentials.get("password")
@@ -99,7 +105,7 @@ def verify_player(
     if not is_email_allowed(email):
         raise HTTPException(status_code=403, detail="Email not allowed")
 
-    player = PlayerService.verify_player_email_password(db, email, password)
+    player = await AsyncPlayerService.verify_player_email_password(db, email, password)
 
     if not player:
         raise HTTPException(status_code=401, detail="Invalid email or password")
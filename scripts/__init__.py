@@ -0,0 +1 @@
+"""Maintenance and benchmark scripts, run as ``python -m scripts.<name>``."""
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: reply cleaning + hallucination scan, legacy vs compiled.
+
+Usage:
+    python -m scripts.bench_postprocess [iterations]
+
+The legacy function below is the previous implementation from
+llamacpp._finalize_npc_reply, kept here only for comparison, and "regex"
+is the combined-alternation scanner that was evaluated and rejected. The
+script checks that every variant agrees on every sample before timing.
+"""
+
+import re
+import sys
+import timeit
+from typing import Tuple
+
+from reply_postprocess import INVALID_CAR_BRANDS, INVALID_PARTS, VALID_F1_PARTS, clean_reply, postprocess_reply
+
+SAMPLES = [
+    'Dax: Dax: "Great choice on the 2004 V10, Sam! Next, pick your tires: C5 Slick or Full Wet."',
+    "Solid pick. The Ground Effect chassis pairs well with a High Downforce rear wing.",
+    "Dax: Try a Ferrari turbo with adjustable ride height. Player Message: what next?",
+    '"Your build is complete! Click Submit Feedback when you are ready."',
+    "Let's sort the gearbox and brake balance before we look at the Low Drag wing. Respond as Dax",
+    "Hmm, I can't afford to guess here - which front wing did you choose, High Lift or Simple Outwash?",
+    "",
+    "Dax:",
+]
+
+
+def legacy_postprocess(reply_text: str) -> Tuple[str, bool, bool, bool]:
+    while reply_text.startswith("Dax:"):
+        reply_text = reply_text[4:].strip()
+    if "Player Message:" in reply_text:
+        reply_text = reply_text.split("Player Message:")[0].strip()
+    if "Respond as Dax" in reply_text:
+        reply_text = reply_text.split("Respond as Dax")[0].strip()
+    if reply_text.startswith('"') and reply_text.endswith('"'):
+        reply_text = reply_text[1:-1]
+    elif reply_text.startswith('"'):
+        reply_text = reply_text[1:]
+    reply_text = reply_text.replace("Dax:", "").strip()
+
+    accurate = any(part in reply_text.lower() for part in VALID_F1_PARTS)
+    has_invalid_cars = any(car in reply_text.lower() for car in INVALID_CAR_BRANDS)
+    has_invalid_parts = any(invalid in reply_text.lower() for invalid in INVALID_PARTS)
+    return reply_text, accurate, has_invalid_cars, has_invalid_parts
+
+
+def compiled_postprocess(reply_text: str) -> Tuple[str, bool, bool, bool]:
+    text, scan = postprocess_reply(reply_text)
+    return text, scan.mentions_part, bool(scan.invalid_cars), bool(scan.invalid_parts)
+
+
+_ALTERNATION = re.compile("|".join(
+    re.escape(term) for term in sorted(VALID_F1_PARTS + INVALID_CAR_BRANDS + INVALID_PARTS, key=len, reverse=True)
+))
+
+
+def regex_postprocess(reply_text: str) -> Tuple[str, bool, bool, bool]:
+    text = clean_reply(reply_text)
+    found = set(_ALTERNATION.findall(text.lower()))
+    return (
+        text,
+        bool(found.intersection(VALID_F1_PARTS)),
+        bool(found.intersection(INVALID_CAR_BRANDS)),
+        bool(found.intersection(INVALID_PARTS)),
+    )
+
+
+VARIANTS = (("legacy", legacy_postprocess), ("regex", regex_postprocess), ("compiled", compiled_postprocess))
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 40000
+
+    for sample in SAMPLES:
+        expected = legacy_postprocess(sample)
+        for name, fn in VARIANTS[1:]:
+            if fn(sample) != expected:
+                raise SystemExit(f"❌ {name} disagrees on {sample!r}:\n  legacy: {expected}\n  {name}: {fn(sample)}")
+    print(f"✅ Identical results on {len(SAMPLES)} samples")
+
+    for name, fn in VARIANTS:
+        seconds = min(timeit.repeat(lambda: [fn(s) for s in SAMPLES], number=iterations // len(SAMPLES), repeat=5))
+        per_reply_us = seconds / (iterations // len(SAMPLES) * len(SAMPLES)) * 1e6
+        print(f"{name:>9}: {per_reply_us:6.2f} µs/reply")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: local GGUF decoding with and without prompt-lookup drafting.
+
+Usage:
+    python -m scripts.bench_prompt_lookup [rounds] [draft_tokens ...]
+
+Runs the same fixed set of Dax prompts (one per build stage) through the
+plain sampler and through LlamaPromptLookupDecoding with each requested
+``num_pred_tokens`` (default 2 and 10), and reports generated tokens per
+second. Sampling is greedy so every variant should produce the same text;
+the script flags prompts where they differ. Needs llama-cpp-python and the
+model at MODEL_PATH.
+"""
+
+import gc
+import sys
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+from llamacpp import LOCAL_COMPLETION_PARAMS, _build_npc_prompt
+
+BUILDS = [
+    None,
+    SimpleNamespace(chassis="Standard_Monocoque_Chassis", engine=None, tires=None, front_wing=None, rear_wing=None),
+    SimpleNamespace(chassis="GroundEffectOptimized_Monocoque_Chassis", engine="2004_v10_Engine", tires="C5_Slick_Tire", front_wing=None, rear_wing=None),
+    SimpleNamespace(chassis="Standard_Monocoque_Chassis", engine="2004_v10_Engine", tires="Full_Wet_Tire", front_wing="High_Lift_FrontWing", rear_wing="Low_Drag_RearWing"),
+]
+
+DIALOGUES = [
+    "Hi Dax, where do I start?",
+    "Which engine suits a wet race better?",
+    "Can you remind me what I've picked so far and what's left?",
+    "Is this setup any good for Monaco?",
+]
+
+
+def build_prompts() -> List[str]:
+    return [
+        _build_npc_prompt(dialogue, "neutral", "This is the start of the conversation.", "Sam", build)
+        for build, dialogue in zip(BUILDS, DIALOGUES)
+    ]
+
+
+def run_variant(draft_tokens: Optional[int], prompts: List[str], rounds: int) -> Tuple[float, List[str]]:
+    """Return (tokens per second, outputs) for one decoding setup."""
+    from llama_cpp import Llama
+
+    draft_model = None
+    if draft_tokens:
+        from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+        draft_model = LlamaPromptLookupDecoding(num_pred_tokens=draft_tokens)
+
+    model = Llama(
+        model_path=config.MODEL_PATH,
+        n_threads=config.MODEL_N_THREADS,
+        n_ctx=config.MODEL_N_CTX,
+        n_batch=config.MODEL_N_BATCH,
+        draft_model=draft_model,
+        verbose=False
+    )
+    params = {**LOCAL_COMPLETION_PARAMS, "temperature": 0.0}
+
+    # Warm-up pass so first-call allocation does not skew the timing
+    model(prompts[0], max_tokens=8, echo=False)
+
+    outputs: List[str] = []
+    tokens = 0
+    elapsed = 0.0
+    for _ in range(rounds):
+        outputs = []
+        for prompt in prompts:
+            model.reset()
+            start = time.perf_counter()
+            result = model(prompt, echo=False, **params)
+            elapsed += time.perf_counter() - start
+            tokens += result["usage"]["completion_tokens"]
+            outputs.append(result["choices"][0]["text"].strip())
+
+    del model
+    gc.collect()
+    return tokens / elapsed if elapsed else 0.0, outputs
+
+
+def main() -> None:
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    draft_sizes = [int(arg) for arg in sys.argv[2:]] or [2, 10]
+    prompts = build_prompts()
+
+    print(f"Model: {config.MODEL_PATH} ({config.MODEL_N_THREADS} threads), {len(prompts)} prompts x {rounds} rounds")
+    results: Dict[str, float] = {}
+    baseline_tps, baseline_outputs = run_variant(None, prompts, rounds)
+    results["plain"] = baseline_tps
+
+    for size in draft_sizes:
+        label = f"prompt_lookup({size})"
+        tps, outputs = run_variant(size, prompts, rounds)
+        results[label] = tps
+        for index, (expected, actual) in enumerate(zip(baseline_outputs, outputs)):
+            if expected != actual:
+                print(f"⚠️ {label} output differs on prompt {index}:\n   plain: {expected!r}\n   draft: {actual!r}")
+
+    print(f"\n{'variant':<20} {'tokens/s':>10} {'speedup':>8}")
+    for label, tps in results.items():
+        speedup = tps / baseline_tps if baseline_tps else 0.0
+        print(f"{label:<20} {tps:>10.1f} {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
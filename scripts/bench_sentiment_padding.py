@@ -0,0 +1,114 @@
+"""
+Benchmark: sentiment batches padded to their longest member vs length buckets.
+
+Usage:
+    python -m scripts.bench_sentiment_padding [batch_size] [rounds]
+
+Builds a fixed, seeded sample of chat-length texts. Most are a few words,
+some are a sentence or two, and a few approach MAX_DIALOGUE_LENGTH. The
+sample is classified in batches of ``batch_size`` (default 64), first with
+the previous predict_classes (one padded batch, max_length 512) and then with
+the length-bucketed sentiment.predict_classes. Reported: real tokens per
+second, the share of computed positions that were padding, and how often the
+two agree. Uses SENTIMENT_MODEL on SENTIMENT_BACKEND.
+"""
+
+import random
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from config import config
+import sentiment
+
+WORDS = (
+    "dax engine chassis tires wing v10 v8 slick wet monocoque ground effect downforce drag "
+    "what next pick choose should i my the is it a for better race rain fast slow love hate "
+    "great awful thanks help build done ready submit why how does work with this that"
+).split()
+
+
+def chat_sample(count: int, seed: int = 7) -> List[str]:
+    """Texts with a chat-like length mix: 70% short, 25% medium, 5% near the length cap."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.70:
+            words = rng.randint(2, 10)
+        elif roll < 0.95:
+            words = rng.randint(11, 35)
+        else:
+            words = rng.randint(60, 90)
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(words))[:config.MAX_DIALOGUE_LENGTH])
+    return texts
+
+
+def legacy_predict_classes(tokenizer, model, texts: List[str]) -> List[int]:
+    """Previous implementation: the whole batch padded to its longest member."""
+    if hasattr(model, "predict"):
+        inputs = tokenizer(texts, return_tensors="np", truncation=True, max_length=512, padding=True)
+        return model.predict(inputs)
+
+    import torch
+
+    inputs = tokenizer(texts, return_tensors="pt", truncation=True, max_length=512, padding=True)
+    with torch.no_grad():
+        logits = model(**inputs).logits
+    return torch.argmax(logits, dim=1).tolist()
+
+
+def padded_positions(tokenizer, texts: List[str], batch_size: int, bucketed: bool) -> Tuple[int, int]:
+    """(real tokens, computed positions) for running ``texts`` in batches."""
+    max_length = min(config.SENTIMENT_MAX_TOKENS, tokenizer.model_max_length) if bucketed else 512
+    real = computed = 0
+    for offset in range(0, len(texts), batch_size):
+        lengths = [len(ids) for ids in tokenizer(texts[offset:offset + batch_size], truncation=True, max_length=max_length)["input_ids"]]
+        real += sum(lengths)
+        if bucketed:
+            lengths.sort()
+            size = config.SENTIMENT_BUCKET_SIZE
+            computed += sum(max(lengths[i:i + size]) * len(lengths[i:i + size]) for i in range(0, len(lengths), size))
+        else:
+            computed += max(lengths) * len(lengths)
+    return real, computed
+
+
+def run(predict: Callable[[List[str]], List[int]], texts: List[str], batch_size: int, rounds: int) -> Tuple[float, List[int]]:
+    """Return (seconds per round, labels) for ``predict`` over ``texts``."""
+    labels: List[int] = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        labels = []
+        for offset in range(0, len(texts), batch_size):
+            labels.extend(predict(texts[offset:offset + batch_size]))
+    return (time.perf_counter() - start) / rounds, labels
+
+
+def main() -> None:
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    tokenizer, model = sentiment.load_sentiment_backend(config.SENTIMENT_BACKEND)
+    texts = [text.lower() for text in chat_sample(1024)]
+
+    variants = {
+        "padded (512)": lambda batch: legacy_predict_classes(tokenizer, model, batch),
+        f"bucketed ({config.SENTIMENT_BUCKET_SIZE}, {config.SENTIMENT_MAX_TOKENS})": lambda batch: sentiment.predict_classes(tokenizer, model, batch),
+    }
+    # Warm-up so lazy initialization does not count
+    for predict in variants.values():
+        predict(texts[:batch_size])
+
+    print(f"{config.SENTIMENT_MODEL} ({config.SENTIMENT_BACKEND}), {len(texts)} texts, batch {batch_size}, {rounds} rounds")
+    print(f"{'variant':<20} {'tokens/s':>10} {'padding':>8} {'agree':>6}")
+    reference: List[int] = []
+    for (name, predict), bucketed in zip(variants.items(), (False, True)):
+        seconds, labels = run(predict, texts, batch_size, rounds)
+        real, computed = padded_positions(tokenizer, texts, batch_size, bucketed)
+        reference = reference or labels
+        agree = sum(a == b for a, b in zip(labels, reference)) / len(labels)
+        print(f"{name:<20} {real / seconds:>10.0f} {1 - real / computed:>8.1%} {agree:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
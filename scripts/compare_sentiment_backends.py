@@ -0,0 +1,136 @@
+"""
+Compare sentiment backends: PyTorch vs ONNX fp32 vs ONNX int8.
+
+Usage:
+    python -m scripts.compare_sentiment_backends [backend ...]
+
+Each backend (default: torch onnx onnx_int8) runs in its own subprocess so
+resident memory is measured cleanly. Reported per backend: accuracy on the
+labelled sample below, agreement with the torch labels, single-text p50/p95
+latency, batched throughput and RSS added by loading the model. ONNX
+backends are exported into SENTIMENT_ONNX_DIR on first use.
+"""
+
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+# (text, expected label) in the register players and Dax actually use
+LABELLED_SAMPLE: List[Tuple[str, str]] = [
+    ("I love this car, it's perfect!", "positive"),
+    ("Great choice on the V10 engine, Sam!", "positive"),
+    ("This is awesome, thanks Dax", "positive"),
+    ("Wow, the ground effect chassis is amazing", "positive"),
+    ("Your build looks fantastic, you're race-ready!", "positive"),
+    ("Nice, the slick tires will be quick today", "positive"),
+    ("I'm really happy with this setup", "positive"),
+    ("Brilliant, let's win this race", "positive"),
+    ("what should I pick next?", "neutral"),
+    ("Which front wing did I select?", "neutral"),
+    ("Next, select your tires: C5 Slick or Full Wet.", "neutral"),
+    ("Is my build done?", "neutral"),
+    ("I picked the 2006 V8 engine", "neutral"),
+    ("Tell me about the low drag rear wing", "neutral"),
+    ("What parts do I have?", "neutral"),
+    ("Click Submit Feedback to finish.", "neutral"),
+    ("This is terrible, nothing works", "negative"),
+    ("I hate this engine, it's so slow", "negative"),
+    ("You keep giving me wrong answers, this is annoying", "negative"),
+    ("Ugh, the wet tires were a horrible choice", "negative"),
+    ("I'm frustrated, the build keeps failing", "negative"),
+    ("This game is boring and useless", "negative"),
+    ("That was an awful suggestion", "negative"),
+    ("I'm so disappointed with this car", "negative"),
+]
+
+ITERATIONS = 5
+BATCH_SIZE = 16
+
+
+def _rss_mb() -> float:
+    """Current resident set size in MiB (Linux)."""
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * resource.getpagesize() / (1 << 20)
+
+
+def measure(backend: str) -> Dict[str, Any]:
+    """Load one backend in this process and time it on the labelled sample."""
+    import sentiment
+
+    texts = [text.strip().lower() for text, _ in LABELLED_SAMPLE]
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    tokenizer, model = sentiment.load_sentiment_backend(backend)
+    load_sec = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    # Warm-up so lazy initialization does not count as latency
+    sentiment.predict_classes(tokenizer, model, texts[:2])
+
+    single: List[float] = []
+    labels: List[str] = []
+    for _ in range(ITERATIONS):
+        labels = []
+        for text in texts:
+            start = time.perf_counter()
+            labels.append(sentiment.LABELS[sentiment.predict_classes(tokenizer, model, [text])[0]])
+            single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for offset in range(0, len(texts), BATCH_SIZE):
+            sentiment.predict_classes(tokenizer, model, texts[offset:offset + BATCH_SIZE])
+    batch_sec = time.perf_counter() - start
+
+    single.sort()
+    correct = sum(label == expected for label, (_, expected) in zip(labels, LABELLED_SAMPLE))
+    return {
+        "backend": backend,
+        "labels": labels,
+        "accuracy": correct / len(labels),
+        "p50_ms": statistics.median(single) * 1000,
+        "p95_ms": single[int(len(single) * 0.95)] * 1000,
+        "batch_texts_per_sec": len(texts) * ITERATIONS / batch_sec,
+        "load_sec": load_sec,
+        "model_rss_mb": rss_loaded - rss_before,
+    }
+
+
+def main() -> None:
+    if len(sys.argv) == 3 and sys.argv[1] == "--measure":
+        print(json.dumps(measure(sys.argv[2])))
+        return
+
+    backends = sys.argv[1:] or ["torch", "onnx", "onnx_int8"]
+    results = []
+    for backend in backends:
+        proc = subprocess.run(
+            [sys.executable, "-m", "scripts.compare_sentiment_backends", "--measure", backend],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ {backend} failed:\n{proc.stderr[-2000:]}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        return
+    reference = next((r for r in results if r["backend"] == "torch"), results[0])
+
+    print(f"\n{len(LABELLED_SAMPLE)} labelled texts, {ITERATIONS} iterations, batch size {BATCH_SIZE}")
+    print(f"{'backend':<11} {'accuracy':>8} {'agree':>6} {'p50 ms':>8} {'p95 ms':>8} {'batch/s':>9} {'model MB':>9} {'load s':>7}")
+    for r in results:
+        agree = sum(a == b for a, b in zip(r["labels"], reference["labels"])) / len(r["labels"])
+        print(
+            f"{r['backend']:<11} {r['accuracy']:>8.1%} {agree:>6.1%} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+            f"{r['batch_texts_per_sec']:>9.1f} {r['model_rss_mb']:>9.1f} {r['load_sec']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
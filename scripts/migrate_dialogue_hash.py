@@ -0,0 +1,114 @@
+"""
+Add and backfill npc_memory.dialogue_hash.
+
+Usage:
+    python -m scripts.migrate_dialogue_hash [--chunk-size N]
+
+Run once against a database created before dialogue_hash existed, before
+starting the new app version. Fresh databases get the column and index from
+create_all and need nothing. The script adds the column if it is missing.
+It then fills in the fingerprint for rows that have none, reading them in id
+order one chunk at a time, and writes each chunk with one executemany UPDATE
+in its own transaction. Finally it creates ix_player_npc_dialogue_hash. The
+index is built last so the backfill does not maintain it row by row.
+
+Only rows with a NULL hash are touched, so an interrupted run can simply be
+started again.
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+from sqlalchemy import bindparam, inspect, select, text, update
+
+from database import SessionLocal, engine
+from models import NPCMemory, dialogue_fingerprint
+
+INDEX_NAME = "ix_player_npc_dialogue_hash"
+
+
+def add_column() -> None:
+    """Add dialogue_hash to npc_memory unless it is already there."""
+    columns = {column["name"] for column in inspect(engine).get_columns(NPCMemory.__tablename__)}
+    if "dialogue_hash" in columns:
+        print("✅ npc_memory.dialogue_hash already exists")
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {NPCMemory.__tablename__} ADD COLUMN dialogue_hash VARCHAR(64)"))
+    print("✅ Added npc_memory.dialogue_hash")
+
+
+def read_chunk(after_id: int, chunk_size: int) -> List[Tuple[int, str]]:
+    """Next ``chunk_size`` (id, dialogue) rows after ``after_id`` that still lack a hash."""
+    statement = (
+        select(NPCMemory.id, NPCMemory.dialogue)
+        .where(NPCMemory.id > after_id, NPCMemory.dialogue_hash.is_(None))
+        .order_by(NPCMemory.id)
+        .limit(chunk_size)
+    )
+    db = SessionLocal()
+    try:
+        return [tuple(row) for row in db.execute(statement)]
+    finally:
+        db.close()
+
+
+def write_hashes(rows: List[Tuple[int, str]]) -> None:
+    """Store the fingerprints for one chunk in a single transaction.
+
+    A row whose dialogue was edited since it was read is skipped. The app
+    already set its hash when it saved the edit.
+    """
+    table = NPCMemory.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"), table.c.dialogue == bindparam("b_dialogue"))
+        .values(dialogue_hash=bindparam("b_hash"))
+    )
+    db = SessionLocal()
+    try:
+        db.execute(statement, [
+            {"b_id": row_id, "b_dialogue": dialogue, "b_hash": dialogue_fingerprint(dialogue)}
+            for row_id, dialogue in rows
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def create_index() -> None:
+    index = next(index for index in NPCMemory.__table__.indexes if index.name == INDEX_NAME)
+    index.create(bind=engine, checkfirst=True)
+    print(f"✅ Index {INDEX_NAME} in place")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Add and backfill the npc_memory.dialogue_hash column.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows hashed and committed together")
+    args = parser.parse_args()
+
+    add_column()
+
+    start = time.perf_counter()
+    last_id = 0
+    filled = 0
+    while True:
+        rows = read_chunk(last_id, args.chunk_size)
+        if not rows:
+            break
+        write_hashes(rows)
+        last_id = rows[-1][0]
+        filled += len(rows)
+        elapsed = time.perf_counter() - start
+        print(f"   through id {last_id}: {filled} rows hashed, {filled / elapsed:.1f} rows/s")
+
+    print(f"✅ Backfilled {filled} rows in {time.perf_counter() - start:.1f}s")
+    create_index()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Re-score the sentiment columns of stored interactions with the current model.
+
+Usage:
+    python -m scripts.rescore_sentiment [--chunk-size N] [--batch-size N]
+                                        [--checkpoint PATH] [--restart]
+                                        [--allow-fallback] [--only-missing]
+
+Run after changing SENTIMENT_MODEL (or SENTIMENT_BACKEND) so ``sentiment``
+and ``npc_sentiment`` on existing npc_memory rows match what the app now
+produces. Rows are read in id order, one chunk at a time, through a
+streaming ``yield_per`` cursor. Each chunk's distinct texts are sorted by
+length and scored through ``analyze_sentiment_batch`` so every batch pads to
+a similar length. Changed labels are written with one executemany UPDATE per
+chunk, in that chunk's own transaction. The cursor is closed before the
+write, so SQLite's single writer never waits on it.
+
+After every committed chunk the last id is saved to the checkpoint file.
+An interrupted run picks up where it stopped, and a finished one only
+handles rows added since. ``--restart`` or a checkpoint written for a
+different model starts again from the first row.
+
+``--only-missing`` backfills instead: it only labels NPC replies whose
+``npc_sentiment`` is still NULL, for example after a background sentiment
+job failed or was abandoned at shutdown. It leaves every stored label alone.
+Filled rows drop out of the query, so this mode needs no checkpoint.
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+from config import config
+from database import SessionLocal
+from models import NPCMemory
+import sentiment
+
+DEFAULT_CHECKPOINT = "./rescore_sentiment.checkpoint.json"
+
+# (id, dialogue, npc_reply, sentiment, npc_sentiment)
+Row = Tuple[int, str, Optional[str], Optional[str], Optional[str]]
+
+
+def load_checkpoint(path: str, model: str) -> Dict[str, int]:
+    """Progress saved by an earlier run for ``model``, or a fresh start."""
+    if not os.path.exists(path):
+        return {"last_id": 0, "rows": 0, "updated": 0}
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("sentiment_model") != model:
+        print(f"⚠️ Checkpoint {path} was written for {saved.get('sentiment_model')}; starting over")
+        return {"last_id": 0, "rows": 0, "updated": 0}
+    return {key: int(saved.get(key, 0)) for key in ("last_id", "rows", "updated")}
+
+
+def save_checkpoint(path: str, model: str, progress: Dict[str, int]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"sentiment_model": model, **progress}, f)
+    os.replace(tmp_path, path)
+
+
+def read_chunk(after_id: int, chunk_size: int, only_missing: bool = False) -> List[Row]:
+    """Next ``chunk_size`` rows after ``after_id``, streamed from a server-side cursor.
+
+    With ``only_missing`` only rows with a reply but no ``npc_sentiment`` are read.
+    """
+    statement = (
+        select(NPCMemory.id, NPCMemory.dialogue, NPCMemory.npc_reply, NPCMemory.sentiment, NPCMemory.npc_sentiment)
+        .where(NPCMemory.id > after_id)
+        .order_by(NPCMemory.id)
+        .limit(chunk_size)
+        .execution_options(yield_per=min(chunk_size, 1000))
+    )
+    if only_missing:
+        statement = statement.where(NPCMemory.npc_sentiment.is_(None), NPCMemory.npc_reply.is_not(None))
+    db = SessionLocal()
+    try:
+        return [tuple(row) for row in db.execute(statement)]
+    finally:
+        db.close()
+
+
+def score_texts(texts: List[str], batch_size: int) -> Dict[str, str]:
+    """Label each distinct text, batching texts of similar length together."""
+    distinct = sorted(set(texts), key=len)
+    labels: Dict[str, str] = {}
+    for offset in range(0, len(distinct), batch_size):
+        batch = distinct[offset:offset + batch_size]
+        labels.update(zip(batch, sentiment.analyze_sentiment_batch(batch)))
+    return labels
+
+
+def changed_rows(rows: List[Row], labels: Dict[str, str], only_missing: bool = False) -> List[Dict[str, Optional[str]]]:
+    """UPDATE parameters for the rows whose labels differ from what is stored.
+
+    With ``only_missing`` the player's ``sentiment`` is kept as stored.
+    """
+    changes = []
+    for row_id, dialogue, npc_reply, old_sentiment, old_npc_sentiment in rows:
+        new_sentiment = old_sentiment if only_missing else labels[dialogue]
+        new_npc_sentiment = labels[npc_reply] if npc_reply else old_npc_sentiment
+        if (new_sentiment, new_npc_sentiment) != (old_sentiment, old_npc_sentiment):
+            changes.append({
+                "b_id": row_id,
+                "b_dialogue": dialogue,
+                "b_reply": npc_reply,
+                "b_sentiment": new_sentiment,
+                "b_npc_sentiment": new_npc_sentiment,
+            })
+    return changes
+
+
+def write_changes(changes: List[Dict[str, Optional[str]]]) -> None:
+    """Apply one chunk's changes in a single transaction.
+
+    Rows edited since they were read are left alone; the app scores them again
+    when it saves the edit.
+    """
+    table = NPCMemory.__table__
+    statement = (
+        update(table)
+        .where(
+            table.c.id == bindparam("b_id"),
+            table.c.dialogue == bindparam("b_dialogue"),
+            table.c.npc_reply.is_not_distinct_from(bindparam("b_reply"))
+        )
+        .values(sentiment=bindparam("b_sentiment"), npc_sentiment=bindparam("b_npc_sentiment"))
+    )
+    db = SessionLocal()
+    try:
+        db.execute(statement, changes)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-score npc_memory sentiment columns with the current sentiment model.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows read, scored and committed together")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per model forward pass")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first row")
+    parser.add_argument("--allow-fallback", action="store_true", help="Re-score with TextBlob if the model cannot be loaded")
+    parser.add_argument("--only-missing", action="store_true", help="Only label NPC replies whose npc_sentiment is NULL")
+    args = parser.parse_args()
+
+    model = f"{config.SENTIMENT_MODEL} ({config.SENTIMENT_BACKEND})"
+    tokenizer, classifier = sentiment.get_sentiment_model()
+    if classifier is None:
+        if not args.allow_fallback:
+            print("❌ Sentiment model could not be loaded; refusing to overwrite labels with TextBlob (use --allow-fallback)")
+            return
+        model = "textblob"
+
+    progress = {"last_id": 0, "rows": 0, "updated": 0}
+    if not args.restart and not args.only_missing:
+        progress = load_checkpoint(args.checkpoint, model)
+    if progress["last_id"]:
+        print(f"↩️ Resuming after id {progress['last_id']} ({progress['rows']} rows already done)")
+
+    action = "Backfilling missing npc_sentiment" if args.only_missing else "Re-scoring"
+    print(f"🔁 {action} with {model}: chunks of {args.chunk_size}, batches of {args.batch_size}")
+    start = time.perf_counter()
+    rows_this_run = 0
+    while True:
+        rows = read_chunk(progress["last_id"], args.chunk_size, args.only_missing)
+        if not rows:
+            break
+
+        texts = [row[2] for row in rows if row[2]]
+        if not args.only_missing:
+            texts += [row[1] for row in rows]
+        labels = score_texts(texts, args.batch_size)
+        changes = changed_rows(rows, labels, args.only_missing)
+        if changes:
+            write_changes(changes)
+
+        progress["last_id"] = rows[-1][0]
+        progress["rows"] += len(rows)
+        progress["updated"] += len(changes)
+        if not args.only_missing:
+            save_checkpoint(args.checkpoint, model, progress)
+
+        rows_this_run += len(rows)
+        elapsed = time.perf_counter() - start
+        print(
+            f"   through id {progress['last_id']}: {progress['rows']} rows, {progress['updated']} updated, "
+            f"{rows_this_run / elapsed:.1f} rows/s"
+        )
+
+    elapsed = time.perf_counter() - start
+    rate = rows_this_run / elapsed if elapsed else 0.0
+    print(f"✅ Re-scored {rows_this_run} rows in {elapsed:.1f}s ({rate:.1f} rows/s); {progress['updated']} rows changed in total")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
+import importlib.util
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from functools import lru_cache
-from typing import Union, List
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
-try:
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification
-    import torch
-    TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    TRANSFORMERS_AVAILABLE = False
-    print("⚠️ transformers/torch not available. Falling back to TextBlob for sentiment analysis.")
+# transformers/torch/onnxruntime take seconds to import, so only check that
+# they are installed here; they are imported when the model is loaded
+TRANSFORMERS_AVAILABLE = importlib.util.find_spec("transformers") is not None
+TORCH_AVAILABLE = importlib.util.find_spec("torch") is not None
+ONNXRUNTIME_AVAILABLE = importlib.util.find_spec("onnxruntime") is not None
 
 try:
     from textblob import TextBlob
@@ -15,12 +19,99 @@ try:
 except ImportError:
     TEXTBLOB_AVAILABLE = False
 
+from config import config
+
 # Load RoBERTa tokenizer and model for sentiment analysis (cached)
 _tokenizer = None
 _model = None
 _model_load_failed = False
+_model_load_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+if config.SENTIMENT_BACKEND == "torch" and not (TRANSFORMERS_AVAILABLE and TORCH_AVAILABLE):
+    print("⚠️ transformers/torch not available. Falling back to TextBlob for sentiment analysis.")
+elif config.SENTIMENT_BACKEND != "torch" and not (TRANSFORMERS_AVAILABLE and ONNXRUNTIME_AVAILABLE):
+    print("⚠️ transformers/onnxruntime not available. Falling back to TextBlob for sentiment analysis.")
+
+
+def load_sentiment_backend(backend: str):
+    """Load the tokenizer and classifier for ``backend`` ("torch", "onnx" or "onnx_int8").
+
+    ONNX backends export ``SENTIMENT_MODEL`` into SENTIMENT_ONNX_DIR on first
+    use (which needs torch) and load the cached file afterwards.
+    """
+    from transformers import AutoTokenizer
+
+    if backend == "torch":
+        from transformers import AutoModelForSequenceClassification
+        tokenizer = AutoTokenizer.from_pretrained(config.SENTIMENT_MODEL)
+        model = AutoModelForSequenceClassification.from_pretrained(config.SENTIMENT_MODEL)
+        model.eval()
+        return tokenizer, model
+
+    from sentiment_onnx import OnnxSentimentModel, ensure_onnx_model
+    path = ensure_onnx_model(config.SENTIMENT_MODEL, config.SENTIMENT_ONNX_DIR, quantize=backend == "onnx_int8")
+    tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(path))
+    return tokenizer, OnnxSentimentModel(path, threads=config.SENTIMENT_ONNX_THREADS)
+
+
+def _pad_bucket(tokenizer, encoded: Dict[str, List[List[int]]], rows: List[int]) -> Dict[str, Any]:
+    """Right-pad the given rows of an unpadded encoding to their own longest member."""
+    # numpy ships with transformers; imported here so TextBlob-only installs do not need it
+    import numpy as np
+
+    width = max(len(encoded["input_ids"][row]) for row in rows)
+    batch = {}
+    for key, sequences in encoded.items():
+        fill = tokenizer.pad_token_id if key == "input_ids" else 0
+        padded = np.full((len(rows), width), fill, dtype=np.int64)
+        for out_row, row in enumerate(rows):
+            padded[out_row, :len(sequences[row])] = sequences[row]
+        batch[key] = padded
+    return batch
+
+
+def predict_classes(tokenizer, model, texts: List[str], max_length: int = 0, bucket_size: int = 0) -> List[int]:
+    """Class index for each text.
+
+    Texts are tokenized once without padding, sorted by token length and run
+    in buckets of ``bucket_size``, each padded only to its own longest member,
+    so one long message does not make a whole batch attend over padding.
+    Results come back in input order.
+
+    Args:
+        tokenizer: Hugging Face tokenizer for the model
+        model: PyTorch classifier or OnnxSentimentModel
+        texts: Texts to classify
+        max_length: Truncation length in tokens (default SENTIMENT_MAX_TOKENS)
+        bucket_size: Texts per forward pass (default SENTIMENT_BUCKET_SIZE)
+
+    Returns:
+        Index into LABELS for each text
+    """
+    max_length = min(max_length or config.SENTIMENT_MAX_TOKENS, tokenizer.model_max_length)
+    bucket_size = max(1, bucket_size or config.SENTIMENT_BUCKET_SIZE)
+    encoded = tokenizer(texts, truncation=True, max_length=max_length)
+    encoded = {key: encoded[key] for key in ("input_ids", "attention_mask", "token_type_ids") if key in encoded}
+    order = sorted(range(len(texts)), key=lambda row: len(encoded["input_ids"][row]))
+
+    classes = [0] * len(texts)
+    for offset in range(0, len(order), bucket_size):
+        rows = order[offset:offset + bucket_size]
+        batch = _pad_bucket(tokenizer, encoded, rows)
+        # OnnxSentimentModel exposes predict(); PyTorch models are called directly
+        if hasattr(model, "predict"):
+            predicted = model.predict(batch)
+        else:
+            import torch
+            # Disable gradient calculations for inference
+            with torch.no_grad():
+                logits = model(**{key: torch.from_numpy(value) for key, value in batch.items()}).logits
+            predicted = torch.argmax(logits, dim=1).tolist()
+        for row, label in zip(rows, predicted):
+            classes[row] = label
+    return classes
 
-from config import config
 
 def get_sentiment_model():
     """Lazy load sentiment analysis model to reduce startup time."""
@@ -30,41 +121,104 @@ def get_sentiment_model():
         return None, None
     
     if _tokenizer is None or _model is None:
-        try:
-            if not TRANSFORMERS_AVAILABLE:
-                _model_load_failed = True
+        with _model_load_lock:
+            if _model_load_failed:
                 return None, None
-            
-            _tokenizer = AutoTokenizer.from_pretrained(config.SENTIMENT_MODEL)
-            _model = AutoModelForSequenceClassification.from_pretrained(config.SENTIMENT_MODEL)
-            print(f"✅ Loaded sentiment model: {config.SENTIMENT_MODEL}")
-        except Exception as e:
-            print(f"⚠️ Failed to load RoBERTa model: {e}")
-            _model_load_failed = True
-            return None, None
+            if _tokenizer is None or _model is None:
+                try:
+                    runtime_available = TORCH_AVAILABLE if config.SENTIMENT_BACKEND == "torch" else ONNXRUNTIME_AVAILABLE
+                    if not (TRANSFORMERS_AVAILABLE and runtime_available):
+                        _model_load_failed = True
+                        return None, None
+                    
+                    start = time.perf_counter()
+                    tokenizer, model = load_sentiment_backend(config.SENTIMENT_BACKEND)
+                    _tokenizer, _model = tokenizer, model
+                    print(f"✅ Loaded sentiment model: {config.SENTIMENT_MODEL} ({config.SENTIMENT_BACKEND}) in {time.perf_counter() - start:.2f}s")
+                except Exception as e:
+                    print(f"⚠️ Failed to load RoBERTa model: {e}")
+                    _model_load_failed = True
+                    return None, None
     
     return _tokenizer, _model
 
+def sentiment_model_loading() -> bool:
+    """Whether the startup warm-up is still loading the model."""
+    return _warmup_thread is not None and _warmup_thread.is_alive()
+
+def sentiment_model_status() -> str:
+    if _model is not None:
+        return "ready"
+    if _model_load_failed:
+        return "failed"
+    return "loading" if sentiment_model_loading() else "not_loaded"
+
+def _warm_up() -> None:
+    """Import, load and run the model once, logging where the cold start goes."""
+    start = time.perf_counter()
+    runtime = "torch" if config.SENTIMENT_BACKEND == "torch" else "onnxruntime"
+    try:
+        importlib.import_module("transformers")
+        importlib.import_module(runtime)
+    except Exception as e:
+        print(f"⚠️ Sentiment warm-up skipped, {runtime}/transformers failed to import: {e}")
+        return
+    imported = time.perf_counter()
+
+    tokenizer, model = get_sentiment_model()
+    if model is None:
+        return
+    loaded = time.perf_counter()
+
+    try:
+        predict_classes(tokenizer, model, ["warm-up message for the sentiment model"])
+    except Exception as e:
+        print(f"⚠️ Sentiment warm-up inference failed: {e}")
+        return
+    done = time.perf_counter()
+    print(
+        f"⏱️ Sentiment model ready in {done - start:.2f}s "
+        f"(imports {imported - start:.2f}s, load {loaded - imported:.2f}s, first inference {done - loaded:.2f}s)"
+    )
+
+def start_sentiment_warmup() -> None:
+    """Load and warm the sentiment model in a background thread (called at app startup).
+
+    Until it finishes, request-path calls score with TextBlob instead of
+    waiting on the load.
+    """
+    global _warmup_thread
+    if not config.SENTIMENT_WARMUP_ENABLED or _model is not None or _model_load_failed:
+        return
+    runtime_available = TORCH_AVAILABLE if config.SENTIMENT_BACKEND == "torch" else ONNXRUNTIME_AVAILABLE
+    if not (TRANSFORMERS_AVAILABLE and runtime_available):
+        return
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=_warm_up, name="sentiment-warmup", daemon=True)
+        _warmup_thread.start()
+
 # Sentiment labels as per model
 LABELS = ['negative', 'neutral', 'positive']
 
-def _textblob_sentiment(text: str) -> str:
-    """Fallback sentiment analysis using TextBlob."""
+def _textblob_polarity(text: str) -> float:
+    """TextBlob polarity in [-1, 1], or 0.0 when TextBlob is unavailable."""
     if not TEXTBLOB_AVAILABLE:
-        return "neutral"
-    
+        return 0.0
     try:
-        blob = TextBlob(text)
-        polarity = blob.sentiment.polarity
-        
-        if polarity > 0.1:
-            return "positive"
-        elif polarity < -0.1:
-            return "negative"
-        else:
-            return "neutral"
+        return TextBlob(text).sentiment.polarity
     except Exception:
-        return "neutral"
+        return 0.0
+
+def _polarity_label(polarity: float) -> str:
+    if polarity > 0.1:
+        return "positive"
+    elif polarity < -0.1:
+        return "negative"
+    return "neutral"
+
+def _textblob_sentiment(text: str) -> str:
+    """Fallback sentiment analysis using TextBlob."""
+    return _polarity_label(_textblob_polarity(text))
 
 @lru_cache(maxsize=1000)
 def analyze_sentiment_cached(text: str) -> str:
@@ -86,19 +240,13 @@ def _analyze_sentiment_internal(text: str) -> str:
     if tokenizer is None or model is None:
         return _textblob_sentiment(text)
     
+    # Coalesce with concurrent requests into one padded forward pass
+    if sentiment_batcher is not None:
+        return sentiment_batcher.submit(text).result()
+    
     try:
-        # Tokenize input text for model
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-        
-        # Disable gradient calculations for inference
-        with torch.no_grad():
-            logits = model(**inputs).logits
-
-        # Get index of highest scoring class
-        predicted_class = torch.argmax(logits, dim=1).item()
-
-        # Return corresponding sentiment label
-        return LABELS[predicted_class]
+        # Get index of highest scoring class and return the corresponding label
+        return LABELS[predict_classes(tokenizer, model, [text])[0]]
     
     except Exception as e:
         print(f"⚠️ Sentiment analysis error: {e}")
@@ -126,9 +274,44 @@ def analyze_sentiment(input_data: Union[str, dict]) -> str:
     if not text:
         return "neutral"
     
+    # Don't wait for the warm-up (or cache a stand-in label) while the model loads
+    if sentiment_model_loading():
+        return _textblob_sentiment(text)
+    
     # Use cached version for better performance
     return analyze_sentiment_cached(text)
 
+class SentimentScore(NamedTuple):
+    """Sentiment label plus TextBlob polarity for one text."""
+    label: Optional[str]
+    score: float
+
+
+def score_sentiment(text: str, classify: bool = True) -> SentimentScore:
+    """Label and polarity score for ``text`` in one pass.
+
+    The polarity is computed once and doubles as the label when the
+    classifier is unavailable; otherwise the label comes from the
+    (cached, batched) classifier like ``analyze_sentiment``.
+
+    Args:
+        text: Text to score
+        classify: Whether to compute the label at all; when False it is left
+            as None (for a background job to fill in) and the model is not touched
+
+    Returns:
+        SentimentScore with the label and the polarity rounded to 3 places
+    """
+    polarity = _textblob_polarity(text)
+    if not classify:
+        return SentimentScore(None, round(polarity, 3))
+    tokenizer, model = (None, None) if sentiment_model_loading() else get_sentiment_model()
+    if tokenizer is None or model is None:
+        label = _polarity_label(polarity)
+    else:
+        label = analyze_sentiment(text)
+    return SentimentScore(label, round(polarity, 3))
+
 def analyze_sentiment_batch(texts: List[str]) -> List[str]:
     """Analyze sentiment for multiple texts in batch for better performance.
     
@@ -165,19 +348,8 @@ def analyze_sentiment_batch(texts: List[str]) -> List[str]:
                 results.insert(i, "neutral")
         
         if non_empty_texts:
-            # Batch tokenization
-            inputs = tokenizer(
-                non_empty_texts,
-                return_tensors="pt",
-                truncation=True,
-                max_length=512,
-                padding=True
-            )
-            
-            # Batch inference
-            with torch.no_grad():
-                logits = model(**inputs).logits
-                predicted_classes = torch.argmax(logits, dim=1).tolist()
+            # Batch tokenization and inference
+            predicted_classes = predict_classes(tokenizer, model, non_empty_texts)
             
             # Map results back
             result_list = ["neutral"] * len(processed_texts)
@@ -191,3 +363,92 @@ def analyze_sentiment_batch(texts: List[str]) -> List[str]:
         results = [_textblob_sentiment(text) if text else "neutral" for text in processed_texts]
     
     return results
+
+
+class SentimentBatcher:
+    """Coalesces concurrent sentiment requests into batched forward passes.
+
+    Callers get a future straight away. A background thread takes the first
+    waiting text, keeps collecting for up to ``max_wait_ms`` or until
+    ``max_batch_size`` texts are waiting, runs them through ``predict`` in
+    one call and resolves every future, so throughput grows with concurrency
+    while a lone request only waits ``max_wait_ms`` extra.
+    """
+
+    def __init__(self, predict: Callable[[List[str]], List[str]], max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.predict = predict
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+
+    def submit(self, text: str) -> Future:
+        """Queue ``text`` and return a future resolving to its label."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest_batch,
+                "queued": self._queue.qsize(),
+            }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="sentiment-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            # Identical texts (e.g. repeated greetings) share one row
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                labels = dict(zip(texts, self.predict(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+            for text, future in batch:
+                future.set_result(labels.get(text, "neutral"))
+
+
+sentiment_batcher = (
+    SentimentBatcher(
+        analyze_sentiment_batch,
+        max_batch_size=config.SENTIMENT_BATCH_MAX_SIZE,
+        max_wait_ms=config.SENTIMENT_BATCH_MAX_WAIT_MS
+    )
+    if config.SENTIMENT_BATCH_ENABLED else None
+)
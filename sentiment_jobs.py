@@ -0,0 +1,219 @@
+"""
+Sentiment Jobs - Scores stored NPC replies off the request path
+npc_sentiment is only read by the study analytics, so interactions are saved
+with a null label and a background thread fills it in, scoring queued replies
+in batches through analyze_sentiment_batch and writing them back in one
+executemany UPDATE per batch. A batch that fails is retried one reply at a
+time. The queue is bounded; on shutdown it stops taking jobs and drains what
+is already queued. Replies that still end up unlabelled can be filled in with
+``python -m scripts.rescore_sentiment --only-missing``.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+
+from config import config
+from database import SessionLocal
+from models import NPCMemory
+from sentiment import analyze_sentiment_batch
+
+# (interaction id, reply text the label is computed from)
+Job = Tuple[int, str]
+
+_STOP = object()
+
+
+class SentimentJobQueue:
+    """Bounded queue of NPC replies waiting for their sentiment label.
+
+    Args:
+        score_batch: Function mapping reply texts to labels
+        session_factory: Callable returning a new database session
+        max_size: Jobs held before ``submit`` starts refusing
+        batch_size: Most replies scored and written per batch
+        max_wait_ms: How long the worker waits for a batch to fill up
+    """
+
+    def __init__(
+        self,
+        score_batch: Callable[[List[str]], List[str]],
+        session_factory: Callable[[], Any],
+        max_size: int = 1000,
+        batch_size: int = 32,
+        max_wait_ms: float = 200.0
+    ):
+        self.score_batch = score_batch
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_size))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._scored = 0
+        self._batches = 0
+        self._rejected = 0
+        self._failed = 0
+
+    def submit(self, interaction_id: int, reply_text: str) -> bool:
+        """Queue a reply for scoring.
+
+        Returns:
+            False if the queue is full or shutting down; the caller then has
+            to score the reply itself
+        """
+        if self._closed:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((interaction_id, reply_text))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Stop accepting jobs and wait up to ``timeout`` seconds for the queue to drain."""
+        self._closed = True
+        if self._thread is None:
+            return
+        pending = self._queue.qsize()
+        if pending:
+            print(f"⏳ Draining {pending} queued sentiment jobs")
+        # The worker exits after the sentinel, i.e. once every earlier job is written.
+        # A full queue behind a stuck worker must not hang shutdown past ``timeout``.
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print(f"⚠️ Sentiment job queue still full after {timeout}s; abandoning interactions {self._queued_ids()}")
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            print(f"⚠️ Sentiment jobs still pending after {timeout}s; abandoning interactions {self._queued_ids()}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "scored": self._scored,
+                "batches": self._batches,
+                "rejected": self._rejected,
+                "failed": self._failed,
+            }
+
+    def _queued_ids(self) -> List[int]:
+        """Interaction ids still waiting in the queue (without removing them)."""
+        with self._queue.mutex:
+            return [job[0] for job in self._queue.queue if job is not _STOP]
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="sentiment-jobs", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> Tuple[List[Job], bool]:
+        """Next batch of jobs, and whether the stop sentinel was reached."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _loop(self) -> None:
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: List[Job]) -> None:
+        try:
+            labels = self.score_batch([text for _, text in batch])
+            write_labels(self.session_factory, [
+                (interaction_id, text, label)
+                for (interaction_id, text), label in zip(batch, labels)
+            ])
+        except Exception as e:
+            print(f"⚠️ Sentiment job batch failed ({len(batch)} replies), retrying one at a time: {e}")
+            self._process_each(batch)
+            return
+        with self._lock:
+            self._batches += 1
+            self._scored += len(batch)
+
+    def _process_each(self, batch: List[Job]) -> None:
+        """Score and write each job on its own so one bad reply or write does not sink the rest."""
+        failed_ids = []
+        for interaction_id, text in batch:
+            try:
+                label = self.score_batch([text])[0]
+                write_labels(self.session_factory, [(interaction_id, text, label)])
+            except Exception as e:
+                print(f"❌ Sentiment job for interaction {interaction_id} failed: {e}")
+                failed_ids.append(interaction_id)
+        if failed_ids:
+            print(f"⚠️ Interactions left without npc_sentiment: {failed_ids}")
+        with self._lock:
+            self._scored += len(batch) - len(failed_ids)
+            self._failed += len(failed_ids)
+
+
+def write_labels(session_factory: Callable[[], Any], rows: List[Tuple[int, str, str]]) -> None:
+    """Store ``(id, reply_text, label)`` rows in one executemany UPDATE.
+
+    A row is only updated while its reply still equals the scored text, so a
+    reply edited after it was queued keeps the label of its newer version.
+    """
+    table = NPCMemory.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"), table.c.npc_reply == bindparam("b_reply"))
+        .values(npc_sentiment=bindparam("b_label"))
+    )
+    db = session_factory()
+    try:
+        db.execute(statement, [
+            {"b_id": interaction_id, "b_reply": text, "b_label": label}
+            for interaction_id, text, label in rows
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _default_queue() -> Optional[SentimentJobQueue]:
+    if not config.NPC_SENTIMENT_DEFERRED:
+        return None
+    return SentimentJobQueue(
+        analyze_sentiment_batch,
+        SessionLocal,
+        max_size=config.SENTIMENT_JOB_QUEUE_SIZE,
+        batch_size=config.SENTIMENT_JOB_BATCH_SIZE,
+        max_wait_ms=config.SENTIMENT_JOB_MAX_WAIT_MS
+    )
+
+
+sentiment_jobs = _default_queue()
@@ -4,15 +4,20 @@ Handles player management, chat operations, and build management.
 """
 
 import bcrypt
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from config import config
-from models import Player, NPCMemory, CarBuild, Consent
-from schemas import PlayerCreate, ConsentCreate
+from database import SessionLocal
+from models import Player, NPCMemory, CarBuild, ConversationSummary
+from schemas import PlayerCreate
 from sentiment import analyze_sentiment
-from llamacpp import generate_npc_response
+from sentiment_jobs import sentiment_jobs
+from llamacpp import stream_npc_response
+from inference_scheduler import InferenceBusyError
+from conversation_summary import summarize_turns, summarizer
 
 
 # =============================================================================
@@ -137,24 +142,6 @@ class PlayerService:
         
         return None
     
-    @staticmethod
-    def get_all_players(
-        db: Session,
-        skip: int = 0,
-        limit: int = config.DEFAULT_PAGE_SIZE
-    ) -> List[Player]:
-        """Get all players with pagination.
-        
-        Args:
-            db: Database session
-            skip: Number of records to skip
-            limit: Maximum number of records to return
-            
-        Returns:
-            List of Player objects
-        """
-        return db.query(Player).offset(skip).limit(limit).all()
-    
     @staticmethod
     def get_player_count(db: Session) -> int:
         """Get total player count."""
@@ -194,7 +181,7 @@ class ChatService:
         return list(reversed(history))
     
     @staticmethod
-    def create_interaction(
+    def stream_interaction(
         db: Session,
         player_id: int,
         npc_id: int,
@@ -202,8 +189,8 @@ class ChatService:
         context: List[NPCMemory],
         player_name: str,
         build: Optional[CarBuild] = None
-    ) -> NPCMemory:
-        """Create a new chat interaction with NPC response.
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream an NPC reply, persisting the interaction once generation ends.
         
         Args:
             db: Database session
@@ -214,33 +201,63 @@ class ChatService:
             player_name: Player's display name
             build: Optional car build for context
             
-        Returns:
-            Created NPCMemory object
+        Yields:
+            ``{"type": "token", "text": ...}`` for each generated chunk, then a
+            single ``{"type": "done", "interaction": NPCMemory, "reply": dict}``
         """
-        # Analyze player sentiment
         player_sentiment = analyze_sentiment(dialogue)
+        summary_text, context = SummaryService.apply_summary(db, player_id, npc_id, context)
         
-        # Generate NPC response with error handling
+        npc_reply_obj: Dict[str, Any] = {}
         try:
-            npc_reply_obj = generate_npc_response(
+            for event in stream_npc_response(
                 dialogue,
                 player_sentiment,
                 player_id,
                 context,
                 player_name,
-                build=build
-            )
-            npc_reply_text = (
-                npc_reply_obj["response"]
-                if isinstance(npc_reply_obj, dict)
-                else str(npc_reply_obj)
-            )
+                build=build,
+                summary=summary_text
+            ):
+                if event["type"] == "token":
+                    yield event
+                else:
+                    npc_reply_obj = event
+            npc_reply_text = npc_reply_obj.get("response") or ""
+        except InferenceBusyError:
+            raise
         except Exception as e:
-            print(f"⚠️ LLM generation failed: {e}. Using fallback response.")
+            print(f"⚠️ LLM streaming failed: {e}. Using fallback response.")
+            npc_reply_text = ""
+        
+        npc_sentiment = npc_reply_obj.get("npc_sentiment")
+        if not npc_reply_text:
             npc_reply_text = f"Hey {player_name}! I'm having trouble with my systems right now. Let's talk about your F1 car build!"
+            npc_sentiment = None
         
-        # Analyze NPC sentiment
-        npc_sentiment = analyze_sentiment(npc_reply_text)
+        memory = ChatService._save_interaction(
+            db, player_id, npc_id, dialogue, player_sentiment, npc_reply_text, npc_sentiment
+        )
+        yield {"type": "done", "interaction": memory, "reply": npc_reply_obj}
+    
+    @staticmethod
+    def _save_interaction(
+        db: Session,
+        player_id: int,
+        npc_id: int,
+        dialogue: str,
+        player_sentiment: str,
+        npc_reply_text: str,
+        npc_sentiment: Optional[str] = None
+    ) -> NPCMemory:
+        """Persist the interaction row.
+
+        ``npc_sentiment`` is the label the reply was scored with during
+        generation. Without one, the reply is queued for background scoring
+        (NPC_SENTIMENT_DEFERRED) or scored here.
+        """
+        if npc_sentiment is None and sentiment_jobs is None:
+            npc_sentiment = analyze_sentiment(npc_reply_text)
         
         # Create memory record
         try:
@@ -256,63 +273,181 @@ class ChatService:
             db.add(memory)
             db.commit()
             db.refresh(memory)
-            
-            return memory
         except SQLAlchemyError as e:
             db.rollback()
             print(f"❌ Database error creating interaction: {e}")
             raise
+        
+        ChatService.schedule_npc_sentiment(db, memory)
+        SummaryService.maybe_schedule_update(db, player_id, npc_id)
+        return memory
+    
+    @staticmethod
+    def schedule_npc_sentiment(db: Session, memory: NPCMemory) -> None:
+        """Queue a stored reply without a label for background scoring.
+
+        Falls back to scoring it inline when the job queue is full or
+        shutting down, so no row is left unlabelled.
+        """
+        if memory.npc_sentiment is not None or not memory.npc_reply:
+            return
+        if sentiment_jobs is not None and sentiment_jobs.submit(memory.id, memory.npc_reply):
+            return
+        print(f"⚠️ Sentiment job queue unavailable, scoring interaction {memory.id} inline")
+        try:
+            memory.npc_sentiment = analyze_sentiment(memory.npc_reply)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"❌ Database error storing NPC sentiment: {e}")
+            raise
 
 
 # =============================================================================
-# Build Service
+# Summary Service
 # =============================================================================
 
-class BuildService:
-    """Handles car build operations."""
+class SummaryService:
+    """Maintains rolling conversation summaries per player/NPC pair."""
     
     @staticmethod
-    def get_latest_build(db: Session, player_id: int) -> Optional[CarBuild]:
-        """Get the most recent car build for a player.
+    def get_summary(db: Session, player_id: int, npc_id: int) -> Optional[ConversationSummary]:
+        """Get the stored summary for a player/NPC pair, if any."""
+        return db.query(ConversationSummary).filter(
+            ConversationSummary.player_id == player_id,
+            ConversationSummary.npc_id == npc_id
+        ).first()
+    
+    @staticmethod
+    def apply_summary(
+        db: Session,
+        player_id: int,
+        npc_id: int,
+        context: List[NPCMemory]
+    ) -> Tuple[str, List[NPCMemory]]:
+        """Return the summary text and the history not yet folded into it.
         
         Args:
             db: Database session
             player_id: Player's ID
+            npc_id: NPC's ID
+            context: Conversation history (oldest first)
             
         Returns:
-            CarBuild object or None if no builds exist
+            ``(summary_text, remaining_context)``
         """
-        return (
-            db.query(CarBuild)
-            .filter(CarBuild.player_id == player_id)
-            .order_by(CarBuild.id.desc())
-            .first()
+        if not config.SUMMARY_ENABLED:
+            return "", context
+        summary = SummaryService.get_summary(db, player_id, npc_id)
+        if summary is None:
+            return "", context
+        through_id = summary.summarized_through_id
+        return summary.summary, [entry for entry in context if entry.id > through_id]
+    
+    @staticmethod
+    def maybe_schedule_update(db: Session, player_id: int, npc_id: int) -> bool:
+        """Queue a background update once enough turns are waiting to be folded in.
+        
+        Returns:
+            True if an update was queued
+        """
+        if not config.SUMMARY_ENABLED:
+            return False
+        summary = SummaryService.get_summary(db, player_id, npc_id)
+        through_id = summary.summarized_through_id if summary else 0
+        unsummarized = db.query(NPCMemory).filter(
+            NPCMemory.player_id == player_id,
+            NPCMemory.npc_id == npc_id,
+            NPCMemory.id > through_id
+        ).count()
+        if unsummarized < config.SUMMARY_KEEP_RECENT_TURNS + config.SUMMARY_EVERY_N_TURNS:
+            return False
+        return summarizer.submit(
+            (player_id, npc_id),
+            lambda: SummaryService.run_update(player_id, npc_id)
         )
     
     @staticmethod
-    def get_player_builds(
-        db: Session,
-        player_id: int,
-        skip: int = 0,
-        limit: int = config.DEFAULT_PAGE_SIZE
-    ) -> List[CarBuild]:
-        """Get all builds for a player with pagination.
+    def run_update(player_id: int, npc_id: int) -> None:
+        """Background entry point: update the summary in its own session."""
+        db = SessionLocal()
+        try:
+            SummaryService.update_summary(db, player_id, npc_id)
+        finally:
+            db.close()
+    
+    @staticmethod
+    def update_summary(db: Session, player_id: int, npc_id: int) -> Optional[ConversationSummary]:
+        """Fold every turn older than the recent window into the summary.
         
         Args:
             db: Database session
             player_id: Player's ID
-            skip: Number of records to skip
-            limit: Maximum number of records to return
+            npc_id: NPC's ID
             
         Returns:
-            List of CarBuild objects
+            The updated summary, or None if there was nothing to fold in
+        """
+        summary = SummaryService.get_summary(db, player_id, npc_id)
+        through_id = summary.summarized_through_id if summary else 0
+        
+        turns = (
+            db.query(NPCMemory)
+            .filter(
+                NPCMemory.player_id == player_id,
+                NPCMemory.npc_id == npc_id,
+                NPCMemory.id > through_id
+            )
+            .order_by(NPCMemory.id.asc())
+            .all()
+        )
+        to_fold = turns[:max(0, len(turns) - config.SUMMARY_KEEP_RECENT_TURNS)]
+        if not to_fold:
+            return None
+        
+        text = summarize_turns(summary.summary if summary else "", to_fold)
+        try:
+            if summary is None:
+                summary = ConversationSummary(player_id=player_id, npc_id=npc_id, turns_summarized=0)
+                db.add(summary)
+            summary.summary = text
+            summary.summarized_through_id = to_fold[-1].id
+            summary.turns_summarized = (summary.turns_summarized or 0) + len(to_fold)
+            summary.updated_at = datetime.now(timezone.utc)
+            db.commit()
+            db.refresh(summary)
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"❌ Database error updating summary: {e}")
+            raise
+        
+        print(f"📝 Summarized {len(to_fold)} turns for player {player_id} (npc {npc_id})")
+        return summary
+
+
+# =============================================================================
+# Build Service
+# =============================================================================
+
+class BuildService:
+    """Handles car build operations."""
+    
+    @staticmethod
+    def get_latest_build(db: Session, player_id: int) -> Optional[CarBuild]:
+        """Get the most recent car build for a player.
+        
+        Args:
+            db: Database session
+            player_id: Player's ID
+            
+        Returns:
+            CarBuild object or None if no builds exist
         """
         return (
             db.query(CarBuild)
             .filter(CarBuild.player_id == player_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
+            .order_by(CarBuild.id.desc())
+            .first()
         )
     
     @staticmethod
@@ -358,51 +493,3 @@ class BuildService:
             db.rollback()
             print(f"❌ Database error creating build: {e}")
             raise
-
-
-# =============================================================================
-# Consent Service
-# =============================================================================
-
-class ConsentService:
-    """Handles consent and study participation data."""
-    
-    @staticmethod
-    def create_consent(db: Session, consent_data: ConsentCreate) -> Consent:
-        """Create a new consent record.
-        
-        Args:
-            db: Database session
-            consent_data: Validated consent data
-            
-        Returns:
-            Created Consent object
-        """
-        try:
-            consent = Consent(**consent_data.model_dump())
-            db.add(consent)
-            db.commit()
-            db.refresh(consent)
-            return consent
-        except SQLAlchemyError as e:
-            db.rollback()
-            print(f"❌ Database error creating consent: {e}")
-            raise
-    
-    @staticmethod
-    def get_player_consents(db: Session, player_id: int) -> List[Consent]:
-        """Get all consent records for a player.
-        
-        Args:
-            db: Database session
-            player_id: Player's ID
-            
-        Returns:
-            List of Consent objects
-        """
-        return (
-            db.query(Consent)
-            .filter(Consent.player_id == player_id)
-            .order_by(Consent.created_at.desc())
-            .all()
-        )
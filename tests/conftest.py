@@ -0,0 +1,16 @@
+"""
+Shared test setup: config.py validates the environment at import time, so the
+variables are set here before any application module is imported.
+"""
+
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="npc-memory-tests-")
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_DIR}/test.db")
+os.environ.setdefault("USE_EXTERNAL_LLM", "true")
+os.environ.setdefault("LLM_API_KEY", "test-key")
+os.environ.setdefault("REQUIRE_SERVICE_API_KEY", "false")
+os.environ.setdefault("SENTIMENT_WARMUP_ENABLED", "false")
+os.environ.setdefault("NPC_SENTIMENT_DEFERRED", "false")
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from auth import get_current_user
+from config import config
+from main import app
+from services import ChatService
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(config, "REQUIRE_SERVICE_API_KEY", True)
+    monkeypatch.setattr(config, "SERVICE_API_KEY", "service-secret")
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "1"}
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_stream_interaction_requires_service_key(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("generation must not start without the service key")
+
+    monkeypatch.setattr(ChatService, "stream_interaction", fail)
+    payload = {"player_id": 1, "npc_id": 1, "dialogue": "which engine should I pick?"}
+
+    response = client.post("/stream_interaction/", json=payload)
+    assert response.status_code == 401
+
+    response = client.post("/stream_interaction/", json=payload, headers={"x-service-key": "wrong"})
+    assert response.status_code == 401
+
+
+def test_stream_interaction_accepts_service_key(client):
+    payload = {"player_id": 1, "npc_id": 1, "dialogue": "which engine should I pick?"}
+    response = client.post("/stream_interaction/", json=payload, headers={"x-service-key": "service-secret"})
+    # Past the key check; player 1 does not exist in the empty test database
+    assert response.status_code == 404
@@ -0,0 +1,24 @@
+from response_cache import ResponseCache
+
+
+def _reply(text):
+    return {"response": text, "response_time_sec": 1.2}
+
+
+def test_name_inside_other_words_is_left_alone():
+    cache = ResponseCache()
+    cache.put("k", _reply("Nice one Sam, the Samba setup also works."), "Sam")
+
+    assert cache.get("k", "Alexandra")["response"] == "Nice one Alexandra, the Samba setup also works."
+
+
+def test_short_or_generic_names_are_not_cached():
+    cache = ResponseCache()
+    cache.put("short", _reply("Al, also try max downforce."), "Al")
+    cache.put("generic", _reply("Max, also try max downforce."), "Max")
+    cache.put("npc", _reply("Dax here, Dax out."), "Dax")
+
+    assert cache.get("short", "Charlotte") is None
+    assert cache.get("generic", "Charlotte") is None
+    assert cache.get("npc", "Charlotte") is None
+    assert cache.stats()["skipped"] == 3